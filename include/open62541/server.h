@@ -1302,6 +1302,22 @@ UA_Server_deleteReference(UA_Server *server, const UA_NodeId sourceNodeId,
                           const UA_ExpandedNodeId targetNodeId,
                           UA_Boolean deleteBidirectional);
 
+#ifdef UA_ENABLE_NODESET_LOADER
+/**
+ * Nodeset Loading
+ * ---------------
+ * Nodesets compiled with the binary backend of the nodeset compiler are
+ * encoded into a ByteString that is loaded at runtime. The nodes are added
+ * like in the code generated by the default backend. The namespaces of the
+ * nodeset are added to the server. The DataTypes of the values are looked up
+ * in ``UA_TYPES``, the ``customTypes`` and the custom types of the server
+ * configuration. The nodeset is not modified and can be stored in read-only
+ * memory (or a mapped file). Loading stops at the first error. */
+UA_StatusCode UA_EXPORT UA_THREADSAFE
+UA_Server_loadNodeSet(UA_Server *server, const UA_ByteString *nodeset,
+                      const UA_DataTypeArray *customTypes);
+#endif
+
 /**
  * .. _events:
  *
@@ -975,7 +975,7 @@ struct UA_DataType {
     UA_UInt32 membersSize      : 8;  /* How many members does the type have? */
     UA_UInt32 binaryEncodingId;      /* NodeId of datatype when encoded as binary */
     //UA_UInt16  xmlEncodingId;      /* NodeId of datatype when encoded as XML */
-    UA_DataTypeMember *members;
+    const UA_DataTypeMember *members;
 };
 
 /* Test if the data type is a numeric builtin data type. This includes Boolean,
@@ -1111,11 +1111,21 @@ UA_Guid UA_EXPORT UA_Guid_random(void);     /* no cryptographic entropy */
  * the client or server configuration. Datatype members can point to types in
  * the same array via the ``memberTypeIndex``. If ``namespaceZero`` is set to
  * true, the member datatype is looked up in the array of builtin datatypes
- * instead. */
+ * instead.
+ *
+ * The optional indices hold the positions of the ``typesSize`` types sorted by
+ * the namespace index and then by the numeric typeId (types with a non-numeric
+ * typeId come last within their namespace), respectively by the
+ * binaryEncodingId. The generated ``UA_<NAME>_TYPEID_INDEX`` and
+ * ``UA_<NAME>_BINARYENCODINGID_INDEX`` arrays have this layout. If set, the
+ * lookup of a type by its NodeId is a binary search instead of a linear
+ * scan. */
 typedef struct UA_DataTypeArray {
     const struct UA_DataTypeArray *next;
     const size_t typesSize;
     const UA_DataType *types;
+    const UA_UInt16 *typeIdIndex;           /* optional */
+    const UA_UInt16 *binaryEncodingIdIndex; /* optional */
 } UA_DataTypeArray;
 
 /**
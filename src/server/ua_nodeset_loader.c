@@ -0,0 +1,703 @@
+/* This Source Code Form is subject to the terms of the Mozilla Public
+ * License, v. 2.0. If a copy of the MPL was not distributed with this
+ * file, You can obtain one at http://mozilla.org/MPL/2.0/.
+ */
+
+#include "ua_server_internal.h"
+#include "ua_types_encoding_binary.h"
+
+#ifdef UA_ENABLE_NODESET_LOADER
+
+/* Loads the nodesets generated by the binary backend of the nodeset compiler
+ * (tools/nodeset_compiler/backend_binary.py). The nodes are added with the same
+ * calls as in the code generated by the open62541 backend. See the backend for
+ * the layout of the encoded nodeset. */
+
+#define NODESET_MAGIC "UANS"
+#define NODESET_VERSION 1
+#define NODESET_NULL_INDEX UA_UINT32_MAX
+
+#define NODESET_VALUE_NONE 0
+#define NODESET_VALUE_SCALAR 1
+#define NODESET_VALUE_ARRAY 2
+
+typedef struct {
+    UA_NodeId nodeId;
+    UA_NodeClass nodeClass;
+} AddedNode;
+
+typedef struct {
+    UA_Server *server;
+    const UA_ByteString *src;
+    size_t offset;
+    const UA_DataTypeArray *customTypes;
+
+    /* The strings point into the encoded nodeset */
+    UA_String *strings;
+    size_t stringsSize;
+
+    /* Namespace indices of the nodeset -> namespace indices of the server */
+    UA_UInt16 *namespaces;
+    size_t namespacesSize;
+
+    const UA_DataType **types;
+    size_t typesSize;
+
+    AddedNode *added;
+    size_t addedSize;
+    size_t addedMax;
+} NodeSetLoader;
+
+static UA_StatusCode
+readRaw(NodeSetLoader *l, void *dst, const UA_DataType *type) {
+    return UA_decodeBinary(l->src, &l->offset, dst, type, l->customTypes);
+}
+
+static UA_StatusCode
+readByte(NodeSetLoader *l, UA_Byte *b) {
+    return readRaw(l, b, &UA_TYPES[UA_TYPES_BYTE]);
+}
+
+static UA_StatusCode
+readUInt32(NodeSetLoader *l, UA_UInt32 *v) {
+    return readRaw(l, v, &UA_TYPES[UA_TYPES_UINT32]);
+}
+
+static UA_StatusCode
+readCount(NodeSetLoader *l, size_t *count) {
+    UA_Int32 c;
+    UA_StatusCode retval = readRaw(l, &c, &UA_TYPES[UA_TYPES_INT32]);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    /* Every entry takes at least one byte */
+    if(c < 0 || (size_t)c > l->src->length - l->offset)
+        return UA_STATUSCODE_BADDECODINGERROR;
+    *count = (size_t)c;
+    return UA_STATUSCODE_GOOD;
+}
+
+static UA_StatusCode
+mapNamespace(NodeSetLoader *l, UA_UInt16 *ns) {
+    if(*ns >= l->namespacesSize)
+        return UA_STATUSCODE_BADDECODINGERROR;
+    *ns = l->namespaces[*ns];
+    return UA_STATUSCODE_GOOD;
+}
+
+static UA_StatusCode
+readNodeId(NodeSetLoader *l, UA_NodeId *id) {
+    UA_StatusCode retval = readRaw(l, id, &UA_TYPES[UA_TYPES_NODEID]);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    retval = mapNamespace(l, &id->namespaceIndex);
+    if(retval != UA_STATUSCODE_GOOD)
+        UA_NodeId_clear(id);
+    return retval;
+}
+
+/* Strings are not copied. They point into the string table. */
+static UA_StatusCode
+readString(NodeSetLoader *l, UA_String *s) {
+    UA_UInt32 index;
+    UA_StatusCode retval = readUInt32(l, &index);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    if(index == NODESET_NULL_INDEX) {
+        *s = UA_STRING_NULL;
+        return UA_STATUSCODE_GOOD;
+    }
+    if(index >= l->stringsSize)
+        return UA_STATUSCODE_BADDECODINGERROR;
+    *s = l->strings[index];
+    return UA_STATUSCODE_GOOD;
+}
+
+static UA_StatusCode
+readLocalizedText(NodeSetLoader *l, UA_LocalizedText *lt) {
+    UA_StatusCode retval = readString(l, &lt->locale);
+    retval |= readString(l, &lt->text);
+    return retval;
+}
+
+/*********************/
+/* Header and tables */
+/*********************/
+
+static UA_StatusCode
+readStringTable(NodeSetLoader *l) {
+    UA_StatusCode retval = readCount(l, &l->stringsSize);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    l->strings = (UA_String*)UA_calloc(l->stringsSize + 1, sizeof(UA_String));
+    if(!l->strings)
+        return UA_STATUSCODE_BADOUTOFMEMORY;
+    for(size_t i = 0; i < l->stringsSize; i++) {
+        UA_Int32 length;
+        retval = readRaw(l, &length, &UA_TYPES[UA_TYPES_INT32]);
+        if(retval != UA_STATUSCODE_GOOD)
+            return retval;
+        if(length < 0)
+            continue;
+        if((size_t)length > l->src->length - l->offset)
+            return UA_STATUSCODE_BADDECODINGERROR;
+        l->strings[i].length = (size_t)length;
+        l->strings[i].data = &l->src->data[l->offset];
+        l->offset += (size_t)length;
+    }
+    return UA_STATUSCODE_GOOD;
+}
+
+static UA_StatusCode
+readNamespaces(NodeSetLoader *l) {
+    UA_StatusCode retval = readCount(l, &l->namespacesSize);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    l->namespaces = (UA_UInt16*)UA_calloc(l->namespacesSize + 1, sizeof(UA_UInt16));
+    if(!l->namespaces)
+        return UA_STATUSCODE_BADOUTOFMEMORY;
+    for(size_t i = 0; i < l->namespacesSize; i++) {
+        UA_String uri;
+        retval = readString(l, &uri);
+        if(retval != UA_STATUSCODE_GOOD)
+            return retval;
+        UA_LOCK(l->server->serviceMutex);
+        l->namespaces[i] = addNamespace(l->server, uri);
+        UA_UNLOCK(l->server->serviceMutex);
+    }
+    return UA_STATUSCODE_GOOD;
+}
+
+static const UA_DataType *
+findType(NodeSetLoader *l, const UA_NodeId *typeId) {
+    const UA_DataType *type = UA_findDataType(typeId);
+    if(type)
+        return type;
+    const UA_DataTypeArray *lists[2] = {l->customTypes,
+                                        l->server->config.customDataTypes};
+    for(size_t i = 0; i < 2; i++) {
+        for(const UA_DataTypeArray *types = lists[i]; types; types = types->next) {
+            if(types->typeIdIndex && typeId->identifierType == UA_NODEIDTYPE_NUMERIC) {
+                type = lookupDataTypeIndex(types->types, types->typeIdIndex,
+                                           types->typesSize, typeId, false);
+                if(type)
+                    return type;
+                continue;
+            }
+            for(size_t j = 0; j < types->typesSize; j++) {
+                if(UA_NodeId_equal(&types->types[j].typeId, typeId))
+                    return &types->types[j];
+            }
+        }
+    }
+    return NULL;
+}
+
+static UA_StatusCode
+readTypes(NodeSetLoader *l) {
+    UA_StatusCode retval = readCount(l, &l->typesSize);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    l->types = (const UA_DataType**)UA_calloc(l->typesSize + 1, sizeof(UA_DataType*));
+    if(!l->types)
+        return UA_STATUSCODE_BADOUTOFMEMORY;
+    for(size_t i = 0; i < l->typesSize; i++) {
+        UA_NodeId typeId;
+        retval = readNodeId(l, &typeId);
+        if(retval != UA_STATUSCODE_GOOD)
+            return retval;
+        l->types[i] = findType(l, &typeId);
+        if(!l->types[i]) {
+            UA_LOG_NODEID_WRAP(&typeId, UA_LOG_ERROR(&l->server->config.logger,
+                               UA_LOGCATEGORY_SERVER, "Loading the nodeset failed. "
+                               "The DataType %.*s is unknown",
+                               (int)nodeIdStr.length, nodeIdStr.data));
+            UA_NodeId_clear(&typeId);
+            return UA_STATUSCODE_BADDATATYPEIDUNKNOWN;
+        }
+        UA_NodeId_clear(&typeId);
+    }
+    return UA_STATUSCODE_GOOD;
+}
+
+/**********/
+/* Values */
+/**********/
+
+static UA_StatusCode
+mapValueNamespaces(NodeSetLoader *l, void *p, const UA_DataType *type);
+
+static UA_StatusCode
+mapArrayNamespaces(NodeSetLoader *l, void *p, size_t size, const UA_DataType *type) {
+    uintptr_t ptr = (uintptr_t)p;
+    UA_StatusCode retval = UA_STATUSCODE_GOOD;
+    for(size_t i = 0; i < size && retval == UA_STATUSCODE_GOOD; i++) {
+        retval = mapValueNamespaces(l, (void*)ptr, type);
+        ptr += type->memSize;
+    }
+    return retval;
+}
+
+static UA_StatusCode
+mapStructureNamespaces(NodeSetLoader *l, void *p, const UA_DataType *type) {
+    uintptr_t ptr = (uintptr_t)p;
+    const UA_DataType *typelists[2] = { UA_TYPES, &type[-type->typeIndex] };
+    UA_StatusCode retval = UA_STATUSCODE_GOOD;
+    for(size_t i = 0; i < type->membersSize && retval == UA_STATUSCODE_GOOD; ++i) {
+        const UA_DataTypeMember *m = &type->members[i];
+        const UA_DataType *mt = &typelists[!m->namespaceZero][m->memberTypeIndex];
+        ptr += m->padding;
+        if(!m->isArray) {
+            retval = mapValueNamespaces(l, (void*)ptr, mt);
+            ptr += mt->memSize;
+        } else {
+            size_t length = *(size_t*)ptr;
+            ptr += sizeof(size_t);
+            retval = mapArrayNamespaces(l, *(void**)ptr, length, mt);
+            ptr += sizeof(void*);
+        }
+    }
+    return retval;
+}
+
+/* Values contain the namespace indices of the nodeset */
+static UA_StatusCode
+mapValueNamespaces(NodeSetLoader *l, void *p, const UA_DataType *type) {
+    switch(type->typeKind) {
+    case UA_DATATYPEKIND_NODEID:
+        return mapNamespace(l, &((UA_NodeId*)p)->namespaceIndex);
+    case UA_DATATYPEKIND_EXPANDEDNODEID: {
+        UA_ExpandedNodeId *id = (UA_ExpandedNodeId*)p;
+        if(id->namespaceUri.length > 0)
+            return UA_STATUSCODE_GOOD;
+        return mapNamespace(l, &id->nodeId.namespaceIndex);
+    }
+    case UA_DATATYPEKIND_QUALIFIEDNAME:
+        return mapNamespace(l, &((UA_QualifiedName*)p)->namespaceIndex);
+    case UA_DATATYPEKIND_VARIANT: {
+        UA_Variant *v = (UA_Variant*)p;
+        if(!v->type)
+            return UA_STATUSCODE_GOOD;
+        if(UA_Variant_isScalar(v))
+            return mapValueNamespaces(l, v->data, v->type);
+        return mapArrayNamespaces(l, v->data, v->arrayLength, v->type);
+    }
+    case UA_DATATYPEKIND_EXTENSIONOBJECT: {
+        UA_ExtensionObject *eo = (UA_ExtensionObject*)p;
+        if(eo->encoding < UA_EXTENSIONOBJECT_DECODED)
+            return UA_STATUSCODE_GOOD;
+        return mapValueNamespaces(l, eo->content.decoded.data, eo->content.decoded.type);
+    }
+    case UA_DATATYPEKIND_STRUCTURE:
+        return mapStructureNamespaces(l, p, type);
+    default:
+        return UA_STATUSCODE_GOOD;
+    }
+}
+
+static UA_StatusCode
+readArray(NodeSetLoader *l, size_t *size, void **data, const UA_DataType *type) {
+    size_t length;
+    UA_StatusCode retval = readCount(l, &length);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    if(length == 0) {
+        *data = NULL;
+        *size = 0;
+        return UA_STATUSCODE_GOOD;
+    }
+    *data = UA_Array_new(length, type);
+    if(!*data)
+        return UA_STATUSCODE_BADOUTOFMEMORY;
+    *size = length;
+    uintptr_t ptr = (uintptr_t)*data;
+    for(size_t i = 0; i < length && retval == UA_STATUSCODE_GOOD; i++) {
+        retval = readRaw(l, (void*)ptr, type);
+        ptr += type->memSize;
+    }
+    return retval;
+}
+
+static UA_StatusCode
+readValue(NodeSetLoader *l, UA_Variant *v) {
+    UA_Byte kind;
+    UA_StatusCode retval = readByte(l, &kind);
+    if(retval != UA_STATUSCODE_GOOD || kind == NODESET_VALUE_NONE)
+        return retval;
+    UA_UInt16 typeIndex;
+    retval = readRaw(l, &typeIndex, &UA_TYPES[UA_TYPES_UINT16]);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    if(typeIndex >= l->typesSize)
+        return UA_STATUSCODE_BADDECODINGERROR;
+    const UA_DataType *type = l->types[typeIndex];
+
+    if(kind == NODESET_VALUE_SCALAR) {
+        void *data = UA_new(type);
+        if(!data)
+            return UA_STATUSCODE_BADOUTOFMEMORY;
+        UA_Variant_setScalar(v, data, type);
+        retval = readRaw(l, data, type);
+        if(retval != UA_STATUSCODE_GOOD)
+            return retval;
+        return mapValueNamespaces(l, v, &UA_TYPES[UA_TYPES_VARIANT]);
+    }
+    if(kind != NODESET_VALUE_ARRAY)
+        return UA_STATUSCODE_BADDECODINGERROR;
+
+    v->type = type;
+    retval = readArray(l, &v->arrayLength, &v->data, type);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    retval = readArray(l, &v->arrayDimensionsSize, (void**)&v->arrayDimensions,
+                       &UA_TYPES[UA_TYPES_UINT32]);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    return mapValueNamespaces(l, v, &UA_TYPES[UA_TYPES_VARIANT]);
+}
+
+/* Value, DataType, ValueRank and ArrayDimensions of Variables and
+ * VariableTypes */
+static UA_StatusCode
+readVariableAttributes(NodeSetLoader *l, UA_Variant *value, UA_NodeId *dataType,
+                       UA_Int32 *valueRank, size_t *arrayDimensionsSize,
+                       UA_UInt32 **arrayDimensions) {
+    UA_StatusCode retval = readValue(l, value);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    retval = readNodeId(l, dataType);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    retval = readRaw(l, valueRank, &UA_TYPES[UA_TYPES_INT32]);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    return readArray(l, arrayDimensionsSize, (void**)arrayDimensions,
+                     &UA_TYPES[UA_TYPES_UINT32]);
+}
+
+/*********/
+/* Nodes */
+/*********/
+
+typedef union {
+    UA_NodeAttributes node;
+    UA_ObjectAttributes object;
+    UA_VariableAttributes variable;
+    UA_MethodAttributes method;
+    UA_ObjectTypeAttributes objectType;
+    UA_VariableTypeAttributes variableType;
+    UA_ReferenceTypeAttributes referenceType;
+    UA_DataTypeAttributes dataType;
+    UA_ViewAttributes view;
+} NodeSetAttributes;
+
+/* Reads the attributes of the node class. Returns the type of the
+ * attributes. */
+static UA_StatusCode
+readAttributes(NodeSetLoader *l, UA_NodeClass nodeClass, NodeSetAttributes *attr,
+               const UA_DataType **attrType) {
+    UA_StatusCode retval = UA_STATUSCODE_GOOD;
+    switch(nodeClass) {
+    case UA_NODECLASS_OBJECT:
+        attr->object = UA_ObjectAttributes_default;
+        *attrType = &UA_TYPES[UA_TYPES_OBJECTATTRIBUTES];
+        break;
+    case UA_NODECLASS_VARIABLE:
+        attr->variable = UA_VariableAttributes_default;
+        *attrType = &UA_TYPES[UA_TYPES_VARIABLEATTRIBUTES];
+        break;
+    case UA_NODECLASS_METHOD:
+        attr->method = UA_MethodAttributes_default;
+        *attrType = &UA_TYPES[UA_TYPES_METHODATTRIBUTES];
+        break;
+    case UA_NODECLASS_OBJECTTYPE:
+        attr->objectType = UA_ObjectTypeAttributes_default;
+        *attrType = &UA_TYPES[UA_TYPES_OBJECTTYPEATTRIBUTES];
+        break;
+    case UA_NODECLASS_VARIABLETYPE:
+        attr->variableType = UA_VariableTypeAttributes_default;
+        *attrType = &UA_TYPES[UA_TYPES_VARIABLETYPEATTRIBUTES];
+        break;
+    case UA_NODECLASS_REFERENCETYPE:
+        attr->referenceType = UA_ReferenceTypeAttributes_default;
+        *attrType = &UA_TYPES[UA_TYPES_REFERENCETYPEATTRIBUTES];
+        break;
+    case UA_NODECLASS_DATATYPE:
+        attr->dataType = UA_DataTypeAttributes_default;
+        *attrType = &UA_TYPES[UA_TYPES_DATATYPEATTRIBUTES];
+        break;
+    case UA_NODECLASS_VIEW:
+        attr->view = UA_ViewAttributes_default;
+        *attrType = &UA_TYPES[UA_TYPES_VIEWATTRIBUTES];
+        break;
+    default:
+        return UA_STATUSCODE_BADDECODINGERROR;
+    }
+
+    /* Common attributes */
+    retval |= readLocalizedText(l, &attr->node.displayName);
+    retval |= readLocalizedText(l, &attr->node.description);
+#ifndef UA_ENABLE_NODESET_COMPILER_DESCRIPTIONS
+    attr->node.description = UA_LOCALIZEDTEXT_NULL;
+#endif
+    retval |= readUInt32(l, &attr->node.writeMask);
+    retval |= readUInt32(l, &attr->node.userWriteMask);
+    if(retval != UA_STATUSCODE_GOOD)
+        return UA_STATUSCODE_BADDECODINGERROR;
+
+    const UA_DataType *booleanType = &UA_TYPES[UA_TYPES_BOOLEAN];
+    switch(nodeClass) {
+    case UA_NODECLASS_OBJECT:
+        retval = readByte(l, &attr->object.eventNotifier);
+        break;
+    case UA_NODECLASS_VARIABLE:
+        retval = readVariableAttributes(l, &attr->variable.value,
+                                        &attr->variable.dataType,
+                                        &attr->variable.valueRank,
+                                        &attr->variable.arrayDimensionsSize,
+                                        &attr->variable.arrayDimensions);
+        if(retval != UA_STATUSCODE_GOOD)
+            break;
+        retval |= readByte(l, &attr->variable.accessLevel);
+        retval |= readByte(l, &attr->variable.userAccessLevel);
+        retval |= readRaw(l, &attr->variable.minimumSamplingInterval,
+                          &UA_TYPES[UA_TYPES_DOUBLE]);
+        retval |= readRaw(l, &attr->variable.historizing, booleanType);
+        break;
+    case UA_NODECLASS_METHOD:
+        retval |= readRaw(l, &attr->method.executable, booleanType);
+        retval |= readRaw(l, &attr->method.userExecutable, booleanType);
+        break;
+    case UA_NODECLASS_OBJECTTYPE:
+        retval = readRaw(l, &attr->objectType.isAbstract, booleanType);
+        break;
+    case UA_NODECLASS_VARIABLETYPE:
+        retval = readVariableAttributes(l, &attr->variableType.value,
+                                        &attr->variableType.dataType,
+                                        &attr->variableType.valueRank,
+                                        &attr->variableType.arrayDimensionsSize,
+                                        &attr->variableType.arrayDimensions);
+        if(retval != UA_STATUSCODE_GOOD)
+            break;
+        retval = readRaw(l, &attr->variableType.isAbstract, booleanType);
+        break;
+    case UA_NODECLASS_REFERENCETYPE:
+        retval |= readRaw(l, &attr->referenceType.isAbstract, booleanType);
+        retval |= readRaw(l, &attr->referenceType.symmetric, booleanType);
+        retval |= readLocalizedText(l, &attr->referenceType.inverseName);
+        break;
+    case UA_NODECLASS_DATATYPE:
+        retval = readRaw(l, &attr->dataType.isAbstract, booleanType);
+        break;
+    case UA_NODECLASS_VIEW:
+        retval |= readRaw(l, &attr->view.containsNoLoops, booleanType);
+        retval |= readByte(l, &attr->view.eventNotifier);
+        break;
+    default:
+        break;
+    }
+    return retval;
+}
+
+/* Only the values and the NodeIds are allocated. The strings point into the
+ * encoded nodeset. */
+static void
+clearAttributes(UA_NodeClass nodeClass, NodeSetAttributes *attr) {
+    if(nodeClass == UA_NODECLASS_VARIABLE) {
+        UA_Variant_clear(&attr->variable.value);
+        UA_NodeId_clear(&attr->variable.dataType);
+        UA_Array_delete(attr->variable.arrayDimensions,
+                        attr->variable.arrayDimensionsSize, &UA_TYPES[UA_TYPES_UINT32]);
+    } else if(nodeClass == UA_NODECLASS_VARIABLETYPE) {
+        UA_Variant_clear(&attr->variableType.value);
+        UA_NodeId_clear(&attr->variableType.dataType);
+        UA_Array_delete(attr->variableType.arrayDimensions,
+                        attr->variableType.arrayDimensionsSize, &UA_TYPES[UA_TYPES_UINT32]);
+    }
+}
+
+static UA_StatusCode
+loadNode(NodeSetLoader *l, const UA_NodeId *nodeId, UA_Boolean *skip) {
+    UA_UInt32 nodeClass;
+    UA_NodeId parentNodeId = UA_NODEID_NULL;
+    UA_NodeId referenceTypeId = UA_NODEID_NULL;
+    UA_NodeId typeDefinition = UA_NODEID_NULL;
+    UA_QualifiedName browseName;
+    NodeSetAttributes attr;
+    const UA_DataType *attrType = NULL;
+    memset(&attr, 0, sizeof(attr));
+    *skip = false;
+
+    UA_StatusCode retval = readUInt32(l, &nodeClass);
+    retval |= readNodeId(l, &parentNodeId);
+    retval |= readNodeId(l, &referenceTypeId);
+    retval |= readRaw(l, &browseName.namespaceIndex, &UA_TYPES[UA_TYPES_UINT16]);
+    retval |= mapNamespace(l, &browseName.namespaceIndex);
+    retval |= readString(l, &browseName.name);
+    retval |= readNodeId(l, &typeDefinition);
+    if(retval == UA_STATUSCODE_GOOD)
+        retval = readAttributes(l, (UA_NodeClass)nodeClass, &attr, &attrType);
+    if(retval != UA_STATUSCODE_GOOD)
+        goto cleanup;
+
+#ifndef UA_ENABLE_METHODCALLS
+    /* Methods and their references are left out */
+    if(nodeClass == UA_NODECLASS_METHOD) {
+        *skip = true;
+        goto cleanup;
+    }
+#endif
+
+    /* More nodes than announced in the header. The node could not be
+     * finished. */
+    if(l->addedSize >= l->addedMax) {
+        retval = UA_STATUSCODE_BADDECODINGERROR;
+        goto cleanup;
+    }
+
+    retval = UA_Server_addNode_begin(l->server, (UA_NodeClass)nodeClass, *nodeId,
+                                     parentNodeId, referenceTypeId, browseName,
+                                     typeDefinition, &attr, attrType, NULL, NULL);
+    if(retval != UA_STATUSCODE_GOOD)
+        goto cleanup;
+    retval = UA_NodeId_copy(nodeId, &l->added[l->addedSize].nodeId);
+    l->added[l->addedSize].nodeClass = (UA_NodeClass)nodeClass;
+    if(retval == UA_STATUSCODE_GOOD)
+        l->addedSize++;
+
+ cleanup:
+    clearAttributes((UA_NodeClass)nodeClass, &attr);
+    UA_NodeId_clear(&parentNodeId);
+    UA_NodeId_clear(&referenceTypeId);
+    UA_NodeId_clear(&typeDefinition);
+    return retval;
+}
+
+static UA_StatusCode
+addReferences(NodeSetLoader *l, const UA_NodeId *nodeId, UA_Boolean skip) {
+    size_t refsSize;
+    UA_StatusCode retval = readCount(l, &refsSize);
+    for(size_t i = 0; i < refsSize && retval == UA_STATUSCODE_GOOD; i++) {
+        UA_NodeId refType = UA_NODEID_NULL;
+        UA_ExpandedNodeId target = UA_EXPANDEDNODEID_NULL;
+        UA_Boolean isForward;
+        retval |= readNodeId(l, &refType);
+        retval |= readNodeId(l, &target.nodeId);
+        retval |= readRaw(l, &isForward, &UA_TYPES[UA_TYPES_BOOLEAN]);
+        if(retval == UA_STATUSCODE_GOOD && !skip)
+            retval = UA_Server_addReference(l->server, *nodeId, refType,
+                                            target, isForward);
+        UA_NodeId_clear(&refType);
+        UA_NodeId_clear(&target.nodeId);
+    }
+    return retval;
+}
+
+static UA_StatusCode
+loadRecord(NodeSetLoader *l) {
+    UA_NodeId nodeId;
+    UA_StatusCode retval = readNodeId(l, &nodeId);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+
+    UA_Byte isNew;
+    UA_Boolean skip = false;
+    retval = readByte(l, &isNew);
+    if(retval == UA_STATUSCODE_GOOD && isNew)
+        retval = loadNode(l, &nodeId, &skip);
+    if(retval == UA_STATUSCODE_GOOD)
+        retval = addReferences(l, &nodeId, skip);
+
+    if(retval != UA_STATUSCODE_GOOD) {
+        UA_LOG_NODEID_WRAP(&nodeId, UA_LOG_ERROR(&l->server->config.logger,
+                           UA_LOGCATEGORY_SERVER, "Loading the nodeset failed "
+                           "at node %.*s with status code %s",
+                           (int)nodeIdStr.length, nodeIdStr.data,
+                           UA_StatusCode_name(retval)));
+    }
+    UA_NodeId_clear(&nodeId);
+    return retval;
+}
+
+/* Finish the nodes in reverse order, as in the generated code */
+static UA_StatusCode
+finishNodes(NodeSetLoader *l) {
+    UA_StatusCode retval = UA_STATUSCODE_GOOD;
+    for(size_t i = l->addedSize; i > 0 && retval == UA_STATUSCODE_GOOD; i--) {
+        AddedNode *n = &l->added[i-1];
+#ifdef UA_ENABLE_METHODCALLS
+        if(n->nodeClass == UA_NODECLASS_METHOD) {
+            retval = UA_Server_addMethodNode_finish(l->server, n->nodeId, NULL,
+                                                    0, NULL, 0, NULL);
+            continue;
+        }
+#endif
+        retval = UA_Server_addNode_finish(l->server, n->nodeId);
+    }
+    return retval;
+}
+
+static UA_StatusCode
+loadNodeSet(NodeSetLoader *l) {
+    if(l->src->length < 4 || memcmp(l->src->data, NODESET_MAGIC, 4) != 0)
+        return UA_STATUSCODE_BADDECODINGERROR;
+    l->offset = 4;
+    UA_UInt32 version;
+    UA_StatusCode retval = readUInt32(l, &version);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    if(version != NODESET_VERSION)
+        return UA_STATUSCODE_BADNOTSUPPORTED;
+
+    retval = readStringTable(l);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    retval = readNamespaces(l);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    retval = readTypes(l);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+
+    UA_UInt32 nodesSize;
+    size_t recordsSize;
+    retval = readUInt32(l, &nodesSize);
+    retval |= readCount(l, &recordsSize);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    l->addedMax = nodesSize;
+    l->added = (AddedNode*)UA_calloc((size_t)nodesSize + 1, sizeof(AddedNode));
+    if(!l->added)
+        return UA_STATUSCODE_BADOUTOFMEMORY;
+
+    for(size_t i = 0; i < recordsSize && retval == UA_STATUSCODE_GOOD; i++)
+        retval = loadRecord(l);
+    if(retval != UA_STATUSCODE_GOOD)
+        return retval;
+    return finishNodes(l);
+}
+
+UA_StatusCode
+UA_Server_loadNodeSet(UA_Server *server, const UA_ByteString *nodeset,
+                      const UA_DataTypeArray *customTypes) {
+    NodeSetLoader l;
+    memset(&l, 0, sizeof(NodeSetLoader));
+    l.server = server;
+    l.src = nodeset;
+    l.customTypes = customTypes;
+
+    UA_StatusCode retval = loadNodeSet(&l);
+    if(retval != UA_STATUSCODE_GOOD)
+        UA_LOG_ERROR(&server->config.logger, UA_LOGCATEGORY_SERVER,
+                     "Loading the nodeset failed with status code %s",
+                     UA_StatusCode_name(retval));
+
+    for(size_t i = 0; i < l.addedSize; i++)
+        UA_NodeId_clear(&l.added[i].nodeId);
+    UA_free(l.added);
+    UA_free(l.types);
+    UA_free(l.namespaces);
+    UA_free(l.strings);
+    return retval;
+}
+
+#endif /* UA_ENABLE_NODESET_LOADER */
@@ -17,7 +17,10 @@
 
 #include <open62541/types.h>
 #include <open62541/types_generated.h>
-#include <open62541/types_generated_handling.h>
+#include <open62541/types_generated_handling/ByteString.h>
+#include <open62541/types_generated_handling/Guid.h>
+#include <open62541/types_generated_handling/String.h>
+#include <open62541/types_generated_handling/Variant.h>
 
 #include "ua_util_internal.h"
 #include "libc_time.h"
@@ -47,20 +50,56 @@ typedef void (*UA_clearSignature)(void *p, const UA_DataType *type);
 extern const UA_copySignature copyJumpTable[UA_DATATYPEKINDS];
 extern const UA_clearSignature clearJumpTable[UA_DATATYPEKINDS];
 
-/* TODO: The standard-defined types are ordered. See if binary search is
- * more efficient. */
+const UA_DataType *
+lookupDataTypeIndex(const UA_DataType *types, const UA_UInt16 *index,
+                    size_t indexSize, const UA_NodeId *id, UA_Boolean byEncoding) {
+    if(id->identifierType != UA_NODEIDTYPE_NUMERIC)
+        return NULL;
+
+    /* Find the first entry that is not smaller than the id */
+    size_t lo = 0, hi = indexSize;
+    while(lo < hi) {
+        size_t mid = lo + ((hi - lo) / 2);
+        const UA_DataType *type = &types[index[mid]];
+        UA_Boolean less;
+        if(type->typeId.namespaceIndex != id->namespaceIndex)
+            less = (type->typeId.namespaceIndex < id->namespaceIndex);
+        else if(byEncoding)
+            less = (type->binaryEncodingId < id->identifier.numeric);
+        else
+            less = (type->typeId.identifierType == UA_NODEIDTYPE_NUMERIC &&
+                    type->typeId.identifier.numeric < id->identifier.numeric);
+        if(less)
+            lo = mid + 1;
+        else
+            hi = mid;
+    }
+    if(lo == indexSize)
+        return NULL;
+
+    const UA_DataType *type = &types[index[lo]];
+    if(type->typeId.namespaceIndex != id->namespaceIndex)
+        return NULL;
+    if(byEncoding)
+        return (type->binaryEncodingId == id->identifier.numeric) ? type : NULL;
+    if(type->typeId.identifierType != UA_NODEIDTYPE_NUMERIC ||
+       type->typeId.identifier.numeric != id->identifier.numeric)
+        return NULL;
+    return type;
+}
+
 const UA_DataType *
 UA_findDataType(const UA_NodeId *typeId) {
     if(typeId->identifierType != UA_NODEIDTYPE_NUMERIC)
         return NULL;
 
     /* Always look in built-in types first
-     * (may contain data types from all namespaces) */
-    for(size_t i = 0; i < UA_TYPES_COUNT; ++i) {
-        if(UA_TYPES[i].typeId.identifier.numeric == typeId->identifier.numeric
-           && UA_TYPES[i].typeId.namespaceIndex == typeId->namespaceIndex)
-            return &UA_TYPES[i];
-    }
+     * (may contain data types from all namespaces).
+     * Binary search in the generated index sorted by the typeId. */
+    const UA_DataType *type =
+        lookupDataTypeIndex(UA_TYPES, UA_TYPES_TYPEID_INDEX, UA_TYPES_COUNT, typeId, false);
+    if(type)
+        return type;
 
     /* TODO When other namespace look in custom types, too, requires access to custom types array here! */
     /*if(typeId->namespaceIndex != 0) {
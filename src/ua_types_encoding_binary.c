@@ -18,7 +18,8 @@
  */
 
 #include <open62541/types_generated.h>
-#include <open62541/types_generated_handling.h>
+#include <open62541/types_generated_handling/ExtensionObject.h>
+#include <open62541/types_generated_handling/NodeId.h>
 
 #include "ua_types_encoding_binary.h"
 #include "ua_util_internal.h"
@@ -795,15 +796,25 @@ UA_findDataTypeByBinaryInternal(const UA_NodeId *typeId, Ctx *ctx) {
         return NULL;
 
     /* Always look in built-in types first
-     * (may contain data types from all namespaces) */
-    for(size_t i = 0; i < UA_TYPES_COUNT; ++i) {
-        if(UA_TYPES[i].binaryEncodingId == typeId->identifier.numeric &&
-           UA_TYPES[i].typeId.namespaceIndex == typeId->namespaceIndex)
-            return &UA_TYPES[i];
-    }
-
+     * (may contain data types from all namespaces).
+     * Binary search in the generated index sorted by the binaryEncodingId. */
+    const UA_DataType *type =
+        lookupDataTypeIndex(UA_TYPES, UA_TYPES_BINARYENCODINGID_INDEX,
+                            UA_TYPES_COUNT, typeId, true);
+    if(type)
+        return type;
+
+    /* Custom type arrays without an index are scanned linearly */
     const UA_DataTypeArray *customTypes = ctx->customTypes;
     while(customTypes) {
+        if(customTypes->binaryEncodingIdIndex) {
+            type = lookupDataTypeIndex(customTypes->types, customTypes->binaryEncodingIdIndex,
+                                       customTypes->typesSize, typeId, true);
+            if(type)
+                return type;
+            customTypes = customTypes->next;
+            continue;
+        }
         for(size_t i = 0; i < customTypes->typesSize; ++i) {
             if(customTypes->types[i].binaryEncodingId == typeId->identifier.numeric &&
                customTypes->types[i].typeId.namespaceIndex == typeId->namespaceIndex)
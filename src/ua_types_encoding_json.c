@@ -9,7 +9,10 @@
 #include "ua_types_encoding_json.h"
 
 #include <open62541/types_generated.h>
-#include <open62541/types_generated_handling.h>
+#include <open62541/types_generated_handling/ByteString.h>
+#include <open62541/types_generated_handling/ExtensionObject.h>
+#include <open62541/types_generated_handling/Guid.h>
+#include <open62541/types_generated_handling/NodeId.h>
 
 #include "ua_types_encoding_binary.h"
 
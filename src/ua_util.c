@@ -7,7 +7,8 @@
  *    Copyright 2017 (c) Stefan Profanter, fortiss GmbH
  */
 
-#include <open62541/types_generated_handling.h>
+#include <open62541/types_generated_handling/ByteString.h>
+#include <open62541/types_generated_handling/String.h>
 #include <open62541/util.h>
 
 #include "ua_util_internal.h"
@@ -51,6 +51,13 @@ typedef UA_StatusCode status;
 size_t UA_EXPORT
 getCountOfOptionalFields(const UA_DataType *type);
 
+/* Binary search in a sorted index of the types array (see UA_DataTypeArray)
+ * for the numeric typeId or, if byEncoding is set, the binaryEncodingId.
+ * Returns the matching type with the lowest position or NULL. */
+const UA_DataType *
+lookupDataTypeIndex(const UA_DataType *types, const UA_UInt16 *index,
+                    size_t indexSize, const UA_NodeId *id, UA_Boolean byEncoding);
+
 /* Dump packet for debugging / fuzzing */
 #ifdef UA_DEBUG_DUMP_PKGS
 void UA_EXPORT
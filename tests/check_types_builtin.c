@@ -1043,6 +1043,40 @@ START_TEST(UA_QualifiedName_equalShallWorkOnExample) {
 }
 END_TEST
 
+START_TEST(UA_Range_calcSizeBinaryShallBeConstant) {
+    UA_Range range;
+    UA_Range_init(&range);
+    range.low = -1.0;
+    range.high = 1.0;
+    ck_assert_uint_eq(UA_Range_calcSizeBinary(&range), UA_RANGE_BINARY_SIZE);
+    ck_assert_uint_eq(UA_calcSizeBinary(&range, &UA_TYPES[UA_TYPES_RANGE]),
+                      UA_RANGE_BINARY_SIZE);
+    ck_assert_uint_eq(UA_NodeClass_calcSizeBinary(NULL), UA_NODECLASS_BINARY_SIZE);
+}
+END_TEST
+
+START_TEST(UA_findDataTypeShallFindAllTypes) {
+    for(size_t i = 0; i < UA_TYPES_COUNT; ++i) {
+        const UA_DataType *type = UA_findDataType(&UA_TYPES[i].typeId);
+        ck_assert_ptr_ne(type, NULL);
+        ck_assert(UA_NodeId_equal(&type->typeId, &UA_TYPES[i].typeId));
+
+        UA_NodeId encodingId = UA_NODEID_NUMERIC(UA_TYPES[i].typeId.namespaceIndex,
+                                                 UA_TYPES[i].binaryEncodingId);
+        type = UA_findDataTypeByBinary(&encodingId);
+        ck_assert_ptr_ne(type, NULL);
+        ck_assert_uint_eq(type->binaryEncodingId, UA_TYPES[i].binaryEncodingId);
+    }
+
+    UA_NodeId unknown = UA_NODEID_NUMERIC(0, 0xffffff);
+    ck_assert_ptr_eq(UA_findDataType(&unknown), NULL);
+    ck_assert_ptr_eq(UA_findDataTypeByBinary(&unknown), NULL);
+    unknown = UA_TYPES[UA_TYPES_READREQUEST].typeId;
+    unknown.namespaceIndex = 1;
+    ck_assert_ptr_eq(UA_findDataType(&unknown), NULL);
+}
+END_TEST
+
 START_TEST(UA_ExtensionObject_copyShallWorkOnExample) {
     // given
     /* UA_Byte data[3] = { 1, 2, 3 }; */
@@ -1548,6 +1582,7 @@ static Suite *testSuite_builtin(void) {
     tcase_add_test(tc_encode, UA_DataValue_encodeShallWorkOnExampleWithoutVariant);
     tcase_add_test(tc_encode, UA_DataValue_encodeShallWorkOnExampleWithVariant);
     tcase_add_test(tc_encode, UA_ExtensionObject_encodeDecodeShallWorkOnExtensionObject);
+    tcase_add_test(tc_encode, UA_Range_calcSizeBinaryShallBeConstant);
     suite_add_tcase(s, tc_encode);
 
     TCase *tc_convert = tcase_create("convert");
@@ -1559,6 +1594,10 @@ static Suite *testSuite_builtin(void) {
     tcase_add_test(tc_equal, UA_QualifiedName_equalShallWorkOnExample);
     suite_add_tcase(s, tc_equal);
 
+    TCase *tc_find = tcase_create("find");
+    tcase_add_test(tc_find, UA_findDataTypeShallFindAllTypes);
+    suite_add_tcase(s, tc_find);
+
     TCase *tc_copy = tcase_create("copy");
     tcase_add_test(tc_copy, UA_Array_copyByteArrayShallWorkOnExample);
     tcase_add_test(tc_copy, UA_Array_copyUA_StringShallWorkOnExample);
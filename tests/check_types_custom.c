@@ -76,7 +76,12 @@ static const UA_DataType PointType = {
     members
 };
 
-const UA_DataTypeArray customDataTypes = {NULL, 1, &PointType};
+const UA_DataTypeArray customDataTypes = {NULL, 1, &PointType, NULL, NULL};
+
+/* The same array with an index for the binary search by typeId and
+ * binaryEncodingId */
+static const UA_UInt16 pointIndex[1] = {0};
+const UA_DataTypeArray customDataTypesIndexed = {NULL, 1, &PointType, pointIndex, pointIndex};
 
 typedef struct {
     UA_Int16 a;
@@ -130,7 +135,7 @@ static const UA_DataType OptType = {
         Opt_members
 };
 
-const UA_DataTypeArray customDataTypesOptStruct = {&customDataTypes, 2, &OptType};
+const UA_DataTypeArray customDataTypesOptStruct = {&customDataTypes, 2, &OptType, NULL, NULL};
 
 typedef struct {
     UA_String description;
@@ -183,7 +188,7 @@ static const UA_DataType ArrayOptType = {
     ArrayOptStruct_members
 };
 
-const UA_DataTypeArray customDataTypesOptArrayStruct = {&customDataTypesOptStruct, 3, &ArrayOptType};
+const UA_DataTypeArray customDataTypesOptArrayStruct = {&customDataTypesOptStruct, 3, &ArrayOptType, NULL, NULL};
 
 typedef enum {UA_UNISWITCH_NONE = 0, UA_UNISWITCH_OPTIONA = 1, UA_UNISWITCH_OPTIONB = 2} UA_UniSwitch;
 
@@ -227,7 +232,7 @@ static const UA_DataType UniType = {
         Uni_members
 };
 
-const UA_DataTypeArray customDataTypesUnion = {&customDataTypesOptArrayStruct, 2, &UniType};
+const UA_DataTypeArray customDataTypesUnion = {&customDataTypesOptArrayStruct, 2, &UniType, NULL, NULL};
 
 START_TEST(parseCustomScalar) {
     Point p;
@@ -286,19 +291,23 @@ START_TEST(parseCustomScalarExtensionObject) {
     retval = UA_encodeBinary(&eo, &UA_TYPES[UA_TYPES_EXTENSIONOBJECT], &bufPos, &bufEnd, NULL, NULL);
     ck_assert_int_eq(retval, UA_STATUSCODE_GOOD);
 
-    UA_ExtensionObject eo2;
-    size_t offset = 0;
-    retval = UA_decodeBinary(&buf, &offset, &eo2, &UA_TYPES[UA_TYPES_EXTENSIONOBJECT], &customDataTypes);
-    ck_assert_int_eq(offset, (uintptr_t)(bufPos - buf.data));
-    ck_assert_int_eq(retval, UA_STATUSCODE_GOOD);
+    /* Look up the type with a linear scan and with the index */
+    const UA_DataTypeArray *arrays[2] = {&customDataTypes, &customDataTypesIndexed};
+    for(size_t i = 0; i < 2; i++) {
+        UA_ExtensionObject eo2;
+        size_t offset = 0;
+        retval = UA_decodeBinary(&buf, &offset, &eo2, &UA_TYPES[UA_TYPES_EXTENSIONOBJECT], arrays[i]);
+        ck_assert_int_eq(offset, (uintptr_t)(bufPos - buf.data));
+        ck_assert_int_eq(retval, UA_STATUSCODE_GOOD);
 
-    ck_assert_int_eq(eo2.encoding, UA_EXTENSIONOBJECT_DECODED);
-    ck_assert(eo2.content.decoded.type == &PointType);
+        ck_assert_int_eq(eo2.encoding, UA_EXTENSIONOBJECT_DECODED);
+        ck_assert(eo2.content.decoded.type == &PointType);
 
-    Point *p2 = (Point*)eo2.content.decoded.data;
-    ck_assert(p.x == p2->x);
-        
-    UA_ExtensionObject_deleteMembers(&eo2);
+        Point *p2 = (Point*)eo2.content.decoded.data;
+        ck_assert(p.x == p2->x);
+
+        UA_ExtensionObject_deleteMembers(&eo2);
+    }
     UA_ByteString_deleteMembers(&buf);
 } END_TEST
 
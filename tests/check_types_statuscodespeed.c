@@ -0,0 +1,108 @@
+/* This Source Code Form is subject to the terms of the Mozilla Public
+ * License, v. 2.0. If a copy of the MPL was not distributed with this
+ * file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+/* Compare the generated binary search in UA_StatusCode_name with a linear scan
+ * over the same table (the way the lookup was implemented before). */
+
+#include <open62541/types.h>
+
+#include <check.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+#define LOOKUPS 1000000 /* Number of lookups to perform */
+
+typedef struct {
+    UA_StatusCode code;
+    const char *name;
+} StatusCodeName;
+
+/* The StatusCodes with their names, generated by CMake from the StatusCode.csv
+ * independently of the lookup table of UA_StatusCode_name */
+static const StatusCodeName expected[] = {
+    {UA_STATUSCODE_GOOD, "Good"},
+#include "check_types_statuscodes.h"
+};
+static const size_t codesSize = sizeof(expected) / sizeof(expected[0]);
+static const char *unknownName;
+
+static void setup(void) {
+    unknownName = UA_StatusCode_name(0xffffffff);
+}
+
+static const char *
+linearStatusCodeName(UA_StatusCode code) {
+    for(size_t i = 0; i < codesSize; ++i) {
+        if(expected[i].code == code)
+            return expected[i].name;
+    }
+    return unknownName;
+}
+
+START_TEST(statusCodeNameLookup) {
+    ck_assert_str_eq(UA_StatusCode_name(UA_STATUSCODE_GOOD), "Good");
+    ck_assert_str_eq(UA_StatusCode_name(UA_STATUSCODE_BADINTERNALERROR), "BadInternalError");
+    ck_assert_str_eq(UA_StatusCode_name(UA_STATUSCODE_BADMAXCONNECTIONSREACHED),
+                     "BadMaxConnectionsReached");
+    ck_assert_str_eq(UA_StatusCode_name(0x12345678), "Unknown StatusCode");
+
+    /* Every StatusCode is found with its name */
+    for(size_t i = 0; i < codesSize; i++)
+        ck_assert_str_eq(UA_StatusCode_name(expected[i].code), expected[i].name);
+
+    /* No other code is found. All StatusCodes have a zero low word. */
+    for(UA_UInt32 high = 0; high <= 0xffff; high++) {
+        UA_StatusCode code = high << 16;
+        ck_assert_str_eq(UA_StatusCode_name(code), linearStatusCodeName(code));
+    }
+}
+END_TEST
+
+START_TEST(statusCodeNameSpeed) {
+    size_t found = 0;
+    clock_t begin = clock();
+    for(size_t i = 0; i < LOOKUPS; i++) {
+        if(UA_StatusCode_name(expected[i % codesSize].code) != unknownName)
+            found++;
+    }
+    clock_t finish = clock();
+    double binary = (double)(finish - begin) / CLOCKS_PER_SEC;
+
+    begin = clock();
+    for(size_t i = 0; i < LOOKUPS; i++) {
+        if(linearStatusCodeName(expected[i % codesSize].code) != unknownName)
+            found++;
+    }
+    finish = clock();
+    double linear = (double)(finish - begin) / CLOCKS_PER_SEC;
+
+    ck_assert_uint_eq(found, 2 * LOOKUPS);
+    printf("%u lookups over %u StatusCodes\n", (unsigned)LOOKUPS, (unsigned)codesSize);
+    printf("binary search duration was %f s\n", binary);
+    printf("linear search duration was %f s\n", linear);
+}
+END_TEST
+
+static Suite * testSuite_statusCodeName(void) {
+    Suite *s = suite_create("StatusCode Name");
+    TCase *tc_lookup = tcase_create("lookup");
+    tcase_add_checked_fixture(tc_lookup, setup, NULL);
+#ifdef UA_ENABLE_STATUSCODE_DESCRIPTIONS
+    tcase_add_test(tc_lookup, statusCodeNameLookup);
+    tcase_add_test(tc_lookup, statusCodeNameSpeed);
+#endif
+    suite_add_tcase(s, tc_lookup);
+    return s;
+}
+
+int main(void) {
+    Suite *s = testSuite_statusCodeName();
+    SRunner *sr = srunner_create(s);
+    srunner_set_fork_status(sr, CK_NOFORK);
+    srunner_run_all(sr, CK_NORMAL);
+    int number_failed = srunner_ntests_failed(sr);
+    srunner_free(sr);
+    return (number_failed == 0) ? EXIT_SUCCESS : EXIT_FAILURE;
+}
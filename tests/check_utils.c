@@ -525,6 +525,19 @@ START_TEST(idOrderString) {
 } END_TEST
 
 
+#ifdef UA_ENABLE_NODEID_NAMES
+START_TEST(NodeId_ns0Names) {
+    ck_assert_str_eq(UA_NS0ID_name(UA_NS0ID_SERVER_SERVERSTATUS), "Server_ServerStatus");
+    ck_assert_str_eq(UA_NS0ID_name(UA_NS0ID_BOOLEAN), "Boolean");
+    ck_assert_ptr_eq(UA_NS0ID_name(0), NULL);
+    ck_assert_uint_eq(UA_NS0ID_fromName("Server_ServerStatus"), UA_NS0ID_SERVER_SERVERSTATUS);
+    ck_assert_uint_eq(UA_NS0ID_fromName("HasComponent"), UA_NS0ID_HASCOMPONENT);
+    ck_assert_uint_eq(UA_NS0ID_fromName("Server_ServerStatu"), 0);
+    ck_assert_uint_eq(UA_NS0ID_fromName(""), 0);
+}
+END_TEST
+#endif
+
 static Suite* testSuite_Utils(void) {
     Suite *s = suite_create("Utils");
     TCase *tc_endpointUrl_split = tcase_create("EndpointUrl_split");
@@ -537,6 +550,9 @@ static Suite* testSuite_Utils(void) {
     tcase_add_test(tc_utils, readNumber);
     tcase_add_test(tc_utils, readNumberWithBase);
     tcase_add_test(tc_utils, StatusCode_msg);
+#ifdef UA_ENABLE_NODEID_NAMES
+    tcase_add_test(tc_utils, NodeId_ns0Names);
+#endif
     suite_add_tcase(s,tc_utils);
 
 
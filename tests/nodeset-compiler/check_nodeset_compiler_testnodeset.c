@@ -12,7 +12,9 @@
 #include "unistd.h"
 
 UA_Server *server = NULL;
-UA_DataTypeArray customTypesArray = { NULL, UA_TYPES_TESTS_TESTNODESET_COUNT, UA_TYPES_TESTS_TESTNODESET};
+UA_DataTypeArray customTypesArray = { NULL, UA_TYPES_TESTS_TESTNODESET_COUNT, UA_TYPES_TESTS_TESTNODESET,
+                                       UA_TYPES_TESTS_TESTNODESET_TYPEID_INDEX,
+                                       UA_TYPES_TESTS_TESTNODESET_BINARYENCODINGID_INDEX};
 
 static void setup(void) {
     server = UA_Server_new();
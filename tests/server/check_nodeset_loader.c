@@ -0,0 +1,316 @@
+/* This Source Code Form is subject to the terms of the Mozilla Public
+ * License, v. 2.0. If a copy of the MPL was not distributed with this
+ * file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+/* Loads the DI nodeset compiled with the binary backend and compares the
+ * address space with the one from the code of the default backend. */
+
+#include <open62541/server.h>
+#include <open62541/server_config_default.h>
+
+#include "ua_types_encoding_binary.h"
+#include "ua_util_internal.h"
+
+#include <check.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+#include "tests/namespace_tests_di_generated.h"
+#include "tests/namespace_tests_di_binary_generated.h"
+
+static UA_Server *generated;
+static UA_Server *loaded;
+static UA_ByteString nodeset;
+
+static UA_Server *
+newServer(void) {
+    UA_Server *server = UA_Server_new();
+    UA_ServerConfig_setDefault(UA_Server_getConfig(server));
+    return server;
+}
+
+/* The nodeset file written next to the generated code */
+static void
+readNodeSetFile(void) {
+    nodeset = UA_BYTESTRING_NULL;
+    FILE *f = fopen(UA_NODESET_BINARY_FILE, "rb");
+    ck_assert_ptr_ne(f, NULL);
+    fseek(f, 0, SEEK_END);
+    long length = ftell(f);
+    ck_assert_int_gt(length, 0);
+    fseek(f, 0, SEEK_SET);
+    UA_StatusCode retval = UA_ByteString_allocBuffer(&nodeset, (size_t)length);
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+    ck_assert_uint_eq(fread(nodeset.data, 1, nodeset.length, f), nodeset.length);
+    fclose(f);
+}
+
+static void setup(void) {
+    generated = newServer();
+    loaded = newServer();
+    readNodeSetFile();
+}
+
+static void teardown(void) {
+    UA_ByteString_clear(&nodeset);
+    UA_Server_delete(generated);
+    UA_Server_delete(loaded);
+}
+
+/* Load a modified nodeset into a new server */
+static UA_StatusCode
+loadModified(const UA_ByteString *modified) {
+    UA_DataTypeArray customTypes = {NULL, UA_TYPES_TESTS_DI_COUNT, UA_TYPES_TESTS_DI, NULL, NULL};
+    UA_Server *server = newServer();
+    UA_StatusCode retval = UA_Server_loadNodeSet(server, modified, &customTypes);
+    UA_Server_delete(server);
+    return retval;
+}
+
+static UA_Boolean
+encodedEqual(const void *p1, const void *p2, const UA_DataType *type) {
+    UA_ByteString b1 = UA_BYTESTRING_NULL;
+    UA_ByteString b2 = UA_BYTESTRING_NULL;
+    UA_StatusCode retval = UA_ByteString_allocBuffer(&b1, UA_calcSizeBinary(p1, type));
+    retval |= UA_ByteString_allocBuffer(&b2, UA_calcSizeBinary(p2, type));
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+    UA_Byte *pos1 = b1.data;
+    UA_Byte *pos2 = b2.data;
+    const UA_Byte *end1 = &b1.data[b1.length];
+    const UA_Byte *end2 = &b2.data[b2.length];
+    retval = UA_encodeBinary(p1, type, &pos1, &end1, NULL, NULL);
+    retval |= UA_encodeBinary(p2, type, &pos2, &end2, NULL, NULL);
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+    UA_Boolean equal = UA_ByteString_equal(&b1, &b2);
+    UA_ByteString_clear(&b1);
+    UA_ByteString_clear(&b2);
+    return equal;
+}
+
+static UA_Boolean
+hasReference(const UA_BrowseResult *br, const UA_ReferenceDescription *rd) {
+    for(size_t i = 0; i < br->referencesSize; i++) {
+        if(br->references[i].isForward == rd->isForward &&
+           UA_NodeId_equal(&br->references[i].referenceTypeId, &rd->referenceTypeId) &&
+           UA_ExpandedNodeId_equal(&br->references[i].nodeId, &rd->nodeId))
+            return true;
+    }
+    return false;
+}
+
+typedef struct {
+    UA_Server *server;
+    UA_Server *other;
+    size_t nodesSize;
+} CompareContext;
+
+static void
+compareNode(void *context, const UA_Node *node) {
+    CompareContext *ctx = (CompareContext*)context;
+    ctx->nodesSize++;
+
+    UA_NodeClass nodeClass;
+    UA_StatusCode retval = UA_Server_readNodeClass(ctx->other, node->nodeId, &nodeClass);
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+
+    /* The values of ns0 change while the server runs (e.g. the current time).
+     * Both servers have the same ns0. */
+    if(node->nodeId.namespaceIndex > 0) {
+        for(UA_UInt32 attr = UA_ATTRIBUTEID_NODEID;
+            attr <= UA_ATTRIBUTEID_USEREXECUTABLE; attr++) {
+            UA_ReadValueId rvi;
+            UA_ReadValueId_init(&rvi);
+            rvi.nodeId = node->nodeId;
+            rvi.attributeId = attr;
+            UA_DataValue v1 = UA_Server_read(ctx->server, &rvi, UA_TIMESTAMPSTORETURN_NEITHER);
+            UA_DataValue v2 = UA_Server_read(ctx->other, &rvi, UA_TIMESTAMPSTORETURN_NEITHER);
+            ck_assert(encodedEqual(&v1, &v2, &UA_TYPES[UA_TYPES_DATAVALUE]));
+            UA_DataValue_clear(&v1);
+            UA_DataValue_clear(&v2);
+        }
+    }
+
+    UA_BrowseDescription bd;
+    UA_BrowseDescription_init(&bd);
+    bd.nodeId = node->nodeId;
+    bd.browseDirection = UA_BROWSEDIRECTION_BOTH;
+    bd.includeSubtypes = true;
+    bd.resultMask = UA_BROWSERESULTMASK_REFERENCETYPEID | UA_BROWSERESULTMASK_ISFORWARD;
+    UA_BrowseResult br1 = UA_Server_browse(ctx->server, 0, &bd);
+    UA_BrowseResult br2 = UA_Server_browse(ctx->other, 0, &bd);
+    ck_assert_uint_eq(br1.statusCode, UA_STATUSCODE_GOOD);
+    ck_assert_uint_eq(br2.statusCode, UA_STATUSCODE_GOOD);
+    ck_assert_uint_eq(br1.referencesSize, br2.referencesSize);
+    for(size_t i = 0; i < br1.referencesSize; i++)
+        ck_assert(hasReference(&br2, &br1.references[i]));
+    UA_BrowseResult_clear(&br1);
+    UA_BrowseResult_clear(&br2);
+}
+
+static size_t
+compareServers(UA_Server *server, UA_Server *other) {
+    CompareContext ctx = {server, other, 0};
+    UA_Nodestore *ns = &UA_Server_getConfig(server)->nodestore;
+    ns->iterate(ns->context, compareNode, &ctx);
+    return ctx.nodesSize;
+}
+
+START_TEST(Server_loadDiNodeset) {
+    UA_StatusCode retval = namespace_tests_di_generated(generated);
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+    retval = namespace_tests_di_binary_generated(loaded);
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+
+    /* Compare in both directions to find the nodes that are missing */
+    size_t nodesSize = compareServers(generated, loaded);
+    ck_assert_uint_eq(compareServers(loaded, generated), nodesSize);
+}
+END_TEST
+
+START_TEST(Server_loadNodesetFile) {
+    UA_DataTypeArray customTypes = {NULL, UA_TYPES_TESTS_DI_COUNT, UA_TYPES_TESTS_DI,
+                                    UA_TYPES_TESTS_DI_TYPEID_INDEX,
+                                    UA_TYPES_TESTS_DI_BINARYENCODINGID_INDEX};
+    UA_StatusCode retval = namespace_tests_di_binary_generated(generated);
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+    retval = UA_Server_loadNodeSet(loaded, &nodeset, &customTypes);
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+    ck_assert_uint_eq(compareServers(generated, loaded),
+                      compareServers(loaded, generated));
+}
+END_TEST
+
+START_TEST(Server_findInTypesIndex) {
+    /* The generated indices of the DI types find every type */
+    for(size_t i = 0; i < UA_TYPES_TESTS_DI_COUNT; i++) {
+        const UA_DataType *expected = &UA_TYPES_TESTS_DI[i];
+        const UA_DataType *type =
+            lookupDataTypeIndex(UA_TYPES_TESTS_DI, UA_TYPES_TESTS_DI_TYPEID_INDEX,
+                                UA_TYPES_TESTS_DI_COUNT, &expected->typeId, false);
+        ck_assert_ptr_eq(type, expected);
+
+        UA_NodeId encodingId = UA_NODEID_NUMERIC(expected->typeId.namespaceIndex,
+                                                 expected->binaryEncodingId);
+        type = lookupDataTypeIndex(UA_TYPES_TESTS_DI, UA_TYPES_TESTS_DI_BINARYENCODINGID_INDEX,
+                                   UA_TYPES_TESTS_DI_COUNT, &encodingId, true);
+        ck_assert_ptr_ne(type, NULL);
+        ck_assert_uint_eq(type->binaryEncodingId, expected->binaryEncodingId);
+    }
+
+    UA_NodeId unknown = UA_NODEID_NUMERIC(2, 0xffffff);
+    ck_assert_ptr_eq(lookupDataTypeIndex(UA_TYPES_TESTS_DI, UA_TYPES_TESTS_DI_TYPEID_INDEX,
+                                         UA_TYPES_TESTS_DI_COUNT, &unknown, false), NULL);
+    unknown = UA_TYPES_TESTS_DI[0].typeId;
+    unknown.namespaceIndex++;
+    ck_assert_ptr_eq(lookupDataTypeIndex(UA_TYPES_TESTS_DI, UA_TYPES_TESTS_DI_TYPEID_INDEX,
+                                         UA_TYPES_TESTS_DI_COUNT, &unknown, false), NULL);
+}
+END_TEST
+
+START_TEST(Server_loadBadMagic) {
+    nodeset.data[0] = 'X';
+    ck_assert_uint_eq(loadModified(&nodeset), UA_STATUSCODE_BADDECODINGERROR);
+}
+END_TEST
+
+START_TEST(Server_loadTruncated) {
+    /* The loader must not read past the end */
+    UA_ByteString truncated = nodeset;
+    for(size_t i = 0; i < 16; i++) {
+        truncated.length = nodeset.length * i / 16;
+        ck_assert_uint_ne(loadModified(&truncated), UA_STATUSCODE_GOOD);
+    }
+}
+END_TEST
+
+START_TEST(Server_loadCorrupted) {
+    /* Loading may succeed or fail. But the broken nodeset must not crash the
+     * server. The memory is checked with valgrind. */
+    for(size_t i = 0; i < 16; i++) {
+        size_t pos = nodeset.length * i / 16;
+        UA_Byte orig = nodeset.data[pos];
+        nodeset.data[pos] = (UA_Byte)~orig;
+        (void)loadModified(&nodeset);
+        nodeset.data[pos] = orig;
+    }
+}
+END_TEST
+
+/* Skip the header until the number of nodes */
+static size_t
+nodesSizeOffset(void) {
+    size_t offset = 8; /* Magic and version */
+    UA_Int32 count;
+    UA_StatusCode retval = UA_decodeBinary(&nodeset, &offset, &count,
+                                           &UA_TYPES[UA_TYPES_INT32], NULL);
+    for(UA_Int32 i = 0; i < count && retval == UA_STATUSCODE_GOOD; i++) {
+        UA_Int32 length;
+        retval = UA_decodeBinary(&nodeset, &offset, &length,
+                                 &UA_TYPES[UA_TYPES_INT32], NULL);
+        if(length > 0)
+            offset += (size_t)length;
+    }
+    retval |= UA_decodeBinary(&nodeset, &offset, &count,
+                              &UA_TYPES[UA_TYPES_INT32], NULL);
+    offset += (size_t)count * sizeof(UA_UInt32);
+    retval |= UA_decodeBinary(&nodeset, &offset, &count,
+                              &UA_TYPES[UA_TYPES_INT32], NULL);
+    for(UA_Int32 i = 0; i < count && retval == UA_STATUSCODE_GOOD; i++) {
+        UA_NodeId typeId;
+        retval = UA_decodeBinary(&nodeset, &offset, &typeId,
+                                 &UA_TYPES[UA_TYPES_NODEID], NULL);
+        UA_NodeId_clear(&typeId);
+    }
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+    return offset;
+}
+
+START_TEST(Server_loadTooManyNodes) {
+    /* More nodes than announced in the header */
+    size_t offset = nodesSizeOffset();
+    UA_UInt32 nodesSize;
+    UA_StatusCode retval = UA_decodeBinary(&nodeset, &offset, &nodesSize,
+                                           &UA_TYPES[UA_TYPES_UINT32], NULL);
+    ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+    ck_assert_uint_gt(nodesSize, 1);
+
+    UA_UInt32 announced[2] = {0, nodesSize / 2};
+    for(size_t i = 0; i < 2; i++) {
+        UA_Byte *pos = &nodeset.data[offset - sizeof(UA_UInt32)];
+        const UA_Byte *end = &nodeset.data[offset];
+        retval = UA_encodeBinary(&announced[i], &UA_TYPES[UA_TYPES_UINT32],
+                                 &pos, &end, NULL, NULL);
+        ck_assert_uint_eq(retval, UA_STATUSCODE_GOOD);
+        ck_assert_uint_eq(loadModified(&nodeset), UA_STATUSCODE_BADDECODINGERROR);
+    }
+}
+END_TEST
+
+static Suite* testSuite_NodesetLoader(void) {
+    Suite *s = suite_create("Server Nodeset Loader");
+    TCase *tc_load = tcase_create("Load the DI nodeset");
+    tcase_add_checked_fixture(tc_load, setup, teardown);
+    tcase_add_test(tc_load, Server_loadDiNodeset);
+    tcase_add_test(tc_load, Server_loadNodesetFile);
+    tcase_add_test(tc_load, Server_findInTypesIndex);
+    suite_add_tcase(s, tc_load);
+
+    TCase *tc_bad = tcase_create("Load broken nodesets");
+    tcase_add_checked_fixture(tc_bad, setup, teardown);
+    tcase_add_test(tc_bad, Server_loadBadMagic);
+    tcase_add_test(tc_bad, Server_loadTruncated);
+    tcase_add_test(tc_bad, Server_loadCorrupted);
+    tcase_add_test(tc_bad, Server_loadTooManyNodes);
+    suite_add_tcase(s, tc_bad);
+    return s;
+}
+
+int main(void) {
+    Suite *s = testSuite_NodesetLoader();
+    SRunner *sr = srunner_create(s);
+    srunner_set_fork_status(sr, CK_NOFORK);
+    srunner_run_all(sr,CK_NORMAL);
+    int number_failed = srunner_ntests_failed(sr);
+    srunner_free(sr);
+    return (number_failed == 0) ? EXIT_SUCCESS : EXIT_FAILURE;
+}
@@ -2,22 +2,36 @@
 
 # coding: UTF-8
 # This Source Code Form is subject to the terms of the Mozilla Public
-# License, v. 2.0. If a copy of the MPL was not distributed with this 
+# License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from __future__ import print_function
 import argparse
+import hashlib
+import heapq
+import json
 import os.path
 import re
+import sys
 import io
 
 parser = argparse.ArgumentParser()
 parser.add_argument('version', help='file version')
 parser.add_argument('outfile', help='outfile with extension .c/.h')
 parser.add_argument('inputs', nargs='*', action='store', help='input filenames')
+parser.add_argument('--shards', type=int, default=1,
+                    help='split the .c output into N files <outfile>_partK.c (K = 1..N) that include a shared '
+                         '<outfile>_internal.h with the internal headers. Every source file is kept within one shard')
+parser.add_argument('--manifest',
+                    help='JSON file with the hashes of the inputs of the last run. If nothing has changed, '
+                         'the outputs are not written again')
+parser.add_argument('--stamp',
+                    help='file that is written on every run. The build system tracks the stamp instead of the '
+                         'outputs, which keep their timestamp when their content is unchanged')
 args = parser.parse_args()
 
 outname = args.outfile.split("/")[-1]
+outdir = os.path.dirname(args.outfile)
 is_c = False
 if outname[-2:] == ".c":
     is_c = True
@@ -26,11 +40,10 @@ if pos > 0:
     outname = outname[:pos]
 include_re = re.compile("^#[\s]*include (\".*\").*$|^#[\s]*include (<open62541/.*>).*$")
 guard_re = re.compile("^#(?:(?:ifndef|define)\s*[A-Z_]+_H_|endif /\* [A-Z_]+_H_ \*/|endif // [A-Z_]+_H_|endif\s*/\*\s*!?[A-Z_]+_H[_]+\s*\*/)")
+system_include_re = re.compile("^#[\s]*include[\s]*(<[^>]*>)")
+directive_re = re.compile("^#[\s]*([a-z]+)")
 
-print ("Starting amalgamating file "+ args.outfile)
-
-file = io.open(args.outfile, 'wt', encoding='utf8', errors='replace')
-file.write(u"""/* THIS IS A SINGLE-FILE DISTRIBUTION CONCATENATED FROM THE OPEN62541 SOURCES
+license_header = u"""/* THIS IS A SINGLE-FILE DISTRIBUTION CONCATENATED FROM THE OPEN62541 SOURCES
  * visit http://open62541.org/ for information about this software
  * Git-Revision: %s
  */
@@ -45,10 +58,9 @@ file.write(u"""/* THIS IS A SINGLE-FILE DISTRIBUTION CONCATENATED FROM THE OPEN6
  * open62541 is distributed in the hope that it will be useful, but WITHOUT ANY
  * WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
  * A PARTICULAR PURPOSE.
- */\n\n""" % args.version)
+ */\n\n""" % args.version
 
-if is_c:
-    file.write(u'''#ifndef UA_DYNAMIC_LINKING_EXPORT
+c_prologue = u'''#ifndef UA_DYNAMIC_LINKING_EXPORT
 # define UA_DYNAMIC_LINKING_EXPORT
 # define MDNSD_DYNAMIC_LINKING
 #endif
@@ -59,33 +71,254 @@ if is_c:
 #endif
 
 #include "%s.h"
-''' % outname)
-else:
-    file.write(u'''#ifndef %s
-#define %s
-''' % (outname.upper() + u"_H_", outname.upper() + u"_H_"))
+''' % outname
 
-for fname in args.inputs:
+prologue_directives = ("include", "if", "ifdef", "ifndef", "elif", "else", "endif")
+
+class SystemInclude(object):
+    """A system include that is not preceded by a macro definition in the same
+    file. It is deduplicated with the same include under the same conditionals.
+    Includes outside of conditionals can be hoisted."""
+    def __init__(self, line, target, conditions):
+        self.line = line
+        self.key = (tuple(conditions), target)
+        self.hoistable = not conditions
+
+def read_input(fname):
+    """Returns the lines of an input file without the local includes and
+    include guards, and the local includes from the beginning of the file
+    (before any definition) that the file depends on"""
+    lines = [u"\n/*********************************** amalgamated original file \"" + fname +
+             u"\" ***********************************/\n\n"]
+    depends = []
+    conditions = [] # Enclosing conditionals (without the include guard)
+    defines = False # A macro was (un)defined before the current line
+    prologue = True # Only includes, conditionals and comments so far
+    comment = False
     with io.open(fname, encoding='utf8', errors='replace') as infile:
-        file.write(u"\n/*********************************** amalgamated original file \"" + fname + u"\" ***********************************/\n\n")
-        print ("Integrating file '" + fname + "'...", end=""),
         for line in infile:
+            directive = line.lstrip()
+            if not directive.startswith(u"#"):
+                # Most lines are no preprocessor directive. Only track if the
+                # beginning of the file (with the includes) is over.
+                if prologue:
+                    if comment:
+                        comment = u"*/" not in directive
+                    elif directive.startswith(u"/*"):
+                        comment = u"*/" not in directive
+                    elif directive and not directive.startswith(u"//"):
+                        prologue = False
+                lines.append(line)
+                continue
+
             inc_res = include_re.match(line)
-            guard_res = guard_re.match(line)
-            if not inc_res and not guard_res:
+            if inc_res:
+                if prologue:
+                    depends.append((inc_res.group(1) or inc_res.group(2))[1:-1])
+                continue
+            if guard_re.match(line):
+                continue
+
+            name = directive_re.match(directive)
+            name = name.group(1) if name else u""
+            if name in ("if", "ifdef", "ifndef"):
+                conditions.append(directive.strip())
+            elif name in ("elif", "else") and conditions:
+                conditions[-1] += u" / " + directive.strip()
+            elif name == "endif" and conditions:
+                conditions.pop()
+            elif name in ("define", "undef"):
+                defines = True
+            if name not in prologue_directives:
+                prologue = False
+
+            sys_res = system_include_re.match(directive)
+            if sys_res and not defines:
+                lines.append(SystemInclude(line, sys_res.group(1), conditions))
+            else:
+                lines.append(line)
+    return (lines, depends)
+
+def resolve_include(fname, include):
+    """Returns the input file that is included from fname, or None if not unique"""
+    suffix = u"/" + include
+    candidates = [f for f in args.inputs if ("/" + f).endswith(suffix)]
+    local = [f for f in candidates if os.path.dirname(f) == os.path.dirname(fname)]
+    if len(local) == 1:
+        return local[0]
+    if len(candidates) == 1:
+        return candidates[0]
+    return None
+
+def order_headers(headers):
+    """Topological order of the headers along the includes at the beginning of
+    the files. Otherwise (and to break cycles) the order of the inputs is kept."""
+    index = dict((f, i) for i, f in enumerate(headers))
+    after = dict((f, set()) for f in headers)
+    before = dict((f, set()) for f in headers)
+    for f in headers:
+        for include in depends[f]:
+            dep = resolve_include(f, include)
+            if dep in index and dep != f:
+                after[dep].add(f)
+                before[f].add(dep)
+    ordered = []
+    ready = [(i, f) for i, f in enumerate(headers) if not before[f]]
+    heapq.heapify(ready)
+    remaining = set(headers)
+    while remaining:
+        if not ready:
+            # Break a cycle at the first remaining input
+            f = min(remaining, key=index.get)
+            print("Include cycle in '" + f + "'")
+            before[f].clear()
+            heapq.heappush(ready, (index[f], f))
+        (_, f) = heapq.heappop(ready)
+        if f not in remaining:
+            continue
+        remaining.remove(f)
+        ordered.append(f)
+        for g in after[f]:
+            before[g].discard(f)
+            if not before[g] and g in remaining:
+                heapq.heappush(ready, (index[g], g))
+    return ordered
+
+def write_output(path, prologue, headers, sources, epilogue=u""):
+    """Write the headers and then the sources. The system includes are
+    deduplicated. Those at the top level of the sources are hoisted in front of
+    all sources. The file is only written if its content has changed, so that
+    the unchanged outputs are not compiled again."""
+    print ("Starting amalgamating file "+ path)
+    file = io.StringIO()
+    file.write(license_header)
+    file.write(prologue)
+    included = set(included_before)
+    for fname in headers:
+        print ("Integrating file '" + fname + "'...", end=""),
+        for line in contents[fname]:
+            if not isinstance(line, SystemInclude):
                 file.write(line)
-        # Ensure file is written to disk.
-        file.flush()
-        os.fsync(file.fileno())
+            elif line.key not in included:
+                included.add(line.key)
+                file.write(line.line)
         print ("done."),
 
+    hoisted = []
+    for fname in sources:
+        for line in contents[fname]:
+            if isinstance(line, SystemInclude) and line.hoistable and line.key not in included:
+                included.add(line.key)
+                hoisted.append(line.line)
+    if hoisted:
+        file.write(u"\n/*********************************** hoisted system includes ***********************************/\n\n")
+        file.writelines(hoisted)
+    for fname in sources:
+        print ("Integrating file '" + fname + "'...", end=""),
+        for line in contents[fname]:
+            if not isinstance(line, SystemInclude):
+                file.write(line)
+            elif line.key not in included:
+                included.add(line.key)
+                file.write(line.line)
+        print ("done."),
+    file.write(epilogue)
+    text = file.getvalue()
+
+    if os.path.isfile(path):
+        with io.open(path, encoding='utf8', errors='replace') as f:
+            if f.read() == text:
+                print ("The file " + path + " is unchanged.")
+                return
+
+    out = io.open(path, 'wt', encoding='utf8', errors='replace')
+    out.write(text)
+    # Ensure file is written to disk.
+    # See https://stackoverflow.com/questions/13761961/large-file-not-flushed-to-disk-immediately-after-calling-close
+    out.flush()
+    os.fsync(out.fileno())
+    out.close()
+
+    print ("The size of "+path+" is "+ str(os.path.getsize(path))+" Bytes.")
+
+def guarded(name):
+    guard = name.upper() + u"_H_"
+    return (u"#ifndef %s\n#define %s\n" % (guard, guard), u"#endif /* %s */\n" % guard)
+
+def write_stamp():
+    if args.stamp:
+        with io.open(args.stamp, 'wt', encoding='utf8') as f:
+            f.write(args.version + u"\n")
+
+def file_hash(fname):
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def output_files():
+    if not is_c or args.shards <= 1:
+        return [args.outfile]
+    files = [os.path.join(outdir, outname + u"_internal.h")]
+    files += [os.path.join(outdir, u"%s_part%d.c" % (outname, k + 1)) for k in range(args.shards)]
+    return files
+
+# Skip the amalgamation if neither the inputs, nor the options, nor this script
+# have changed since the outputs were written
+manifest = None
+if args.manifest:
+    manifest = {'version': args.version,
+                'script': file_hash(__file__),
+                'outputs': output_files(),
+                'inputs': [[fname, file_hash(fname)] for fname in args.inputs]}
+    if os.path.isfile(args.manifest) and all(os.path.isfile(f) for f in manifest['outputs']):
+        with io.open(args.manifest, encoding='utf8') as f:
+            try:
+                previous = json.load(f)
+            except ValueError:
+                previous = None
+        if previous == manifest:
+            print ("The amalgamation " + args.outfile + " is up to date.")
+            write_stamp()
+            sys.exit(0)
+
+contents = {}
+depends = {}
+for fname in args.inputs:
+    (contents[fname], depends[fname]) = read_input(fname)
+
+headers = order_headers([f for f in args.inputs if not f.endswith(".c")])
+sources = [f for f in args.inputs if f.endswith(".c")]
+included_before = set()
+
 if not is_c:
-    file.write(u"#endif /* %s */\n" % (outname.upper() + u"_H_"))
+    (begin, end) = guarded(outname)
+    write_output(args.outfile, begin, headers, sources, end)
+elif args.shards <= 1:
+    write_output(args.outfile, c_prologue, headers, sources)
+else:
+    # The internal headers are shared by all shards. The sources are never
+    # split up, so that static symbols remain in the translation unit where
+    # they are defined. Assign the largest sources first to the shard with the
+    # fewest lines and keep the original order within every shard.
+    internal = outname + u"_internal"
+    (begin, end) = guarded(internal)
+    write_output(os.path.join(outdir, internal + u".h"), begin, headers, [], end)
+    for fname in headers:
+        included_before.update(l.key for l in contents[fname] if isinstance(l, SystemInclude))
+
+    shards = [[] for _ in range(args.shards)]
+    shard_lines = [0] * args.shards
+    for fname in sorted(sources, key=lambda f: len(contents[f]), reverse=True):
+        k = shard_lines.index(min(shard_lines))
+        shards[k].append(fname)
+        shard_lines[k] += len(contents[fname])
+
+    prologue = c_prologue + u'#include "%s.h"\n' % internal
+    for k, shard in enumerate(shards):
+        shard.sort(key=sources.index)
+        write_output(os.path.join(outdir, u"%s_part%d.c" % (outname, k + 1)), prologue, [], shard)
 
-# Ensure file is written to disk.
-# See https://stackoverflow.com/questions/13761961/large-file-not-flushed-to-disk-immediately-after-calling-close
-file.flush()
-os.fsync(file.fileno())
-file.close()
+if manifest:
+    with io.open(args.manifest, 'wt', encoding='utf8') as f:
+        f.write(u"%s" % json.dumps(manifest, indent=2))
 
-print ("The size of "+args.outfile+" is "+ str(os.path.getsize(args.outfile))+" Bytes.")
+write_stamp()
@@ -1,11 +1,16 @@
 #!/usr/bin/env python
 
 # This Source Code Form is subject to the terms of the Mozilla Public
-# License, v. 2.0. If a copy of the MPL was not distributed with this 
+# License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import sys
 import re
+import os
+import json
+import hashlib
+import argparse
+import multiprocessing
 
 # Converts a header file to restructured text documentation
 #
@@ -15,12 +20,19 @@ import re
 # The beginning and end of the header are removed.
 # - Find the first /** */ comment -> start of the documentation
 # - Find the last line beginning with "#ifdef" -> end of the documentation
+#
+# In batch mode, many input/output pairs are converted in a process pool. With
+# a cache file, outputs are only written again if their input has changed.
 
 remove_keyword = [" UA_EXPORT", " UA_FUNC_ATTR_WARN_UNUSED_RESULT",
                   " UA_FUNC_ATTR_MALLOC", " UA_RESTRICT "]
 
+clean_comment_re = re.compile("^\s*(\* |/\*\* )(.*?)( \*/)?$")
+comment_start_re = re.compile("^\s*/\*\*[ \n]")
+comment_end_re = re.compile(" \*/$")
+
 def clean_comment(line):
-    m = re.search("^\s*(\* |/\*\* )(.*?)( \*/)?$", line)
+    m = clean_comment_re.search(line)
     if not m:
         return "\n"
     return m.group(2) + "\n"
@@ -31,16 +43,10 @@ def clean_line(line):
     return line
 
 def comment_start(line):
-    m = re.search("^\s*/\*\*[ \n]", line)
-    if not m:
-        return False
-    return True
+    return comment_start_re.search(line) is not None
 
 def comment_end(line):
-    m = re.search(" \*/$", line)
-    if not m:
-        return False
-    return True
+    return comment_end_re.search(line) is not None
 
 def first_line(c):
     "Searches for the first comment"
@@ -51,30 +57,28 @@ def first_line(c):
 
 def last_line(c):
     "Searches for the latest ifdef (closing the include guard)"
-    reg = re.compile("^#ifdef")
-    for i in range(len(c)-1,1,-1):
-        if "_UA_END_DECLS" in c[i]:
-            reg = re.compile("^_UA_END_DECLS")
-    last = 1
+    # A single pass for both the latest _UA_END_DECLS and the latest ifdef
+    has_decls = False
+    last_decls = None
+    last_ifdef = None
     for i in range(len(c)-1,1,-1):
-        m = reg.match(c[i])
-        if m:
-            last = i
-            break
+        line = c[i]
+        if "_UA_END_DECLS" in line:
+            has_decls = True
+            if last_decls is None and line.startswith("_UA_END_DECLS"):
+                last_decls = i
+        if last_ifdef is None and line.startswith("#ifdef"):
+            last_ifdef = i
+    last = last_decls if has_decls else last_ifdef
+    if last is None:
+        last = 1
     # skip empty lines at the end
     for i in range(last-1,1,-1):
         if len(c[i].strip()) > 0:
             return i
     return len(c)-1
 
-if len(sys.argv) < 2:
-    print("Usage: python c2rst.py input.c/h output.rst")
-    exit(0)
-
-with open(sys.argv[1]) as f:
-    c = f.readlines()
-
-with open(sys.argv[2], 'w') as rst:
+def convert(c, rst):
     in_doc = False
     last = last_line(c)
     for i in range(first_line(c), last+1):
@@ -101,3 +105,89 @@ with open(sys.argv[2], 'w') as rst:
         if doc_end and i < last:
             rst.write("\n.. code-block:: c\n\n")
             in_doc = False
+
+def convert_file(infile, outfile):
+    with open(infile) as f:
+        c = f.readlines()
+    with open(outfile, 'w') as rst:
+        convert(c, rst)
+
+def file_hash(path, salt):
+    h = hashlib.sha1(salt)
+    with open(path, 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+def convert_pair(pair):
+    (infile, outfile) = pair
+    convert_file(infile, outfile)
+    return outfile
+
+def convert_batch(pairs, jobs, cache_file):
+    """Converts all (input, output) pairs. Returns the number of converted files."""
+    # The hash of an input also covers this script. So all outputs are written
+    # again when the conversion changes.
+    with open(os.path.abspath(__file__), 'rb') as f:
+        salt = hashlib.sha1(f.read()).digest()
+    cache = {}
+    if cache_file and os.path.isfile(cache_file):
+        with open(cache_file) as f:
+            try:
+                cache = json.load(f)
+            except ValueError:
+                cache = {}
+
+    hashes = {}
+    todo = []
+    for (infile, outfile) in pairs:
+        hashes[outfile] = file_hash(infile, salt)
+        if cache.get(outfile) != hashes[outfile] or not os.path.isfile(outfile):
+            todo.append((infile, outfile))
+
+    if len(todo) > 1 and jobs != 1:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            pool.map(convert_pair, todo)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for pair in todo:
+            convert_pair(pair)
+
+    if cache_file:
+        for (_, outfile) in pairs:
+            cache[outfile] = hashes[outfile]
+        with open(cache_file, 'w') as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+    return len(todo)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        parser = argparse.ArgumentParser(prog="c2rst.py --batch")
+        parser.add_argument('-j', '--jobs', type=int, default=None,
+                            help='number of worker processes (defaults to the number of cpus)')
+        parser.add_argument('--cache',
+                            help='JSON file with the input hashes of the last run. Unchanged inputs are skipped')
+        parser.add_argument('--stamp',
+                            help='file that is written on every run. The build system tracks the stamp, '
+                                 'as the skipped outputs keep their timestamp')
+        parser.add_argument('files', nargs='+', metavar='input.c/h output.rst',
+                            help='pairs of input and output files')
+        args = parser.parse_args(sys.argv[2:])
+        if len(args.files) % 2 != 0:
+            parser.error("the files must be pairs of input and output")
+        pairs = list(zip(args.files[0::2], args.files[1::2]))
+        converted = convert_batch(pairs, args.jobs, args.cache)
+        if args.stamp:
+            with open(args.stamp, 'w') as f:
+                f.write("%d\n" % converted)
+        print("Converted %d of %d files to rst" % (converted, len(pairs)))
+        exit(0)
+
+    if len(sys.argv) < 3:
+        print("Usage: python c2rst.py input.c/h output.rst")
+        print("       python c2rst.py --batch [-j jobs] [--cache cache.json] [--stamp file] input.c/h output.rst ...")
+        exit(0)
+
+    convert_file(sys.argv[1], sys.argv[2])
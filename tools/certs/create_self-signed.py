@@ -11,6 +11,10 @@ import sys
 import os
 import socket
 import argparse
+import random
+import shutil
+import subprocess
+import multiprocessing
 
 parser = argparse.ArgumentParser()
 
@@ -37,6 +41,35 @@ parser.add_argument('-c', '--certificatename',
                      default="",
                      dest="certificatename")
 
+parser.add_argument('--bulk',
+                    metavar="<NumberOfClients>",
+                    type=int,
+                    default=0,
+                    dest="bulk",
+                    help='Generate a PKI directory in <OutputDirectory> with this number of client ' +
+                         'certificates that are signed by a common CA')
+
+parser.add_argument('--servers',
+                    metavar="<NumberOfServers>",
+                    type=int,
+                    default=1,
+                    dest="servers",
+                    help='Number of server certificates in the bulk mode (default 1)')
+
+parser.add_argument('--ca',
+                    metavar="<CADirectory>",
+                    type=str,
+                    default="",
+                    dest="ca",
+                    help='Reuse the CA (ca.crt and ca.key in PEM format) from this directory in the bulk mode')
+
+parser.add_argument('-j', '--jobs',
+                    metavar="<Jobs>",
+                    type=int,
+                    default=None,
+                    dest="jobs",
+                    help='Number of parallel openssl processes in the bulk mode (defaults to the number of cpus)')
+
 args = parser.parse_args()
 
 if not os.path.exists(args.outdir):
@@ -52,7 +85,7 @@ if args.uri == "":
     print("No ApplicationUri given for the certificate. Setting to %s" % args.uri)
 os.environ['URI1'] = args.uri
 
-if args.certificatename == "":
+if args.certificatename == "" and not args.bulk:
     certificatename = "server"
     print("No Certificate name provided. Setting to %s" % certificatename)
 
@@ -100,6 +133,115 @@ if iteratorValue < 2:
 os.environ['HOSTNAME'] = socket.gethostname()
 openssl_conf = os.path.join(certsdir, "localhost.cnf")
 
+# Configuration for the CA of the bulk mode
+ca_conf = """
+[ req ]
+distinguished_name = req_distinguished_name
+x509_extensions = v3_ca
+prompt = no
+
+[ req_distinguished_name ]
+C = DE
+O = open62541
+CN = open62541 Test CA
+
+[ v3_ca ]
+subjectKeyIdentifier = hash
+authorityKeyIdentifier = keyid:always,issuer
+basicConstraints = critical, CA:true
+keyUsage = critical, keyCertSign, cRLSign
+"""
+
+def openssl(*arguments, **kwargs):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(("openssl",) + arguments, stdout=devnull, stderr=devnull, **kwargs)
+
+def create_ca(cadir):
+    """Creates a self-signed CA in cadir (ca.crt/ca.key as PEM, ca_cert.der)"""
+    conf = os.path.join(cadir, "ca.cnf")
+    with open(conf, 'w') as f:
+        f.write(ca_conf)
+    openssl("req", "-config", conf, "-new", "-nodes", "-x509", "-sha256",
+            "-newkey", "rsa:%d" % keysize, "-keyout", os.path.join(cadir, "ca.key"),
+            "-days", "3650", "-out", os.path.join(cadir, "ca.crt"))
+    os.remove(conf)
+
+def create_signed(job):
+    """Creates a key pair and a certificate signed by the CA. The certificate and
+    key are written in DER format to <pki>/own."""
+    (name, uri, serial, pki, cadir) = job
+    env = dict(os.environ)
+    env['URI1'] = uri
+    own = os.path.join(pki, "own")
+    key = os.path.join(own, name + "_key.pem")
+    csr = os.path.join(own, name + ".csr")
+    openssl("req", "-config", openssl_conf, "-new", "-nodes", "-sha256",
+            "-newkey", "rsa:%d" % keysize, "-keyout", key,
+            "-subj", "/C=DE/O=open62541/CN=open62541 %s@%s" % (name, env['HOSTNAME']),
+            "-out", csr, env=env)
+    openssl("x509", "-req", "-in", csr, "-sha256", "-days", "365",
+            "-CA", os.path.join(cadir, "ca.crt"), "-CAkey", os.path.join(cadir, "ca.key"),
+            "-set_serial", str(serial), "-extfile", openssl_conf, "-extensions", "v3_ca",
+            "-outform", "der", "-out", os.path.join(own, name + "_cert.der"), env=env)
+    openssl("rsa", "-inform", "PEM", "-in", key, "-outform", "DER",
+            "-out", os.path.join(own, name + "_key.der"))
+    os.remove(key)
+    os.remove(csr)
+    return name
+
+def create_bulk(outdir):
+    """Creates the PKI layout
+      ca/       the CA (PEM for reuse with --ca, DER for the applications)
+      trusted/  the trust list with the CA certificate
+      issuers/  issuer list (empty)
+      revoked/  revocation list (empty)
+      own/      the certificates and keys <name>_cert.der and <name>_key.der"""
+    pki = os.path.abspath(outdir)
+    for d in ["ca", "trusted", "issuers", "revoked", "own"]:
+        if not os.path.exists(os.path.join(pki, d)):
+            os.makedirs(os.path.join(pki, d))
+
+    cadir = os.path.join(pki, "ca")
+    if args.ca:
+        for f in ["ca.crt", "ca.key"]:
+            if os.path.abspath(os.path.join(args.ca, f)) != os.path.join(cadir, f):
+                shutil.copy(os.path.join(args.ca, f), cadir)
+    else:
+        create_ca(cadir)
+    openssl("x509", "-in", os.path.join(cadir, "ca.crt"), "-outform", "der",
+            "-out", os.path.join(cadir, "ca_cert.der"))
+    shutil.copy(os.path.join(cadir, "ca_cert.der"), os.path.join(pki, "trusted"))
+
+    # Random serial numbers, so that certificates of several runs with the
+    # same CA are distinct
+    rng = random.SystemRandom()
+    serials = set()
+    while len(serials) < args.servers + args.bulk:
+        serial = rng.getrandbits(63)
+        if serial > 0:
+            serials.add(serial)
+    serials = list(serials)
+    jobs = []
+    for i in range(args.servers):
+        jobs.append(("server_%04d" % i, "%s.%d" % (args.uri, i), serials.pop(), pki, cadir))
+    client_uri = "urn:open62541.client.application"
+    for i in range(args.bulk):
+        jobs.append(("client_%04d" % i, "%s.%d" % (client_uri, i), serials.pop(), pki, cadir))
+
+    pool = multiprocessing.Pool(args.jobs)
+    try:
+        for name in pool.imap_unordered(create_signed, jobs):
+            print("Generated " + name)
+    finally:
+        pool.close()
+        pool.join()
+
+    print("%d server and %d client certificates generated in %s" % (args.servers, args.bulk, pki))
+
+if args.bulk:
+    create_bulk(args.outdir)
+    sys.exit(0)
+
 os.chdir(os.path.abspath(args.outdir))
 
 os.system("""openssl req \
@@ -6,11 +6,16 @@
 #
 # The resulting files will be put into OUTPUT_DIR with the names:
 # - NAME.h
+# - NAME.c (only with the NAMES option)
 #
 #
 # The following arguments are accepted:
 #   Options:
 #
+#   [NAMES]         Optional argument. If given, NAME.c is generated with the functions
+#                   UA_<ID_PREFIX>ID_name and UA_<ID_PREFIX>ID_fromName to convert between
+#                   the numeric ids and their symbolic names. NAME.c must be compiled.
+#
 #   Arguments taking one value:
 #
 #   NAME            Full name of the generated files, e.g. di_nodeids
@@ -21,7 +26,7 @@
 #   FILE_CSV        Path to the .csv file containing the node ids, e.g. 'OpcUaDiModel.csv'
 #
 function(ua_generate_nodeid_header)
-    set(options )
+    set(options NAMES)
     set(oneValueArgs NAME ID_PREFIX OUTPUT_DIR FILE_CSV TARGET_SUFFIX TARGET_PREFIX)
     set(multiValueArgs )
     cmake_parse_arguments(UA_GEN_ID "${options}" "${oneValueArgs}" "${multiValueArgs}" ${ARGN} )
@@ -42,8 +47,15 @@ function(ua_generate_nodeid_header)
     # Replace dash with underscore to make valid c literal
     string(REPLACE "-" "_" UA_GEN_ID_NAME ${UA_GEN_ID_NAME})
 
+    set(UA_GEN_ID_OUTPUT ${UA_GEN_ID_OUTPUT_DIR}/${UA_GEN_ID_NAME}.h)
+    set(UA_GEN_ID_NAMES_ARG "")
+    if(UA_GEN_ID_NAMES)
+        list(APPEND UA_GEN_ID_OUTPUT ${UA_GEN_ID_OUTPUT_DIR}/${UA_GEN_ID_NAME}.c)
+        set(UA_GEN_ID_NAMES_ARG "--names")
+    endif()
+
     add_custom_target(${UA_GEN_ID_TARGET_PREFIX}-${UA_GEN_ID_TARGET_SUFFIX} DEPENDS
-        ${UA_GEN_ID_OUTPUT_DIR}/${UA_GEN_ID_NAME}.h
+        ${UA_GEN_ID_OUTPUT}
     )
 
     # Make sure that the output directory exists
@@ -52,10 +64,11 @@ function(ua_generate_nodeid_header)
     endif()
 
     # Header containing defines for all NodeIds
-    add_custom_command(OUTPUT ${UA_GEN_ID_OUTPUT_DIR}/${UA_GEN_ID_NAME}.h
+    add_custom_command(OUTPUT ${UA_GEN_ID_OUTPUT}
         PRE_BUILD
         COMMAND ${PYTHON_EXECUTABLE} ${open62541_TOOLS_DIR}/generate_nodeid_header.py
         ${UA_GEN_ID_FILE_CSV}  ${UA_GEN_ID_OUTPUT_DIR}/${UA_GEN_ID_NAME} ${UA_GEN_ID_ID_PREFIX}
+        ${UA_GEN_ID_NAMES_ARG}
         DEPENDS ${open62541_TOOLS_DIR}/generate_nodeid_header.py
         ${UA_GEN_ID_FILE_CSV})
 endfunction()
@@ -82,6 +95,11 @@ endfunction()
 #
 #   [BUILTIN]       Optional argument. If given, then builtin types will be generated.
 #   [INTERNAL]      Optional argument. If given, then the given types file is seen as internal file (e.g. does not require a .csv)
+#   [SPLIT_HEADERS] Optional argument. If given, the handling and encoding functions of every type are written into
+#                   a separate header in the directories NAME_generated_handling and NAME_generated_encoding_binary.
+#                   The NAME_generated_handling.h and NAME_generated_encoding_binary.h headers include them all.
+#                   The headers are listed when cmake runs and added to UA_NAME_HEADERS. They are also available
+#                   separately as UA_NAME_HANDLING_HEADERS and UA_NAME_ENCODING_BINARY_HEADERS.
 #
 #   Arguments taking one value:
 #
@@ -104,12 +122,15 @@ endfunction()
 #                   Multiple files can be passed which will all be imported.
 #   [FILES_SELECTED] Optional path to a simple text file which contains a list of types which should be included in the generation.
 #                   The file should contain one type per line. Multiple files can be passed to this argument.
+#   [FILES_SELECTED_NODESETS] Optional path to NodeSet2 XML files. The types referenced from the DataType attributes
+#                   and ExtensionObject values in the files are generated in addition to the FILES_SELECTED types.
+#                   If given, the member types of all selected types are added automatically.
 #
 #
 function(ua_generate_datatypes)
-    set(options BUILTIN INTERNAL)
+    set(options BUILTIN INTERNAL SPLIT_HEADERS)
     set(oneValueArgs NAME TARGET_SUFFIX TARGET_PREFIX NAMESPACE_IDX OUTPUT_DIR FILE_CSV)
-    set(multiValueArgs FILES_BSD IMPORT_BSD FILES_SELECTED)
+    set(multiValueArgs FILES_BSD IMPORT_BSD FILES_SELECTED FILES_SELECTED_NODESETS)
     cmake_parse_arguments(UA_GEN_DT "${options}" "${oneValueArgs}" "${multiValueArgs}" ${ARGN} )
 
     if(NOT DEFINED open62541_TOOLS_DIR)
@@ -154,11 +175,20 @@ function(ua_generate_datatypes)
         set(UA_GEN_DT_INTERNAL_ARG "--internal")
     endif()
 
+    set(UA_GEN_DT_SPLIT_HEADERS_ARG "")
+    if (UA_GEN_DT_SPLIT_HEADERS)
+        set(UA_GEN_DT_SPLIT_HEADERS_ARG "--split-headers")
+    endif()
+
     set(SELECTED_TYPES_TMP "")
     foreach(f ${UA_GEN_DT_FILES_SELECTED})
         set(SELECTED_TYPES_TMP ${SELECTED_TYPES_TMP} "--selected-types=${f}")
     endforeach()
 
+    foreach(f ${UA_GEN_DT_FILES_SELECTED_NODESETS})
+        set(SELECTED_TYPES_TMP ${SELECTED_TYPES_TMP} "--selected-nodeset=${f}")
+    endforeach()
+
     set(BSD_FILES_TMP "")
     foreach(f ${UA_GEN_DT_FILES_BSD})
         set(BSD_FILES_TMP ${BSD_FILES_TMP} "--type-bsd=${f}")
@@ -177,10 +207,51 @@ function(ua_generate_datatypes)
     # Replace dash with underscore to make valid c literal
     string(REPLACE "-" "_" UA_GEN_DT_NAME ${UA_GEN_DT_NAME})
 
+    # The headers of the single types depend on the selected types. They are
+    # listed now, so that they can be declared as outputs and installed. Cmake
+    # runs again when the inputs change.
+    set(UA_GEN_DT_HANDLING_HEADERS "")
+    set(UA_GEN_DT_ENCODING_BINARY_HEADERS "")
+    if (UA_GEN_DT_SPLIT_HEADERS)
+        execute_process(COMMAND ${PYTHON_EXECUTABLE} ${open62541_TOOLS_DIR}/generate_datatypes.py
+                        --namespace=${UA_GEN_DT_NAMESPACE_IDX}
+                        ${SELECTED_TYPES_TMP}
+                        ${BSD_FILES_TMP}
+                        ${IMPORT_BSD_TMP}
+                        --type-csv=${UA_GEN_DT_FILE_CSV}
+                        ${UA_GEN_DT_NO_BUILTIN}
+                        ${UA_GEN_DT_INTERNAL_ARG}
+                        --list-split-headers
+                        ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}
+                        RESULT_VARIABLE GEN_SPLIT_RESULT
+                        OUTPUT_VARIABLE GEN_SPLIT_HEADERS
+                        OUTPUT_STRIP_TRAILING_WHITESPACE)
+        if(NOT GEN_SPLIT_RESULT EQUAL 0)
+            message(FATAL_ERROR "ua_generate_datatypes could not list the split headers of ${UA_GEN_DT_NAME}")
+        endif()
+        string(REPLACE "\n" ";" GEN_SPLIT_HEADERS "${GEN_SPLIT_HEADERS}")
+        foreach(f ${GEN_SPLIT_HEADERS})
+            if(f MATCHES "_generated_handling/[^/]*$")
+                list(APPEND UA_GEN_DT_HANDLING_HEADERS ${f})
+            else()
+                list(APPEND UA_GEN_DT_ENCODING_BINARY_HEADERS ${f})
+            endif()
+        endforeach()
+        set_property(DIRECTORY APPEND PROPERTY CMAKE_CONFIGURE_DEPENDS
+                     ${open62541_TOOLS_DIR}/generate_datatypes.py
+                     ${open62541_TOOLS_DIR}/nodeset_compiler/type_parser.py
+                     ${UA_GEN_DT_FILES_BSD}
+                     ${UA_GEN_DT_FILE_CSV}
+                     ${UA_GEN_DT_FILES_SELECTED}
+                     ${UA_GEN_DT_FILES_SELECTED_NODESETS})
+    endif()
+
     add_custom_command(OUTPUT ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated.c
         ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated.h
         ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated_handling.h
         ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated_encoding_binary.h
+        ${UA_GEN_DT_HANDLING_HEADERS}
+        ${UA_GEN_DT_ENCODING_BINARY_HEADERS}
         PRE_BUILD
         COMMAND ${PYTHON_EXECUTABLE} ${open62541_TOOLS_DIR}/generate_datatypes.py
         --namespace=${UA_GEN_DT_NAMESPACE_IDX}
@@ -190,22 +261,34 @@ function(ua_generate_datatypes)
         --type-csv=${UA_GEN_DT_FILE_CSV}
         ${UA_GEN_DT_NO_BUILTIN}
         ${UA_GEN_DT_INTERNAL_ARG}
+        ${UA_GEN_DT_SPLIT_HEADERS_ARG}
         ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}
         DEPENDS ${open62541_TOOLS_DIR}/generate_datatypes.py
+        ${open62541_TOOLS_DIR}/nodeset_compiler/backend_open62541_typedefinitions.py
+        ${open62541_TOOLS_DIR}/nodeset_compiler/type_parser.py
         ${UA_GEN_DT_FILES_BSD}
         ${UA_GEN_DT_FILE_CSV}
-        ${UA_GEN_DT_FILES_SELECTED})
+        ${UA_GEN_DT_FILES_SELECTED}
+        ${UA_GEN_DT_FILES_SELECTED_NODESETS})
     add_custom_target(${UA_GEN_DT_TARGET_PREFIX}-${UA_GEN_DT_TARGET_SUFFIX} DEPENDS
         ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated.c
         ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated.h
         ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated_handling.h
         ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated_encoding_binary.h
+        ${UA_GEN_DT_HANDLING_HEADERS}
+        ${UA_GEN_DT_ENCODING_BINARY_HEADERS}
         )
 
     string(TOUPPER "${UA_GEN_DT_NAME}" GEN_NAME_UPPER)
     set(UA_${GEN_NAME_UPPER}_SOURCES "${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated.c" CACHE INTERNAL "${UA_GEN_DT_NAME} source files")
-    set(UA_${GEN_NAME_UPPER}_HEADERS "${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated.h;${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated_handling.h;${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated_encoding_binary.h"
-        CACHE INTERNAL "${UA_GEN_DT_NAME} header files")
+    set(GEN_HEADERS ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated.h
+        ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated_handling.h
+        ${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated_encoding_binary.h
+        ${UA_GEN_DT_HANDLING_HEADERS}
+        ${UA_GEN_DT_ENCODING_BINARY_HEADERS})
+    set(UA_${GEN_NAME_UPPER}_HEADERS "${GEN_HEADERS}" CACHE INTERNAL "${UA_GEN_DT_NAME} header files")
+    set(UA_${GEN_NAME_UPPER}_HANDLING_HEADERS "${UA_GEN_DT_HANDLING_HEADERS}" CACHE INTERNAL "${UA_GEN_DT_NAME} handling headers of the single types")
+    set(UA_${GEN_NAME_UPPER}_ENCODING_BINARY_HEADERS "${UA_GEN_DT_ENCODING_BINARY_HEADERS}" CACHE INTERNAL "${UA_GEN_DT_NAME} encoding headers of the single types")
 
     if(UA_FORCE_CPP)
         set_source_files_properties(${UA_GEN_DT_OUTPUT_DIR}/${UA_GEN_DT_NAME}_generated.c PROPERTIES LANGUAGE CXX)
@@ -229,6 +312,8 @@ endfunction()
 #   Options:
 #
 #   [INTERNAL]      Optional argument. If given, then the generated node set code will use internal headers.
+#   [PROFILE]       Optional argument. If given, then the generated node set code contains timing hooks that are
+#                   compiled in with UA_NODESET_PROFILE (see tools/nodeset_compiler/nodeset_profile.py).
 #
 #   Arguments taking one value:
 #
@@ -241,6 +326,9 @@ endfunction()
 #                   nodeset, including all the references to and from that node. The format is a node id per line.
 #                   Supported formats: "i=123" (for NS0), "ns=2;s=asdf" (matches NS2 in that specific file), or recommended
 #                   "ns=http://opcfoundation.org/UA/DI/;i=123" namespace index independent node id
+#   [BACKEND]       Optional backend of the nodeset compiler. Default `open62541`. With `binary` the nodeset is additionally written
+#                   to namespace_NAME.bin and the generated function loads it with UA_Server_loadNodeSet. This requires
+#                   UA_ENABLE_NODESET_LOADER.
 #
 #   Arguments taking multiple values:
 #
@@ -252,8 +340,8 @@ endfunction()
 #
 function(ua_generate_nodeset)
 
-    set(options INTERNAL )
-    set(oneValueArgs NAME TYPES_ARRAY OUTPUT_DIR IGNORE TARGET_PREFIX BLACKLIST)
+    set(options INTERNAL PROFILE)
+    set(oneValueArgs NAME TYPES_ARRAY OUTPUT_DIR IGNORE TARGET_PREFIX BLACKLIST BACKEND)
     set(multiValueArgs FILE DEPENDS_TYPES DEPENDS_NS DEPENDS_TARGET)
     cmake_parse_arguments(UA_GEN_NS "${options}" "${oneValueArgs}" "${multiValueArgs}" ${ARGN} )
 
@@ -281,6 +369,17 @@ function(ua_generate_nodeset)
         set(UA_GEN_NS_TARGET_PREFIX "open62541-generator")
     endif()
 
+    # Set default backend
+    if(NOT UA_GEN_NS_BACKEND OR "${UA_GEN_NS_BACKEND}" STREQUAL "")
+        set(UA_GEN_NS_BACKEND "open62541")
+    endif()
+    if(NOT "${UA_GEN_NS_BACKEND}" STREQUAL "open62541" AND NOT "${UA_GEN_NS_BACKEND}" STREQUAL "binary")
+        message(FATAL_ERROR "ua_generate_nodeset function does not support the backend ${UA_GEN_NS_BACKEND}")
+    endif()
+    if("${UA_GEN_NS_BACKEND}" STREQUAL "binary" AND UA_GEN_NS_PROFILE)
+        message(FATAL_ERROR "ua_generate_nodeset function supports PROFILE only with the open62541 backend")
+    endif()
+
     # Set blacklist file
     set(GEN_BLACKLIST "")
     set(GEN_BLACKLIST_DEPENDS "")
@@ -296,6 +395,11 @@ function(ua_generate_nodeset)
         set(GEN_INTERNAL_HEADERS "--internal-headers")
     endif()
 
+    set(GEN_PROFILE "")
+    if (UA_GEN_NS_PROFILE)
+        set(GEN_PROFILE "--profile")
+    endif()
+
     set(GEN_NS0 "")
     set(TARGET_SUFFIX "ns-${UA_GEN_NS_NAME}")
     set(FILE_SUFFIX "_${UA_GEN_NS_NAME}_generated")
@@ -338,11 +442,35 @@ function(ua_generate_nodeset)
         file(MAKE_DIRECTORY ${UA_GEN_NS_OUTPUT_DIR})
     endif()
 
+    # The client passes the job to the compiler daemon, which keeps the parsed
+    # dependencies in memory between the nodesets
+    set(GEN_COMPILER ${open62541_TOOLS_DIR}/nodeset_compiler/nodeset_compiler.py)
+    if(UA_NODESET_COMPILER_DAEMON AND NOT WIN32)
+        set(GEN_COMPILER ${open62541_TOOLS_DIR}/nodeset_compiler/nodeset_compiler_client.py
+            --daemon=${PROJECT_BINARY_DIR}/nodeset_compiler.sock)
+    endif()
+
+    # The table of the nodes in the timing hooks
+    set(GEN_PROFILE_OUTPUT "")
+    if (UA_GEN_NS_PROFILE)
+        set(GEN_PROFILE_OUTPUT ${UA_GEN_NS_OUTPUT_DIR}/namespace${FILE_SUFFIX}.profile.csv)
+    endif()
+
+    # The binary backend writes the encoded nodeset also to a file of its own
+    set(GEN_BINARY_OUTPUT "")
+    if ("${UA_GEN_NS_BACKEND}" STREQUAL "binary")
+        set(GEN_BINARY_OUTPUT ${UA_GEN_NS_OUTPUT_DIR}/namespace${FILE_SUFFIX}.bin)
+    endif()
+
     add_custom_command(OUTPUT ${UA_GEN_NS_OUTPUT_DIR}/namespace${FILE_SUFFIX}.c
                        ${UA_GEN_NS_OUTPUT_DIR}/namespace${FILE_SUFFIX}.h
+                       ${GEN_PROFILE_OUTPUT}
+                       ${GEN_BINARY_OUTPUT}
                        PRE_BUILD
-                       COMMAND ${PYTHON_EXECUTABLE} ${open62541_TOOLS_DIR}/nodeset_compiler/nodeset_compiler.py
+                       COMMAND ${PYTHON_EXECUTABLE} ${GEN_COMPILER}
+                       --backend=${UA_GEN_NS_BACKEND}
                        ${GEN_INTERNAL_HEADERS}
+                       ${GEN_PROFILE}
                        ${GEN_NS0}
                        ${GEN_BIN_SIZE}
                        ${GEN_IGNORE}
@@ -359,6 +487,8 @@ function(ua_generate_nodeset)
                        ${open62541_TOOLS_DIR}/nodeset_compiler/backend_open62541.py
                        ${open62541_TOOLS_DIR}/nodeset_compiler/backend_open62541_nodes.py
                        ${open62541_TOOLS_DIR}/nodeset_compiler/backend_open62541_datatypes.py
+                       ${open62541_TOOLS_DIR}/nodeset_compiler/backend_binary.py
+                       ${open62541_TOOLS_DIR}/nodeset_compiler/compiler_stats.py
                        ${UA_GEN_NS_FILE}
                        ${UA_GEN_NS_DEPENDS_NS}
                        ${GEN_BLACKLIST_DEPENDS}
@@ -413,6 +543,8 @@ endfunction()
 #   Options:
 #
 #   INTERNAL        Include internal headers. Required if custom datatypes are added.
+#   SELECT_TYPES    Only generate the datatypes referenced in the FILE_NS nodesets (and their member types).
+#                   See FILES_SELECTED_NODESETS of the ua_generate_datatypes function.
 #
 #   Arguments taking one value:
 #
@@ -441,7 +573,7 @@ endfunction()
 #
 function(ua_generate_nodeset_and_datatypes)
 
-    set(options INTERNAL)
+    set(options INTERNAL SELECT_TYPES)
     set(oneValueArgs NAME FILE_NS FILE_CSV FILE_BSD IMPORT_BSD NAMESPACE_IDX OUTPUT_DIR TARGET_PREFIX BLACKLIST)
     set(multiValueArgs DEPENDS)
     cmake_parse_arguments(UA_GEN "${options}" "${oneValueArgs}" "${multiValueArgs}" ${ARGN} )
@@ -494,6 +626,11 @@ function(ua_generate_nodeset_and_datatypes)
     set(NODESET_DEPENDS_TARGET "")
     set(NODESET_TYPES_ARRAY "UA_TYPES")
 
+    set(NODESET_SELECTED_NODESETS "")
+    if (${UA_GEN_SELECT_TYPES})
+        set(NODESET_SELECTED_NODESETS "${UA_GEN_FILE_NS}")
+    endif()
+
     if(NOT "${UA_GEN_FILE_BSD}" STREQUAL "")
         # Generate Datatypes for nodeset
         ua_generate_datatypes(
@@ -504,6 +641,7 @@ function(ua_generate_nodeset_and_datatypes)
             FILE_CSV "${UA_GEN_FILE_CSV}"
             FILES_BSD "${UA_GEN_FILE_BSD}"
             IMPORT_BSD "${UA_GEN_IMPORT_BSD}"
+            FILES_SELECTED_NODESETS ${NODESET_SELECTED_NODESETS}
             OUTPUT_DIR "${UA_GEN_OUTPUT_DIR}"
         )
         set(NODESET_DEPENDS_TARGET "${UA_GEN_TARGET_PREFIX}-types-${UA_GEN_NAME}")
@@ -3,9 +3,19 @@
 # Load into gdb with 'source <path-to>/tools/gdb-prettyprint.py'
 # Make sure to have 'set print pretty on' to get nice structure printouts
 
+# Strings, ByteStrings and arrays are truncated after the number of elements
+# set with 'set print elements <n>'. Array contents are printed as children that
+# are only read from the inferior when gdb displays them.
+
 import base64
 
+# Looking up a type in the debug info is slow. Cache the result (also if the
+# type was not found) until new debug info is loaded.
+_type_cache = {}
+
 def findType(name):
+    if name in _type_cache:
+        return _type_cache[name]
     tt = None
     try:
         tt = gdb.lookup_type("UA_" + name)
@@ -14,8 +24,35 @@ def findType(name):
             tt = gdb.lookup_type(name)
         except Exception:
             pass
+    _type_cache[name] = tt
     return tt
 
+def _clearTypeCache(event):
+    _type_cache.clear()
+
+if hasattr(gdb, "events") and hasattr(gdb.events, "new_objfile"):
+    gdb.events.new_objfile.connect(_clearTypeCache)
+
+def printLimit():
+    """The 'print elements' setting. None if unlimited."""
+    try:
+        limit = gdb.parameter("print elements")
+    except Exception:
+        return 200
+    if limit is None or limit <= 0:
+        return None
+    return limit
+
+def readMemory(data, length):
+    """Read at most 'print elements' bytes. Returns the bytes and whether they
+    were truncated."""
+    limit = printLimit()
+    truncated = limit is not None and length > limit
+    if truncated:
+        length = limit
+    inferior = gdb.selected_inferior()
+    return (inferior.read_memory(data, length).tobytes(), truncated)
+
 class String:
     def __init__(self, val):
         self.val = val
@@ -25,8 +62,8 @@ class String:
         if int(data) == 0:
             return "UA_STRING_NULL"
         length = int(self.val['length'])
-        inferior = gdb.selected_inferior()
-        return "\"%s\"" % inferior.read_memory(data, length).tobytes().decode(errors='replace')
+        (content, truncated) = readMemory(data, length)
+        return "\"%s\"%s" % (content.decode(errors='replace'), "..." if truncated else "")
 
 class ByteString:
     def __init__(self, val):
@@ -39,9 +76,9 @@ class ByteString:
         data = s['data']
         if int(data) == 0:
             return "UA_BYTESTRING_NULL"
-        inferior = gdb.selected_inferior()
-        encoded = base64.b64encode(inferior.read_memory(data, length).tobytes())
-        return "\"%s\"" % encoded.decode(errors='replace')
+        (content, truncated) = readMemory(data, length)
+        encoded = base64.b64encode(content)
+        return "\"%s\"%s" % (encoded.decode(errors='replace'), "..." if truncated else "")
 
     def to_string(self):
         data = self.val['data']
@@ -125,45 +162,63 @@ class ExtensionObject:
 class Variant:
     def __init__(self, val):
         self.val = val
+        self.tt = None
+        if int(self.val['type']) != 0:
+            datatype = self.val['type'].dereference()
+            self.tt = findType(datatype['typeName'].string())
+
+    def is_array(self):
+        return self.tt and not (int(self.val['arrayLength']) == 0 and int(self.val['data']) > 1)
 
     def to_string(self):
-        if int(self.val['type']) == 0:
+        if not self.tt:
             return "UA_Variant()"
-        datatype = self.val['type'].dereference()
-        tt = findType(datatype['typeName'].string())
-        if not tt:
-            return "UA_Variant()"
-        data_ptr = int(self.val['data'])
-        array_length = int(self.val['arrayLength'])
-        content = None
-        if array_length == 0 and data_ptr > 1:
+        tt = self.tt
+        if not self.is_array():
             content = self.val['data'].cast(tt.pointer()).dereference()
-        else:
-            content = self.val['data'].cast(tt.array(array_length - 1).pointer()).dereference()
+            return "UA_Variant<%s>(%s)" % (tt, content)
+        array_length = int(self.val['arrayLength'])
         dims_length = int(self.val['arrayDimensionsSize'])
         if dims_length == 0:
-            return "UA_Variant<%s>(%s)" % (tt, content)
-        dims_type = findType("UInt32").array(dims_length - 1).pointer()
-        dims = self.val['arrayDimensions'].cast(dims_type).dereference()
-        return "UA_Variant<%s[%i]>(%s, arrayDimensions = %s)" % (tt, array_length, content, dims)
+            return "UA_Variant<%s[%i]>" % (tt, array_length)
+        dims = self.val['arrayDimensions']
+        limit = printLimit()
+        shown = dims_length if limit is None else min(dims_length, limit)
+        dims = ", ".join(str(int(dims[i])) for i in range(shown))
+        if shown < dims_length:
+            dims += "..."
+        return "UA_Variant<%s[%i]>(arrayDimensions = {%s})" % (tt, array_length, dims)
+
+    def display_hint(self):
+        if self.is_array():
+            return 'array'
+        return None
+
+    def children(self):
+        # The elements are read one by one when gdb prints them
+        if not self.is_array():
+            return
+        data = self.val['data'].cast(self.tt.pointer())
+        count = int(self.val['arrayLength'])
+        limit = printLimit()
+        if limit is not None:
+            count = min(count, limit)
+        for i in range(count):
+            yield ("[%i]" % i, data[i])
+
+printers = {'UA_String': String,
+            'UA_ByteString': ByteString,
+            'UA_LocalizedText': LocalizedText,
+            'UA_QualifiedName': QualifiedName,
+            'UA_Guid': Guid,
+            'UA_NodeId': NodeId,
+            'UA_ExtensionObject': ExtensionObject,
+            'UA_Variant': Variant}
 
 def lookup_type (val):
-    if str(val.type) == 'UA_String':
-        return String(val)
-    if str(val.type) == 'UA_ByteString':
-        return ByteString(val)
-    if str(val.type) == 'UA_LocalizedText':
-        return LocalizedText(val)
-    if str(val.type) == 'UA_QualifiedName':
-        return QualifiedName(val)
-    if str(val.type) == 'UA_Guid':
-        return Guid(val)
-    if str(val.type) == 'UA_NodeId':
-        return NodeId(val)
-    if str(val.type) == 'UA_ExtensionObject':
-        return ExtensionObject(val)
-    if str(val.type) == 'UA_Variant':
-        return Variant(val)
+    printer = printers.get(str(val.type))
+    if printer:
+        return printer(val)
     return None
 
 gdb.pretty_printers.append(lookup_type)
@@ -8,6 +8,8 @@ from __future__ import print_function
 from nodeset_compiler.type_parser import CSVBSDTypeParser
 import nodeset_compiler.backend_open62541_typedefinitions as backend
 import argparse
+import json
+import logging
 
 ###############################
 # Parse the Command Line Input#
@@ -36,6 +38,15 @@ parser.add_argument('-s', '--selected-types',
                     default=[],
                     help='file with list of types (among those parsed) to be generated. If not given, all types are generated')
 
+parser.add_argument('--selected-nodeset',
+                    metavar="<selectedNodeSet>",
+                    type=argparse.FileType('r'),
+                    dest="selected_nodesets",
+                    action='append',
+                    default=[],
+                    help='NodeSet2 XML file. The types referenced from DataType attributes and ExtensionObject values ' +
+                         'are generated together with the --selected-types and all their member types')
+
 parser.add_argument('--no-builtin',
                     action='store_true',
                     dest="no_builtin",
@@ -54,6 +65,24 @@ parser.add_argument('--internal',
                     dest="internal",
                     help='Given bsd are internal types which do not have any .csv file')
 
+parser.add_argument('--split-headers',
+                    action='store_true',
+                    dest="split_headers",
+                    help='Write the handling and encoding functions of every type into a separate header. ' +
+                         'The _generated_handling.h and _generated_encoding_binary.h headers include them all')
+
+parser.add_argument('--list-split-headers',
+                    action='store_true',
+                    dest="list_split_headers",
+                    help='Print the headers that are written with --split-headers (one per line) and exit without ' +
+                         'generating any code')
+
+parser.add_argument('--size-report',
+                    metavar="<sizeReport>",
+                    type=argparse.FileType('w'),
+                    dest="size_report",
+                    help='Write a JSON report with the (estimated) size of the generated type description tables')
+
 parser.add_argument('-t', '--type-bsd',
                     metavar="<typeBsds>",
                     type=argparse.FileType('r'),
@@ -75,12 +104,22 @@ parser.add_argument('outfile',
                     help='output file w/o extension')
 args = parser.parse_args()
 
+# Warnings go to stderr. The output of --list-split-headers is read from stdout.
+logging.basicConfig()
+
 outname = args.outfile.split("/")[-1]
 inname = ', '.join(list(map(lambda x: x.name.split("/")[-1], args.type_bsd)))
 
 parser = CSVBSDTypeParser(args.opaque_map, args.selected_types, args.no_builtin, outname, args.namespace, args.import_bsd,
-                          args.type_bsd, args.type_csv)
+                          args.type_bsd, args.type_csv, args.selected_nodesets)
 parser.create_types()
 
-generator = backend.CGenerator(parser, inname, args.outfile, args.internal)
-generator.write_definitions()
+generator = backend.CGenerator(parser, inname, args.outfile, args.internal, args.split_headers)
+if args.list_split_headers:
+    print("\n".join(generator.split_header_paths()))
+else:
+    generator.write_definitions()
+
+    if args.size_report:
+        json.dump(generator.get_size_report(), args.size_report, indent=2)
+        args.size_report.close()
@@ -13,6 +13,9 @@ parser = argparse.ArgumentParser()
 parser.add_argument('statuscodes', help='path/to/Opc.Ua.NodeIds.csv')
 parser.add_argument('outfile', help='outfile w/o extension')
 parser.add_argument('namespace', help='NS0')
+parser.add_argument('--names', action='store_true',
+                    help='Also generate a source file with functions to look up the symbolic name of a NodeId ' +
+                         'and the NodeId for a symbolic name')
 args = parser.parse_args()
 
 rows = []
@@ -47,6 +50,151 @@ printh(u'''/*---------------------------------------------------------
 for row in rows:
     printh(u"#define UA_{namespace}ID_{name} {id} /* {description} */".format(namespace=args.namespace, name=row[0].upper(), id=row[1], description=row[2]))
 
+if args.names:
+    printh(u'''
+#include <open62541/types.h>
+
+_UA_BEGIN_DECLS
+
+/* Returns the symbolic name (e.g. "Server_ServerStatus") of the numeric
+ * identifier or NULL if the identifier is unknown. */
+UA_EXPORT const char *
+UA_{0}ID_name(uint32_t id);
+
+/* Returns the numeric identifier for the symbolic name or zero if the name is
+ * unknown. */
+UA_EXPORT uint32_t
+UA_{0}ID_fromName(const char *name);
+
+_UA_END_DECLS
+'''.format(args.namespace))
+
 printh(u'''#endif /* UA_NODEIDS_{0}_H_ */ '''.format(args.namespace))
 
 fh.close()
+
+if not args.names:
+    sys.exit(0)
+
+#########################
+# Print the source file #
+#########################
+
+# FNV-1a hash with a seed. Must be identical to the generated C function.
+def fnv1a(seed, name):
+    h = (2166136261 ^ seed) & 0xffffffff
+    for c in bytearray(name, 'utf8'):
+        h ^= c
+        h = (h * 16777619) & 0xffffffff
+    return h
+
+# Perfect hash with the "hash and displace" scheme. The names are distributed
+# into buckets by the unseeded hash. Then, starting with the largest bucket, a
+# seed is searched for every bucket such that all of its names hash to free
+# slots.
+def perfectHash(names):
+    bucketsSize = max(1, len(names) // 4)
+    slotsSize = max(1, 2 * len(names))
+    buckets = [[] for _ in range(bucketsSize)]
+    for i, name in enumerate(names):
+        buckets[fnv1a(0, name) % bucketsSize].append(i)
+    seeds = [0] * bucketsSize
+    slots = [-1] * slotsSize
+    for b in sorted(range(bucketsSize), key=lambda b: len(buckets[b]), reverse=True):
+        if len(buckets[b]) == 0:
+            break
+        seed = 1
+        while True:
+            positions = set(fnv1a(seed, names[i]) % slotsSize for i in buckets[b])
+            if len(positions) == len(buckets[b]) and all(slots[p] < 0 for p in positions):
+                break
+            seed += 1
+        seeds[b] = seed
+        for i in buckets[b]:
+            slots[fnv1a(seed, names[i]) % slotsSize] = i
+    return seeds, slots
+
+# The table is sorted by the identifier for a binary search
+entries = sorted([(int(row[1]), row[0]) for row in rows if len(row) >= 2])
+seeds, slots = perfectHash([e[1] for e in entries])
+
+fc = open(args.outfile + ".c", "wt", encoding='utf8')
+def printc(string):
+    print(string, end=u'\n', file=fc)
+
+printc(u'''/*---------------------------------------------------------
+ * Autogenerated -- do not modify
+ * Generated from {0} with script {1}
+ *-------------------------------------------------------*/
+
+#include <open62541/types.h>
+#include "{2}.h"
+
+#include <string.h>
+
+typedef struct {{
+    uint32_t id;
+    const char *name;
+}} UA_{3}IdName;
+
+static const size_t {3}IdNamesSize = {4};
+static const UA_{3}IdName {3}IdNames[{4}] = {{'''.format(args.statuscodes, sys.argv[0],
+                                                        args.outfile.split("/")[-1], args.namespace, len(entries)))
+
+for (i, name) in entries:
+    printc(u"    {{{0}, \"{1}\"}},".format(i, name))
+
+printc(u'''}};
+
+const char *
+UA_{0}ID_name(uint32_t id) {{
+    size_t lo = 0, hi = {0}IdNamesSize;
+    while(lo < hi) {{
+        size_t mid = lo + ((hi - lo) / 2);
+        if({0}IdNames[mid].id < id)
+            lo = mid + 1;
+        else
+            hi = mid;
+    }}
+    if(lo < {0}IdNamesSize && {0}IdNames[lo].id == id)
+        return {0}IdNames[lo].name;
+    return NULL;
+}}
+
+/* Perfect hash over the names. The unseeded hash selects a bucket. The seed of
+ * the bucket gives the slot with the position in the table. */
+static const uint32_t {0}NameSeeds[{1}] = {{'''.format(args.namespace, len(seeds)))
+
+for j in range(0, len(seeds), 12):
+    printc(u"    " + u", ".join(str(x) for x in seeds[j:j + 12]) + u",")
+
+printc(u'''}};
+
+/* 0xffffffff marks an empty slot */
+static const uint32_t {0}NameSlots[{1}] = {{'''.format(args.namespace, len(slots)))
+
+for j in range(0, len(slots), 12):
+    printc(u"    " + u", ".join(str(x if x >= 0 else 0xffffffff) for x in slots[j:j + 12]) + u",")
+
+printc(u'''}};
+
+static uint32_t
+{0}NameHash(uint32_t seed, const char *name) {{
+    uint32_t h = 2166136261u ^ seed;
+    for(; *name != 0; name++) {{
+        h ^= (uint8_t)*name;
+        h *= 16777619u;
+    }}
+    return h;
+}}
+
+uint32_t
+UA_{0}ID_fromName(const char *name) {{
+    uint32_t seed = {0}NameSeeds[{0}NameHash(0, name) % {1}];
+    uint32_t slot = {0}NameSlots[{0}NameHash(seed, name) % {2}];
+    if(slot == 0xffffffff || strcmp({0}IdNames[slot].name, name) != 0)
+        return 0;
+    return {0}IdNames[slot].id;
+}}'''.format(args.namespace, len(seeds), len(slots)))
+
+fc.close()
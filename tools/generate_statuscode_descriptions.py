@@ -66,7 +66,9 @@ printc(u'''/**********************************************************
 
 #include <open62541/types.h>''' % (args.statuscodes, sys.argv[0]))
 
-count = 2 + len(rows)
+# The table is sorted by the code for a binary search
+sortedRows = sorted(rows, key=lambda row: int(row[1], 16))
+count = 1 + len(sortedRows)
 
 printc(u'''
 typedef struct {
@@ -80,21 +82,27 @@ const char * UA_StatusCode_name(UA_StatusCode code) {
     return emptyStatusCodeName;
 }
 #else
+static const char * unknownStatusCodeName = "Unknown StatusCode";
 static const size_t statusCodeDescriptionsSize = %s;
 static const UA_StatusCodeName statusCodeDescriptions[%i] = {
     {UA_STATUSCODE_GOOD, \"Good\"},''' % (count, count))
 
-for row in rows:
+for row in sortedRows:
     printc(u"    {UA_STATUSCODE_%s, \"%s\"}," % (row[0].upper(), row[0]))
-printc(u'''    {0xffffffff, "Unknown StatusCode"}
-};
+printc(u'''};
 
 const char * UA_StatusCode_name(UA_StatusCode code) {
-    for (size_t i = 0; i < statusCodeDescriptionsSize; ++i) {
-        if (statusCodeDescriptions[i].code == code)
-            return statusCodeDescriptions[i].name;
+    size_t lo = 0, hi = statusCodeDescriptionsSize;
+    while(lo < hi) {
+        size_t mid = lo + ((hi - lo) / 2);
+        if(statusCodeDescriptions[mid].code < code)
+            lo = mid + 1;
+        else
+            hi = mid;
     }
-    return statusCodeDescriptions[statusCodeDescriptionsSize-1].name;
+    if(lo < statusCodeDescriptionsSize && statusCodeDescriptions[lo].code == code)
+        return statusCodeDescriptions[lo].name;
+    return unknownStatusCodeName;
 }
 
 #endif''')
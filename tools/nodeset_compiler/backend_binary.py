@@ -0,0 +1,588 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+### This Source Code Form is subject to the terms of the Mozilla Public
+### License, v. 2.0. If a copy of the MPL was not distributed with this
+### file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Serializes the nodeset into a binary blob that is loaded at runtime by
+# UA_Server_loadNodeSet (UA_ENABLE_NODESET_LOADER) instead of generating C code
+# for every node. The nodes are written in the same order and with the same
+# attributes as by the open62541 backend.
+#
+# The blob uses the OPC UA binary encoding (little endian). Layout:
+#
+#   Byte[4]    "UANS"
+#   UInt32     version
+#   String[]   string table
+#   UInt32[]   namespace uris (string table index)
+#   NodeId[]   type table (datatypes of the values)
+#   UInt32     number of added nodes
+#   Int32      number of records
+#   records
+#
+# A record contains the NodeId of a node, a Byte that is 1 if the node is added
+# (0 if only the references of an existing node are added), the node if it is
+# added, and the references of the node as an array of (NodeId referenceType,
+# NodeId target, Boolean isForward). A node consists of the UInt32 NodeClass,
+# the parent NodeId, the parent reference type NodeId, the browse name
+# (UInt16 namespace index, string index), the type definition NodeId, the
+# display name and description (string indices of locale and text), writeMask,
+# userWriteMask and the attributes of the NodeClass. Strings of the nodes are
+# stored once in the string table and referenced by UInt32 index (0xffffffff
+# for a null string).
+#
+# Values are a Byte kind (0: no value, 1: scalar, 2: array), the UInt16 index
+# in the type table, and the scalar or the Int32 length and elements of the
+# array followed by the array dimensions (UInt32[]). Structures are encoded
+# without the ExtensionObject header. All namespace indices are those of the
+# nodeset and are mapped to the namespaces of the server by the loader.
+
+from __future__ import print_function
+from os.path import basename
+import struct
+import codecs
+import logging
+from base64 import b64decode
+from datetime import datetime
+
+from datatypes import Value, Boolean, SByte, Byte, Int16, UInt16, Int32, UInt32, Int64, UInt64, \
+    Float, Double, String, XmlElement, ByteString, ExtensionObject, Structure, LocalizedText, \
+    NodeId, ExpandedNodeId, DateTime, QualifiedName, StatusCode, DiagnosticInfo, Guid
+from nodes import ReferenceTypeNode, ObjectNode, VariableNode, VariableTypeNode, MethodNode, \
+    ObjectTypeNode, DataTypeNode, ViewNode
+from backend_open62541 import sortNodes
+from backend_open62541_nodes import isArrayVariableNode, resolveVariableAttributes
+from backend_open62541_datatypes import makeCIdentifier
+from compiler_stats import CompilerStats
+
+import sys
+if sys.version_info[0] >= 3:
+    # strings are already parsed to unicode
+    def unicode(s):
+        return s
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"UANS"
+VERSION = 1
+NULL_INDEX = 0xffffffff
+
+VALUE_NONE = 0
+VALUE_SCALAR = 1
+VALUE_ARRAY = 2
+
+# NodeIds of the builtin types in namespace zero
+BUILTIN_TYPES = {Boolean: 1, SByte: 2, Byte: 3, Int16: 4, UInt16: 5, Int32: 6, UInt32: 7,
+                 Int64: 8, UInt64: 9, Float: 10, Double: 11, String: 12, DateTime: 13, Guid: 14,
+                 ByteString: 15, XmlElement: 16, NodeId: 17, ExpandedNodeId: 18,
+                 StatusCode: 19, QualifiedName: 20, LocalizedText: 21}
+
+NUMERIC_FORMATS = {SByte: "<b", Byte: "<B", Int16: "<h", UInt16: "<H", Int32: "<i",
+                   UInt32: "<I", StatusCode: "<I", Int64: "<q", UInt64: "<Q",
+                   Float: "<f", Double: "<d"}
+
+# Ticks of 100ns between 1601 and 1970
+UNIX_EPOCH = 116444736000000000
+
+class BinaryEncodingError(Exception):
+    pass
+
+def getNodeClass(node):
+    # Same order as in generateNodeCode_begin
+    if isinstance(node, ReferenceTypeNode):
+        return 32
+    elif isinstance(node, ObjectNode):
+        return 1
+    elif isinstance(node, VariableNode) and not isinstance(node, VariableTypeNode):
+        return 2
+    elif isinstance(node, VariableTypeNode):
+        return 16
+    elif isinstance(node, MethodNode):
+        return 4
+    elif isinstance(node, ObjectTypeNode):
+        return 8
+    elif isinstance(node, DataTypeNode):
+        return 64
+    elif isinstance(node, ViewNode):
+        return 128
+    raise BinaryEncodingError("Unknown node class of " + str(node.id))
+
+def parseInteger(value):
+    try:
+        return int(unicode(value))
+    except ValueError:
+        return int(unicode(value), 0)
+
+class Encoder(object):
+    def __init__(self):
+        self.data = bytearray()
+
+    def pack(self, fmt, *values):
+        self.data += struct.pack(fmt, *values)
+
+    def byte(self, v):
+        self.pack("<B", v)
+
+    def boolean(self, v):
+        self.pack("<B", 1 if v else 0)
+
+    def uint16(self, v):
+        self.pack("<H", v)
+
+    def int32(self, v):
+        self.pack("<i", v)
+
+    def uint32(self, v):
+        self.pack("<I", v)
+
+    def double(self, v):
+        self.pack("<d", v)
+
+    def string(self, s):
+        if s is None:
+            self.int32(-1)
+            return
+        if not isinstance(s, bytes):
+            s = unicode(s).encode("utf-8")
+        self.int32(len(s))
+        self.data += s
+
+    def guid(self, g):
+        if len(g) != 5:
+            g = [0, 0, 0, 0, 0]
+        self.pack("<IHH", g[0], g[1], g[2])
+        self.data += struct.pack(">H", g[3])
+        self.data += struct.pack(">Q", g[4])[2:]
+
+    def nodeId(self, nodeId):
+        if nodeId is None or nodeId.isNone():
+            self.pack("<BB", 0, 0)
+        elif nodeId.i is not None:
+            if nodeId.ns == 0 and nodeId.i < 256:
+                self.pack("<BB", 0, nodeId.i)
+            elif nodeId.ns < 256 and nodeId.i < 65536:
+                self.pack("<BBH", 1, nodeId.ns, nodeId.i)
+            else:
+                self.pack("<BHI", 2, nodeId.ns, nodeId.i)
+        elif nodeId.s is not None:
+            self.pack("<BH", 3, nodeId.ns)
+            self.string(nodeId.s)
+        elif nodeId.g is not None:
+            self.pack("<BH", 4, nodeId.ns)
+            self.guid(nodeId.g)
+        else:
+            self.pack("<BH", 5, nodeId.ns)
+            self.string(b64decode(nodeId.b))
+
+class NodeSetEncoder(object):
+    """Encodes the nodes and collects the string and type tables"""
+
+    def __init__(self, nodeset):
+        self.nodeset = nodeset
+        self.strings = []
+        self.stringIndex = {}
+        self.types = []
+        self.typeIndex = {}
+
+    def addString(self, s):
+        if s is None:
+            return NULL_INDEX
+        s = unicode(s)
+        if s not in self.stringIndex:
+            self.stringIndex[s] = len(self.strings)
+            self.strings.append(s)
+        return self.stringIndex[s]
+
+    def addType(self, typeId):
+        key = str(typeId)
+        if key not in self.typeIndex:
+            self.typeIndex[key] = len(self.types)
+            self.types.append(typeId)
+        return self.typeIndex[key]
+
+    def text(self, out, s):
+        out.uint32(self.addString(s))
+
+    def localizedText(self, out, lt):
+        if lt is None:
+            self.text(out, None)
+            self.text(out, None)
+            return
+        # The locale is an empty (not null) string as in the generated code
+        self.text(out, lt.locale if lt.locale is not None else "")
+        self.text(out, lt.text)
+
+    ##########
+    # Values #
+    ##########
+
+    def valueBody(self, out, v):
+        """Encode a builtin value or structure in the OPC UA binary encoding"""
+        t = type(v)
+        if v is None:
+            raise BinaryEncodingError("Missing value")
+        if t == Boolean:
+            out.boolean(v.value == "true" or v.value is True)
+        elif t in NUMERIC_FORMATS:
+            if t in [Float, Double]:
+                out.pack(NUMERIC_FORMATS[t], float(unicode(v.value)))
+            else:
+                out.pack(NUMERIC_FORMATS[t], parseInteger(v.value))
+        elif t in [String, XmlElement]:
+            out.string(v.value)
+        elif t == ByteString:
+            out.string(bytes(bytearray(v.value)) if v.value else None)
+        elif t == LocalizedText:
+            # The locale is an empty (not null) string as in the generated code
+            mask = 0x01
+            if v.text is not None:
+                mask |= 0x02
+            out.byte(mask)
+            out.string(v.locale if v.locale is not None else "")
+            if v.text is not None:
+                out.string(v.text)
+        elif t == QualifiedName:
+            out.uint16(v.ns)
+            out.string(v.name)
+        elif t == NodeId:
+            out.nodeId(v)
+        elif t == DateTime:
+            epoch = datetime.utcfromtimestamp(0)
+            mSecsSinceEpoch = int((v.value - epoch).total_seconds() * 1000.0)
+            out.pack("<q", mSecsSinceEpoch * 10000 + UNIX_EPOCH)
+        elif t == Guid:
+            out.guid(v.value)
+        elif t in [ExtensionObject, Structure]:
+            if v.value is None or len(v.value) != len(v.encodingRule):
+                raise BinaryEncodingError("Incomplete structure value")
+            for field in v.value:
+                if isinstance(field, list):
+                    # Empty arrays are null arrays as in the generated code
+                    out.int32(len(field) if len(field) > 0 else -1)
+                    for element in field:
+                        self.valueBody(out, element)
+                elif field is not None and not isinstance(field, (ExtensionObject, Structure)) \
+                     and field.isNone():
+                    # Optional values are left empty as in the generated code
+                    self.nullBody(out, type(field))
+                else:
+                    self.valueBody(out, field)
+        else:
+            raise BinaryEncodingError("Cannot encode values of type " + t.__name__)
+
+    def nullBody(self, out, t):
+        """Encode the initial (zeroed) value of a builtin type"""
+        if t in NUMERIC_FORMATS:
+            out.pack(NUMERIC_FORMATS[t], 0)
+        elif t == Boolean:
+            out.boolean(False)
+        elif t in [String, XmlElement, ByteString]:
+            out.string(None)
+        elif t == LocalizedText:
+            out.byte(0)
+        elif t == QualifiedName:
+            out.uint16(0)
+            out.string(None)
+        elif t == NodeId:
+            out.nodeId(None)
+        elif t == DateTime:
+            out.pack("<q", 0)
+        elif t == Guid:
+            out.guid([0, 0, 0, 0, 0])
+        else:
+            raise BinaryEncodingError("Cannot encode values of type " + t.__name__)
+
+    def valueTypeId(self, dataTypeNode):
+        # Same as getTypeBrowseName: NumericRange is encoded as a string
+        if makeCIdentifier(dataTypeNode.browseName.name) == "NumericRange":
+            return NodeId("ns=0;i=12")
+        return dataTypeNode.id
+
+    def value(self, out, node):
+        """Encode the value of a variable. Follows generateValueCode."""
+        if node.value is None or len(node.value.value) == 0 or \
+           not isinstance(node.value.value[0], Value):
+            out.byte(VALUE_NONE)
+            return
+        values = node.value.value
+        first = values[0]
+        isArray = isArrayVariableNode(node.value, node)
+        if isinstance(first, Guid) or isinstance(first, DiagnosticInfo) or isinstance(first, StatusCode):
+            logger.warn("Don't know how to print {} {} in node {}".format(
+                "array of" if isArray else "scalar", first.__class__.__name__, str(node.id)))
+            out.byte(VALUE_NONE)
+            return
+
+        dataTypeNode = self.nodeset.getDataTypeNode(node.dataType)
+        body = Encoder()
+        if isArray:
+            if isinstance(first, ExtensionObject) or not dataTypeNode.isAbstract:
+                typeId = self.valueTypeId(dataTypeNode)
+            else:
+                typeId = NodeId("ns=0;i=%d" % BUILTIN_TYPES[type(first)])
+            body.byte(VALUE_ARRAY)
+            body.uint16(self.addType(typeId))
+            body.int32(len(values))
+            for v in values:
+                self.valueBody(body, v)
+            # #1978 Variant arrayDimensions are only required for multidimensional arrays
+            dims = []
+            if node.valueRank is not None and node.valueRank > 1 and \
+               len(node.arrayDimensions) == node.valueRank:
+                dims = [int(unicode(d)) for d in node.arrayDimensions]
+                numElements = 1
+                for d in dims:
+                    numElements *= d
+                if 0 in dims or numElements != len(values):
+                    dims = []
+            body.int32(len(dims))
+            for d in dims:
+                body.uint32(d)
+        else:
+            if isinstance(first, ExtensionObject):
+                typeId = self.valueTypeId(dataTypeNode)
+            elif first.isNone():
+                out.byte(VALUE_NONE)
+                return
+            else:
+                typeId = NodeId("ns=0;i=%d" % BUILTIN_TYPES[type(first)])
+            body.byte(VALUE_SCALAR)
+            body.uint16(self.addType(typeId))
+            self.valueBody(body, first)
+        out.data += body.data
+
+    #########
+    # Nodes #
+    #########
+
+    def variableAttributes(self, out, node):
+        """Follows generateCommonVariableCode. The inherited value rank and
+        datatype are set by resolveVariableAttributes."""
+        dataTypeNode = self.nodeset.getBaseDataType(self.nodeset.getDataTypeNode(node.dataType))
+        if dataTypeNode is None:
+            raise RuntimeError("Cannot get BaseDataType for dataType : " + str(node.dataType) +
+                               " of node " + node.browseName.name + " " + str(node.id))
+
+        if not dataTypeNode.isEncodable():
+            if node.value is not None:
+                logger.warn("Cannot encode dataTypeNode: " + dataTypeNode.browseName.name +
+                            " for value of node " + node.browseName.name + " " + str(node.id))
+            out.byte(VALUE_NONE)
+        else:
+            try:
+                value = Encoder()
+                self.value(value, node)
+                out.data += value.data
+            except (BinaryEncodingError, ValueError, struct.error) as e:
+                logger.warn("Cannot encode the value of node " + node.browseName.name + " " +
+                            str(node.id) + ": " + str(e))
+                out.byte(VALUE_NONE)
+
+        out.nodeId(node.dataType)
+        out.int32(node.valueRank)
+        if node.valueRank > 0:
+            out.int32(node.valueRank)
+            if len(node.arrayDimensions) == node.valueRank:
+                for v in node.arrayDimensions:
+                    out.uint32(int(unicode(v)))
+            else:
+                for _ in range(node.valueRank):
+                    out.uint32(0)
+        else:
+            out.int32(0)
+
+    def node(self, out, node):
+        nodeClass = getNodeClass(node)
+        out.uint32(nodeClass)
+        out.nodeId(node.parent.id if node.parent else NodeId())
+        out.nodeId(node.parentReference.id if node.parent else NodeId())
+        out.uint16(node.browseName.ns)
+        self.text(out, node.browseName.name)
+        attributes = Encoder()
+        self.attributes(attributes, node, nodeClass)
+        # The type definition is removed from the references after the
+        # attributes were derived from it
+        if nodeClass in [1, 2]:
+            out.nodeId(node.popTypeDef().target)
+        else:
+            out.nodeId(NodeId())
+        self.localizedText(out, node.displayName)
+        self.localizedText(out, node.description)
+        out.uint32(node.writeMask if node.writeMask is not None else 0)
+        out.uint32(node.userWriteMask if node.userWriteMask is not None else 0)
+        out.data += attributes.data
+
+    def attributes(self, out, node, nodeClass):
+        if nodeClass == 1: # Object
+            out.byte(1 if node.eventNotifier else 0)
+        elif nodeClass == 2: # Variable
+            # in order to be compatible with mostly OPC UA client
+            # force valueRank = -1 for scalar VariableNode
+            if node.valueRank == -2 and node.value is not None and len(node.value.value) == 1:
+                node.valueRank = -1
+            self.variableAttributes(out, node)
+            out.byte(node.accessLevel)
+            out.byte(node.userAccessLevel)
+            out.double(node.minimumSamplingInterval)
+            out.boolean(node.historizing)
+        elif nodeClass == 4: # Method
+            out.boolean(node.executable)
+            out.boolean(node.userExecutable)
+        elif nodeClass == 16: # VariableType
+            self.variableAttributes(out, node)
+            out.boolean(node.isAbstract)
+        elif nodeClass == 32: # ReferenceType
+            out.boolean(node.isAbstract)
+            out.boolean(node.symmetric)
+            if node.inverseName != "":
+                self.text(out, "")
+                self.text(out, node.inverseName)
+            else:
+                self.text(out, None)
+                self.text(out, None)
+        elif nodeClass == 128: # View
+            out.boolean(node.containsNoLoops)
+            out.byte(int(node.eventNotifier))
+        else: # ObjectType, DataType
+            out.boolean(node.isAbstract)
+
+def writeCArray(f, name, data):
+    f.write(u"static const UA_Byte %s[%d] = {\n" % (name, len(data)))
+    for i in range(0, len(data), 32):
+        f.write(u",".join(str(b) for b in data[i:i + 32]))
+        f.write(u",\n" if i + 32 < len(data) else u"\n")
+    f.write(u"};\n")
+
+def generateBinaryNodeSet(nodeset, outfilename, typesArray=[], stats=None):
+    """Writes the nodeset to <outfilename>.bin and, embedded into an array,
+    to <outfilename>.c with a function of the same name as for the open62541
+    backend that loads it."""
+    if stats is None:
+        stats = CompilerStats(enabled=False)
+    outfilebase = basename(outfilename)
+
+    with stats.phase("sortNodes", nodeset):
+        sorted_nodes = sortNodes(nodeset)
+    with stats.phase("resolveVariableAttributes", nodeset):
+        resolveVariableAttributes(nodeset)
+
+    stats.begin("generateCode", nodeset)
+    encoder = NodeSetEncoder(nodeset)
+    records = Encoder()
+    recordCount = 0
+    nodeCount = 0
+    printed_ids = set()
+    for node in sorted_nodes:
+        printed_ids.add(node.id)
+        record = Encoder()
+        record.nodeId(node.id)
+        if node.hidden:
+            record.byte(0)
+        else:
+            record.byte(1)
+            encoder.node(record, node)
+            nodeCount += 1
+
+        # References leading to nodes that were already added
+        refs = []
+        for ref in node.references:
+            if ref.target not in printed_ids:
+                continue
+            if node.hidden and nodeset.nodes[ref.target].hidden:
+                continue
+            if node.parent is not None and ref.target == node.parent.id \
+                and ref.referenceType == node.parentReference.id:
+                # Skip parent reference
+                continue
+            refs.append(ref)
+        if node.hidden and len(refs) == 0:
+            continue
+        record.int32(len(refs))
+        for ref in refs:
+            record.nodeId(ref.referenceType)
+            record.nodeId(ref.target)
+            record.boolean(ref.isForward)
+        records.data += record.data
+        recordCount += 1
+
+    blob = Encoder()
+    blob.data += MAGIC
+    blob.uint32(VERSION)
+    namespaces = [encoder.addString(uri) for uri in nodeset.namespaces]
+    blob.int32(len(encoder.strings))
+    for s in encoder.strings:
+        blob.string(s)
+    blob.int32(len(namespaces))
+    for i in namespaces:
+        blob.uint32(i)
+    blob.int32(len(encoder.types))
+    for t in encoder.types:
+        blob.nodeId(t)
+    blob.uint32(nodeCount)
+    blob.int32(recordCount)
+    blob.data += records.data
+    stats.end()
+
+    stats.begin("writeFiles")
+    with open(outfilename + ".bin", "wb") as f:
+        f.write(blob.data)
+
+    additionalHeaders = ""
+    customTypes = []
+    for arr in typesArray:
+        if arr == "UA_TYPES" or arr in customTypes:
+            continue
+        customTypes.append(arr)
+        # remove ua_ prefix if exists
+        typeFile = arr.lower()
+        typeFile = typeFile[typeFile.startswith("ua_") and len("ua_"):]
+        additionalHeaders += """#include "%s_generated.h"\n""" % typeFile
+
+    with codecs.open(outfilename + ".h", "w", encoding='utf-8') as f:
+        f.write(u"""/* WARNING: This is a generated file.
+ * Any manual changes will be overwritten. */
+
+#ifndef %s_H_
+#define %s_H_
+
+#ifdef UA_ENABLE_AMALGAMATION
+# include "open62541.h"
+#else
+# include <open62541/server.h>
+#endif
+%s
+_UA_BEGIN_DECLS
+
+extern UA_StatusCode %s(UA_Server *server);
+
+_UA_END_DECLS
+
+#endif /* %s_H_ */
+""" % (outfilebase.upper(), outfilebase.upper(), additionalHeaders, outfilebase, outfilebase.upper()))
+
+    with codecs.open(outfilename + ".c", "w", encoding='utf-8') as f:
+        f.write(u"""/* WARNING: This is a generated file.
+ * Any manual changes will be overwritten. */
+
+#include "%s.h"
+
+#ifndef UA_ENABLE_NODESET_LOADER
+# error "Nodesets compiled with the binary backend require UA_ENABLE_NODESET_LOADER"
+#endif
+
+""" % outfilebase)
+        writeCArray(f, outfilebase + "_nodeset", blob.data)
+        f.write(u"\nUA_StatusCode %s(UA_Server *server) {\n" % outfilebase)
+        previous = "NULL"
+        for i, arr in enumerate(customTypes):
+            f.write(u"UA_DataTypeArray customTypes%d = {%s, %s_COUNT, %s, %s_TYPEID_INDEX, %s_BINARYENCODINGID_INDEX};\n" %
+                    (i, previous, arr, arr, arr, arr))
+            previous = "&customTypes%d" % i
+        f.write(u"""UA_ByteString nodeset;
+nodeset.length = %d;
+nodeset.data = (UA_Byte *)(void*)(uintptr_t)%s_nodeset;
+return UA_Server_loadNodeSet(server, &nodeset, %s);
+}
+""" % (len(blob.data), outfilebase, "NULL" if previous == "NULL" else previous))
+    stats.end()
@@ -31,7 +31,9 @@ logger = logging.getLogger(__name__)
 from datatypes import NodeId
 from nodes import *
 from nodeset import *
-from backend_open62541_nodes import generateNodeCode_begin, generateNodeCode_finish, generateReferenceCode
+from backend_open62541_nodes import generateNodeCode_begin, generateNodeCode_finish, generateReferenceCode, \
+    resolveVariableAttributes
+from compiler_stats import CompilerStats
 
 # Kahn's algorithm: https://algocoding.wordpress.com/2015/04/05/topological-sorting-python/
 def sortNodes(nodeset):
@@ -122,7 +124,55 @@ def sortNodes(nodeset):
 # Generate C Code #
 ###################
 
-def generateOpen62541Code(nodeset, outfilename, internal_headers=False, typesArray=[]):
+def generateProfileCode(outfilebase, functionCount):
+    """Timing table and hooks for the begin part, the references and the
+    finish part of every node. Compiled in only with UA_NODESET_PROFILE."""
+    return """
+#ifdef UA_NODESET_PROFILE
+/* Time spent in the begin part, the references and the finish part of every
+ * node function (UA_DateTime ticks of 100ns) */
+static UA_DateTime profile_{base}[{count}][3];
+
+# ifndef UA_NODESET_PROFILE_START
+#  define UA_NODESET_PROFILE_START UA_DateTime profileTime = UA_DateTime_nowMonotonic()
+#  define UA_NODESET_PROFILE_SPLIT(TABLE, IDX, PART) do {{                \\
+        UA_DateTime profileNow = UA_DateTime_nowMonotonic();                \\
+        TABLE[IDX][PART] = profileNow - profileTime;                        \\
+        profileTime = profileNow;                                           \\
+    }} while(0)
+# endif
+
+void {base}_profile_print(FILE *out) {{
+    fprintf(out, "function,begin_ns,references_ns,finish_ns\\n");
+    for(size_t i = 0; i < {count}; i++)
+        fprintf(out, "%lu,%lld,%lld,%lld\\n", (unsigned long)i,
+                (long long)profile_{base}[i][0] * 100,
+                (long long)profile_{base}[i][1] * 100,
+                (long long)profile_{base}[i][2] * 100);
+}}
+#else
+# define UA_NODESET_PROFILE_START
+# define UA_NODESET_PROFILE_SPLIT(TABLE, IDX, PART)
+#endif
+""".format(base=outfilebase, count=max(functionCount, 1))
+
+def writeProfileMap(outfilename, profiledNodes):
+    """Maps the function numbers of the timing table to the nodes"""
+    import csv
+    with codecs.open(outfilename + ".profile.csv", "w", encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["function", "nodeId", "browseName", "nodeClass"])
+        for (idx, node) in enumerate(profiledNodes):
+            writer.writerow([idx, str(node.id), str(node.browseName),
+                             node.__class__.__name__[:-len("Node")]])
+
+def generateOpen62541Code(nodeset, outfilename, internal_headers=False, typesArray=[], stats=None,
+                          profile=False):
+    """With profile, the generated functions are wrapped with timing hooks
+    and the mapping of the timing table to the nodes is written to
+    <outfilename>.profile.csv."""
+    if stats is None:
+        stats = CompilerStats(enabled=False)
     outfilebase = basename(outfilename)
     # Printing functions
     outfileh = codecs.open(outfilename + ".h", r"w+", encoding='utf-8')
@@ -197,27 +247,44 @@ UA_findDataTypeByBinary(const UA_NodeId *typeId);
 #endif
 %s
 """ % (additionalHeaders))
+    if profile:
+        writeh("""#ifdef UA_NODESET_PROFILE
+# include <stdio.h>
+#endif
+""")
     writeh("""
 _UA_BEGIN_DECLS
 
 extern UA_StatusCode %s(UA_Server *server);
-
+%s
 _UA_END_DECLS
 
 #endif /* %s_H_ */""" % \
-           (outfilebase, outfilebase.upper()))
+           (outfilebase, """
+#ifdef UA_NODESET_PROFILE
+/* Prints the time spent in the functions of every node as CSV. The nodes of
+ * the functions are listed in the .profile.csv file written by the compiler. */
+extern void %s_profile_print(FILE *out);
+#endif
+""" % outfilebase if profile else "", outfilebase.upper()))
 
-    writec("""/* WARNING: This is a generated file.
+    preamble = """/* WARNING: This is a generated file.
  * Any manual changes will be overwritten. */
 
 #include "%s.h"
-""" % (outfilebase))
+
+""" % (outfilebase)
 
     # Loop over the sorted nodes
     logger.info("Reordering nodes for minimal dependencies during printing")
-    sorted_nodes = sortNodes(nodeset)
+    with stats.phase("sortNodes", nodeset):
+        sorted_nodes = sortNodes(nodeset)
+    with stats.phase("resolveVariableAttributes", nodeset):
+        resolveVariableAttributes(nodeset)
     logger.info("Writing code for nodes and references")
+    stats.begin("generateCode", nodeset)
     functionNumber = 0
+    profiledNodes = []
 
     printed_ids = set()
     for node in sorted_nodes:
@@ -238,7 +305,11 @@ _UA_END_DECLS
                 writec("\nstatic UA_StatusCode function_" + outfilebase + "_" + str(functionNumber) + "_begin(UA_Server *server, UA_UInt16* ns) {")
                 if isinstance(node, MethodNode):
                     writec("#ifdef UA_ENABLE_METHODCALLS")
+                if profile:
+                    writec("UA_NODESET_PROFILE_START;")
                 writec(code)
+                if profile:
+                    writec("UA_NODESET_PROFILE_SPLIT(profile_%s, %d, 0);" % (outfilebase, functionNumber))
 
         # Print inverse references leading to this node
         for ref in node.references:
@@ -255,6 +326,8 @@ _UA_END_DECLS
         if node.hidden:
             continue
 
+        if profile:
+            writec("UA_NODESET_PROFILE_SPLIT(profile_%s, %d, 1);" % (outfilebase, functionNumber))
         writec("return retVal;")
 
         if isinstance(node, MethodNode):
@@ -267,7 +340,13 @@ _UA_END_DECLS
 
         if isinstance(node, MethodNode):
             writec("#ifdef UA_ENABLE_METHODCALLS")
-        writec("return " + generateNodeCode_finish(node))
+        if profile:
+            writec("UA_NODESET_PROFILE_START;")
+            writec("UA_StatusCode retVal = " + generateNodeCode_finish(node))
+            writec("UA_NODESET_PROFILE_SPLIT(profile_%s, %d, 2);" % (outfilebase, functionNumber))
+            writec("return retVal;")
+        else:
+            writec("return " + generateNodeCode_finish(node))
         if isinstance(node, MethodNode):
             writec("#else")
             writec("return UA_STATUSCODE_GOOD;")
@@ -275,6 +354,7 @@ _UA_END_DECLS
         writec("}");
 
         functionNumber = functionNumber + 1
+        profiledNodes.append(node)
 
     writec("""
 UA_StatusCode %s(UA_Server *server) {
@@ -305,6 +385,9 @@ UA_StatusCode retVal = UA_STATUSCODE_GOOD;""" % (outfilebase))
         writec("); (void)(dummy);")
 
     writec("return retVal;\n}")
+    stats.end()
+
+    stats.begin("writeFiles")
     outfileh.flush()
     os.fsync(outfileh)
     outfileh.close()
@@ -312,8 +395,14 @@ UA_StatusCode retVal = UA_STATUSCODE_GOOD;""" % (outfilebase))
     outfilec.close()
 
     outfilec = codecs.open(outfilename + ".c", r"w+", encoding='utf-8')
+    outfilec.write(preamble)
+    if profile:
+        # The size of the timing table is known after the nodes were printed
+        outfilec.write(generateProfileCode(outfilebase, functionNumber))
+        writeProfileMap(outfilename, profiledNodes)
     outfilec.write(fullCode)
     outfilec.flush()
     os.fsync(outfilec)
     outfilec.close()
+    stats.end()
 
@@ -73,93 +73,118 @@ def generateObjectNodeCode(node):
         code.append("attr.eventNotifier = true;")
     return code
 
-def setNodeDatatypeRecursive(node, nodeset):
-
-    if not isinstance(node, VariableNode) and not isinstance(node, VariableTypeNode):
-        raise RuntimeError("Node {}: DataType can only be set for VariableNode and VariableTypeNode".format(str(node.id)))
-
-    if node.dataType is not None:
-        return
-
-    # If BaseVariableType
-    if node.id == NodeId("ns=0;i=62"):
-        if node.dataType is None:
-            # Set to default BaseDataType
-            node.dataType = NodeId("ns=0;i=24")
-        return
-
-    if isinstance(node, VariableNode) and not isinstance(node, VariableTypeNode):
-        typeDefNode = nodeset.getNodeTypeDefinition(node)
-        if typeDefNode is None:
-            # Use the parent type.
-            raise RuntimeError("Cannot get node for HasTypeDefinition of VariableNode " + node.browseName.name + " " + str(node.id))
-
-        setNodeDatatypeRecursive(typeDefNode, nodeset)
-
-        node.dataType = typeDefNode.dataType
-    else:
-        # Use the parent type.
-        if node.parent is None:
-            raise RuntimeError("Parent node not defined for " + node.browseName.name + " " + str(node.id))
-
-        setNodeDatatypeRecursive(node.parent, nodeset)
-        node.dataType = node.parent.dataType
-
-def setNodeValueRankRecursive(node, nodeset):
-
-    if not isinstance(node, VariableNode) and not isinstance(node, VariableTypeNode):
-        raise RuntimeError("Node {}: ValueRank can only be set for VariableNode and VariableTypeNode".format(str(node.id)))
-
-    if node.valueRank is not None:
-        return
-
-    # If BaseVariableType
-    if node.id == NodeId("ns=0;i=62"):
-        if node.valueRank is None:
-            # BaseVariableType always has -2
-            node.valueRank = -2
-        return
-
-    if isinstance(node, VariableNode) and not isinstance(node, VariableTypeNode):
-        typeDefNode = nodeset.getNodeTypeDefinition(node)
-        if typeDefNode is None:
-            # Use the parent type.
-            raise RuntimeError("Cannot get node for HasTypeDefinition of VariableNode " + node.browseName.name + " " + str(node.id))
-        if not isinstance(typeDefNode, VariableTypeNode):
-            raise RuntimeError("Node {} ({}) has an invalid type definition. {} is not a VariableType node.".format(
-                str(node.id), node.browseName.name, str(typeDefNode.id)))
-
-
-        setNodeValueRankRecursive(typeDefNode, nodeset)
-
-        if typeDefNode.valueRank is not None and typeDefNode.valueRank > -1:
-            node.valueRank = typeDefNode.valueRank
-        else:
-            # Default value
-            node.valueRank = -1
-    else:
+class VariableAttributeResolver(object):
+    """Resolves the inherited DataType and ValueRank. Instances inherit them
+    from their type definition, variable types from their parent type. The
+    type definitions are looked up once per node and failures are memoized,
+    so the instances of a broken type do not walk the type chain again. The
+    root causes of all failures are collected."""
+
+    def __init__(self, nodeset):
+        self.nodeset = nodeset
+        self.typeDefinitions = {}
+        self.failed = {} # (attribute, node id) -> root cause
+        self.errors = [] # Root causes in the order they were found
+        self.reported = set()
+
+    def typeDefinition(self, node):
+        if node.id not in self.typeDefinitions:
+            self.typeDefinitions[node.id] = self.nodeset.getNodeTypeDefinition(node)
+        return self.typeDefinitions[node.id]
+
+    def fail(self, key, message):
+        # The DataType and the ValueRank usually fail for the same reason
+        if message not in self.reported:
+            self.reported.add(message)
+            self.errors.append(message)
+        self.failed[key] = message
+        return False
+
+    def source(self, key, node):
+        """The node the attribute is inherited from. Returns None on failure."""
+        if isinstance(node, VariableNode) and not isinstance(node, VariableTypeNode):
+            typeDefNode = self.typeDefinition(node)
+            if typeDefNode is None:
+                self.fail(key, "Cannot get node for HasTypeDefinition of VariableNode " +
+                          node.browseName.name + " " + str(node.id))
+                return None
+            if not isinstance(typeDefNode, VariableTypeNode):
+                self.fail(key, "Node {} ({}) has an invalid type definition. {} is not a VariableType node.".format(
+                    str(node.id), node.browseName.name, str(typeDefNode.id)))
+                return None
+            return typeDefNode
         if node.parent is None:
-            raise RuntimeError("Node {}: does not have a parent. Probably the parent node was blacklisted?".format(str(node.id)))
-
-        # Check if parent node limits the value rank
-        setNodeValueRankRecursive(node.parent, nodeset)
-
-
-        if node.parent.valueRank is not None and node.parent.valueRank > -1:
-            node.valueRank = node.parent.valueRank
+            self.fail(key, "Node {}: does not have a parent. Probably the parent node was blacklisted?".format(
+                str(node.id)))
+            return None
+        return node.parent
+
+    def inherit(self, attribute, node):
+        """Resolves the attribute of the node. Returns False if it cannot be
+        resolved."""
+        if getattr(node, attribute) is not None:
+            return True
+        key = (attribute, node.id)
+        if key in self.failed:
+            return False
+        if not isinstance(node, VariableNode):
+            return self.fail(key, "Node {}: {} can only be set for VariableNode and VariableTypeNode".format(
+                str(node.id), attribute))
+
+        # BaseVariableType
+        if node.id == NodeId("ns=0;i=62"):
+            setattr(node, attribute, NodeId("ns=0;i=24") if attribute == "dataType" else -2)
+            setattr(node, attribute + "Inherited", True)
+            return True
+
+        sourceNode = self.source(key, node)
+        if sourceNode is None:
+            return False
+        if not self.inherit(attribute, sourceNode):
+            # Only the root cause is reported
+            self.failed[key] = self.failed[(attribute, sourceNode.id)]
+            return False
+
+        if attribute == "dataType":
+            node.dataType = sourceNode.dataType
+        elif sourceNode.valueRank > -1:
+            # The type or parent node limits the value rank
+            node.valueRank = sourceNode.valueRank
         else:
             # Default value
             node.valueRank = -1
-
+        setattr(node, attribute + "Inherited", True)
+        return True
+
+def resolveVariableAttributes(nodeset):
+    """Sets the inherited DataType and ValueRank of all variables and
+    variable types that are generated. Runs before the code is generated and
+    raises a RuntimeError with all nodes that cannot be resolved."""
+    resolver = VariableAttributeResolver(nodeset)
+    affected = 0
+    for node in nodeset.nodes.values():
+        if node.hidden or not isinstance(node, VariableNode):
+            continue
+        # Inherit the datatype from the HasTypeDefinition reference, as stated in the OPC UA Spec:
+        # 6.4.2
+        # "Instances inherit the initial values for the Attributes that they have in common with the
+        # TypeDefinitionNode from which they are instantiated, with the exceptions of the NodeClass and
+        # NodeId."
+        resolved = resolver.inherit("valueRank", node)
+        resolved = resolver.inherit("dataType", node) and resolved
+        if not resolved:
+            affected += 1
+    if resolver.errors:
+        raise RuntimeError("Cannot resolve the DataType or ValueRank of {} nodes:\n  {}".format(
+            affected, "\n  ".join(resolver.errors)))
 
 def generateCommonVariableCode(node, nodeset):
     code = []
     codeCleanup = []
     codeGlobal = []
 
-    if node.valueRank is None:
-        # Set the constrained value rank from the type/parent node
-        setNodeValueRankRecursive(node, nodeset)
+    # The inherited value rank and datatype are set by resolveVariableAttributes
+    if node.valueRankInherited:
         code.append("/* Value rank inherited */")
 
     code.append("attr.valueRank = %d;" % node.valueRank)
@@ -174,13 +199,7 @@ def generateCommonVariableCode(node, nodeset):
                 code.append("arrayDimensions[{}] = 0;".format(dim))
         code.append("attr.arrayDimensions = &arrayDimensions[0];")
 
-    if node.dataType is None:
-        # Inherit the datatype from the HasTypeDefinition reference, as stated in the OPC UA Spec:
-        # 6.4.2
-        # "Instances inherit the initial values for the Attributes that they have in common with the
-        # TypeDefinitionNode from which they are instantiated, with the exceptions of the NodeClass and
-        # NodeId."
-        setNodeDatatypeRecursive(node, nodeset)
+    if node.dataTypeInherited:
         code.append("/* DataType inherited */")
 
     dataTypeNode = nodeset.getBaseDataType(nodeset.getDataTypeNode(node.dataType))
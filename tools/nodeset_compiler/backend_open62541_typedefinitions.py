@@ -5,6 +5,7 @@ import sys
 import time
 import getpass
 import platform
+import os
 from collections import OrderedDict
 
 if sys.version_info[0] >= 3:
@@ -33,6 +34,18 @@ builtin_overlayable = {"Boolean": "true",
                                "offsetof(UA_Guid, data3) == (sizeof(UA_UInt16) + sizeof(UA_UInt32)) && " +
                                "offsetof(UA_Guid, data4) == (2*sizeof(UA_UInt32)))"}
 
+# Builtin types that always have the same size in the binary encoding.
+# Structures with only such members (no arrays, no optional fields) have a
+# constant encoded size as well.
+builtin_binary_size = {"Boolean": 1, "SByte": 1, "Byte": 1,
+                       "Int16": 2, "UInt16": 2,
+                       "Int32": 4, "UInt32": 4,
+                       "Int64": 8, "UInt64": 8,
+                       "Float": 4, "Double": 8,
+                       "DateTime": 8, "StatusCode": 4, "Guid": 16}
+
+enum_binary_size = {"UA_Byte": 1, "UA_UInt16": 2, "UA_Int32": 4, "UA_UInt32": 4, "UA_UInt64": 8}
+
 whitelistFuncAttrWarnUnusedResult = []  # for instances [ "String", "ByteString", "LocalizedText" ]
 
 
@@ -55,12 +68,22 @@ def getNodeidTypeAndId(nodeId):
         strId = nodeId[2:]
         return "UA_NODEIDTYPE_STRING, {{ .string = UA_STRING_STATIC(\"{id}\") }}".format(id=strId.replace("\"", "\\\""))
 
+
+# Numeric identifier of a NodeId from the .csv file. None for non-numeric NodeIds.
+def getNodeidNumeric(nodeId):
+    if nodeId.startswith("i="):
+        nodeId = nodeId[2:]
+    elif '=' in nodeId:
+        return None
+    return int(nodeId)
+
 class CGenerator(object):
-    def __init__(self, parser, inname, outfile, is_internal_types):
+    def __init__(self, parser, inname, outfile, is_internal_types, split_headers=False):
         self.parser = parser
         self.inname = inname
         self.outfile = outfile
         self.is_internal_types = is_internal_types
+        self.split_headers = split_headers
         self.filtered_types = None
         self.fh = None
         self.ff = None
@@ -121,6 +144,54 @@ class CGenerator(object):
             return self.get_struct_overlayable(datatype)
         raise RuntimeError("Unknown datatype")
 
+    @staticmethod
+    def get_binary_size(datatype):
+        """Returns the size of the type in the binary encoding or None if the
+        size depends on the content."""
+        if isinstance(datatype, BuiltinType):
+            return builtin_binary_size.get(datatype.name)
+        if isinstance(datatype, EnumerationType):
+            return enum_binary_size.get(datatype.strDataType)
+        if isinstance(datatype, OpaqueType):
+            return builtin_binary_size.get(datatype.base_type)
+        if isinstance(datatype, StructType):
+            if datatype.is_union or len(datatype.members) == 0:
+                return None
+            size = 0
+            for m in datatype.members:
+                if m.is_array or m.is_optional:
+                    return None
+                member_size = CGenerator.get_binary_size(m.member_type)
+                if member_size is None:
+                    return None
+                size += member_size
+            return size
+        return None
+
+    def get_lookup_ids(self, datatype):
+        """Returns (namespaceIndex, typeId, binaryEncodingId) as written into the
+        type description. The typeId is None if it is not numeric."""
+        if datatype.name not in self.parser.typedescriptions:
+            return (0, 0, 0)
+        description = self.parser.typedescriptions[datatype.name]
+        return (int(description.namespaceid), getNodeidNumeric(description.nodeid),
+                int(description.binaryEncodingId))
+
+    def get_lookup_index(self, by_encoding):
+        """Positions in the description array sorted by (namespaceIndex,
+        identifier) for a binary search. Types with a non-numeric typeId come
+        last within their namespace. Entries with the same key keep their
+        array order, so a search returns the same type as a linear scan."""
+        keys = []
+        for i, t in enumerate(self.filtered_types):
+            (ns, typeid, encodingid) = self.get_lookup_ids(t)
+            identifier = encodingid if by_encoding else typeid
+            if identifier is None:
+                keys.append((ns, 1, 0, i))
+            else:
+                keys.append((ns, 0, identifier, i))
+        return [k[3] for k in sorted(keys)]
+
     def print_datatype(self, datatype):
         binaryEncodingId = "0"
         if datatype.name in self.parser.typedescriptions:
@@ -153,9 +224,9 @@ class CGenerator(object):
             return "#define %s_members NULL" % (idName)
         isUnion = isinstance(datatype, StructType) and datatype.is_union
         if isUnion:
-            members = "static UA_DataTypeMember %s_members[%s] = {" % (idName, len(datatype.members)-1)
+            members = "static const UA_DataTypeMember %s_members[%s] = {" % (idName, len(datatype.members)-1)
         else:
-            members = "static UA_DataTypeMember %s_members[%s] = {" % (idName, len(datatype.members))
+            members = "static const UA_DataTypeMember %s_members[%s] = {" % (idName, len(datatype.members))
         before = None
         size = len(datatype.members)
         for i, member in enumerate(datatype.members):
@@ -193,6 +264,46 @@ class CGenerator(object):
             before = member
         return members + "};"
 
+    def get_size_report(self):
+        """Estimated size of the generated type tables for 32bit and 64bit
+        targets, with and without UA_ENABLE_TYPEDESCRIPTION. The member tables
+        are const and end up in read-only memory (flash)."""
+        types = len(self.filtered_types)
+        members = 0
+        typeNames = 0
+        memberNames = 0
+        for t in self.filtered_types:
+            typeNames += len(makeCIdentifier(t.name)) + 1
+            isUnion = isinstance(t, StructType) and t.is_union
+            for i, m in enumerate(t.members):
+                if isUnion and i == 0:
+                    continue
+                members += 1
+                memberNames += len(makeCIdentifier(m.name)) + 1
+        indexEntries = len(self.get_lookup_index(False)) + len(self.get_lookup_index(True))
+        report = OrderedDict()
+        report["types"] = types
+        report["members"] = members
+        report["typeNameBytes"] = typeNames
+        report["memberNameBytes"] = memberNames
+        report["lookupIndexBytes"] = indexEntries * 2
+        # UA_DataType: NodeId (24 bytes) + 12 bytes of sizes, flags and the
+        # encoding id + the members pointer (+ the name pointer)
+        # UA_DataTypeMember: 4 bytes (+ the name pointer, aligned)
+        for ptrSize in [4, 8]:
+            for names in [False, True]:
+                typeSize = 24 + 12 + ptrSize
+                memberSize = 4
+                stringBytes = 0
+                if names:
+                    typeSize += ptrSize
+                    memberSize = 2 * ptrSize if ptrSize > 4 else 8
+                    stringBytes = typeNames + memberNames
+                typeSize = (typeSize + ptrSize - 1) // ptrSize * ptrSize
+                key = "bytes%dbit%s" % (ptrSize * 8, "WithNames" if names else "")
+                report[key] = types * typeSize + members * memberSize + stringBytes + indexEntries * 2
+        return report
+
     @staticmethod
     def print_datatype_ptr(datatype):
         return "&UA_" + datatype.outname.upper() + "[UA_" + makeCIdentifier(
@@ -229,11 +340,27 @@ class CGenerator(object):
 
     def print_datatype_encoding(self, datatype):
         idName = makeCIdentifier(datatype.name)
-        enc = "static UA_INLINE size_t\nUA_%s_calcSizeBinary(const UA_%s *src) {\n    return UA_calcSizeBinary(src, %s);\n}\n"
+        if self.get_binary_size(datatype) is not None:
+            # The encoded size is a constant. See print_binary_size.
+            enc = "static UA_INLINE size_t\nUA_%s_calcSizeBinary(const UA_%s *src) {\n    (void)src;\n    return %s;\n}\n" % (
+                idName, idName, self.print_binary_size_name(datatype))
+        else:
+            enc = "static UA_INLINE size_t\nUA_%s_calcSizeBinary(const UA_%s *src) {\n    return UA_calcSizeBinary(src, %s);\n}\n" % (
+                idName, idName, self.print_datatype_ptr(datatype))
         enc += "static UA_INLINE UA_StatusCode\nUA_%s_encodeBinary(const UA_%s *src, UA_Byte **bufPos, const UA_Byte *bufEnd) {\n    return UA_encodeBinary(src, %s, bufPos, &bufEnd, NULL, NULL);\n}\n"
         enc += "static UA_INLINE UA_StatusCode\nUA_%s_decodeBinary(const UA_ByteString *src, size_t *offset, UA_%s *dst) {\n    return UA_decodeBinary(src, offset, dst, %s, NULL);\n}"
         return enc % tuple(
-            list(itertools.chain(*itertools.repeat([idName, idName, self.print_datatype_ptr(datatype)], 3))))
+            list(itertools.chain(*itertools.repeat([idName, idName, self.print_datatype_ptr(datatype)], 2))))
+
+    @staticmethod
+    def print_binary_size_name(datatype):
+        return makeCIdentifier("UA_" + datatype.name.upper()) + "_BINARY_SIZE"
+
+    def print_binary_size(self, datatype):
+        size = self.get_binary_size(datatype)
+        if size is None:
+            return None
+        return "#define %s %d" % (self.print_binary_size_name(datatype), size)
 
     @staticmethod
     def print_enum_typedef(enum):
@@ -390,6 +517,20 @@ _UA_BEGIN_DECLS
                     self.printh(self.print_datatype_typedef(t) + "\n")
                 self.printh(
                     "#define UA_" + makeCIdentifier(self.parser.outname.upper() + "_" + t.name.upper()) + " " + str(i))
+                binary_size = self.print_binary_size(t)
+                if binary_size is not None:
+                    self.printh(binary_size)
+
+            self.printh('''
+/**
+ * Positions in the type array sorted by the numeric typeId and by the
+ * binaryEncodingId (each together with the namespace index). They allow a
+ * binary search when only the NodeId of a type is known. Set them as
+ * ``typeIdIndex`` and ``binaryEncodingIdIndex`` of a ``UA_DataTypeArray``. */''')
+            outname = self.parser.outname.upper()
+            for suffix in ["TYPEID", "BINARYENCODINGID"]:
+                self.printh("extern UA_EXPORT const UA_UInt16 UA_%s_%s_INDEX[UA_%s_COUNT];" %
+                            (outname, suffix, outname))
 
         self.printh('''
 
@@ -417,6 +558,10 @@ _UA_BEGIN_DECLS
 ''')
 
         for t in self.filtered_types:
+            if self.split_headers:
+                self.printf(self.write_split_header("handling", t, '#include "../' + self.parser.outname +
+                                                    '_generated.h"', self.print_functions(t)))
+                continue
             self.printf("\n/* " + t.name + " */")
             self.printf(self.print_functions(t))
 
@@ -429,6 +574,45 @@ _UA_END_DECLS
 
 #endif /* %s_GENERATED_HANDLING_H_ */''' % self.parser.outname.upper())
 
+    def split_header_path(self, kind, datatype):
+        return os.path.join(self.outfile + "_generated_" + kind, makeCIdentifier(datatype.name) + ".h")
+
+    def split_header_paths(self):
+        """The headers of the single types that are written with split_headers"""
+        types = self.iter_types(self.parser.types)
+        return [self.split_header_path(kind, t) for kind in ["handling", "encoding_binary"] for t in types]
+
+    def write_split_header(self, kind, datatype, includes, content):
+        """Writes the functions of one type into its own header in the directory
+        <outfile>_generated_<kind>. Translation units that need only a few types
+        can include them directly instead of the header for all types. Returns
+        the include statement for the umbrella header."""
+        path = self.split_header_path(kind, datatype)
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        idName = makeCIdentifier(datatype.name)
+        guard = (self.parser.outname + "_generated_" + kind + "_" + idName + "_H_").upper()
+        with open(path, 'w') as f:
+            print('''/* Generated from ''' + self.inname + ''' with script ''' + sys.argv[0] + '''
+ * on host ''' + platform.uname()[1] + ''' by user ''' + getpass.getuser() + ''' at ''' + time.strftime(
+            "%Y-%m-%d %I:%M:%S") + ''' */
+
+#ifndef ''' + guard + '''
+#define ''' + guard + '''
+
+''' + includes + '''
+
+_UA_BEGIN_DECLS
+
+/* ''' + datatype.name + ''' */
+''' + content + '''
+
+_UA_END_DECLS
+
+#endif /* ''' + guard + ''' */''', end='\n', file=f)
+        return '#include "%s_generated_%s/%s.h"' % (self.parser.outname, kind, idName)
+
     def print_description_array(self):
         self.printc('''/* Generated from ''' + self.inname + ''' with script ''' + sys.argv[0] + '''
  * on host ''' + platform.uname()[1] + ''' by user ''' + getpass.getuser() + ''' at ''' + time.strftime(
@@ -450,6 +634,15 @@ _UA_END_DECLS
                 self.printc(self.print_datatype(t) + ",")
             self.printc("};\n")
 
+            outname = self.parser.outname.upper()
+            for (suffix, by_encoding) in [("TYPEID", False), ("BINARYENCODINGID", True)]:
+                index = self.get_lookup_index(by_encoding)
+                self.printc("const UA_UInt16 UA_%s_%s_INDEX[UA_%s_COUNT] = {" %
+                            (outname, suffix, outname))
+                for j in range(0, len(index), 12):
+                    self.printc("    " + ", ".join(map(str, index[j:j + 12])) + ",")
+                self.printc("};\n")
+
     def print_encoding(self):
         self.printe('''/* Generated from ''' + self.inname + ''' with script ''' + sys.argv[0] + '''
  * on host ''' + platform.uname()[1] + ''' by user ''' + getpass.getuser() + ''' at ''' + time.strftime(
@@ -468,6 +661,14 @@ _UA_END_DECLS
 ''')
 
         for t in self.filtered_types:
+            if self.split_headers:
+                self.printe(self.write_split_header("encoding_binary", t, '''#ifdef UA_ENABLE_AMALGAMATION
+# include "open62541.h"
+#else
+# include "ua_types_encoding_binary.h"
+# include "../''' + self.parser.outname + '''_generated.h"
+#endif''', self.print_datatype_encoding(t)))
+                continue
             self.printe("\n/* " + t.name + " */")
             self.printe(self.print_datatype_encoding(t))
 
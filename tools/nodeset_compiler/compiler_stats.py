@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+### This Source Code Form is subject to the terms of the Mozilla Public
+### License, v. 2.0. If a copy of the MPL was not distributed with this
+### file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None # Python 2
+try:
+    import resource
+except ImportError:
+    resource = None # Windows
+
+# CPU time of the process (time.clock on Python 2)
+process_time = getattr(time, "process_time", None) or time.clock
+
+def maxRss():
+    """The peak resident memory of the process in bytes (0 if not available)"""
+    if not resource:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss
+    return rss * 1024
+
+class CompilerStats(object):
+    """Records wall time, cpu time and the peak resident memory of the process
+    after every phase of the nodeset compiler. With traceMemory, the peak of the
+    memory allocated by python during the phase is traced as well. This slows
+    down the compiler considerably. A disabled instance does not measure
+    anything and can be passed around in place of None."""
+
+    def __init__(self, enabled=True, traceMemory=False):
+        self.enabled = enabled
+        self.traceMemory = enabled and traceMemory and tracemalloc is not None
+        self.phases = []
+        self.counts = {}
+        self.outputs = {}
+        self.current = None
+        if self.traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def begin(self, name, nodeset=None):
+        """Start measuring a phase. If the nodeset is given, the node and
+        reference counts after the phase are recorded too."""
+        if not self.enabled:
+            return
+        start_mem = 0
+        if self.traceMemory:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.stop()
+                tracemalloc.start()
+            start_mem = tracemalloc.get_traced_memory()[0]
+        self.current = (name, nodeset, time.time(), process_time(), start_mem)
+
+    def end(self):
+        if not self.enabled:
+            return
+        (name, nodeset, wall, cpu, start_mem) = self.current
+        record = {'name': name,
+                  'wall': round(time.time() - wall, 6),
+                  'cpu': round(process_time() - cpu, 6),
+                  'max_rss': maxRss()}
+        if self.traceMemory:
+            (current, peak) = tracemalloc.get_traced_memory()
+            record['peak_memory'] = peak
+            record['memory_delta'] = current - start_mem
+        if nodeset is not None:
+            record.update(nodesetCounts(nodeset))
+        self.phases.append(record)
+        self.current = None
+
+    @contextmanager
+    def phase(self, name, nodeset=None):
+        """Measure the code in the with-block"""
+        self.begin(name, nodeset)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counts[name] = value
+
+    def output(self, path):
+        """Record the size of a generated file"""
+        if self.enabled and os.path.isfile(path):
+            self.outputs[path] = os.path.getsize(path)
+
+    def total(self, key):
+        return sum(p.get(key, 0) for p in self.phases)
+
+    def report(self):
+        report = {'phases': self.phases,
+                  'counts': self.counts,
+                  'outputs': self.outputs,
+                  'wall': round(self.total('wall'), 6),
+                  'cpu': round(self.total('cpu'), 6),
+                  'max_rss': maxRss()}
+        if self.traceMemory:
+            report['peak_memory'] = max([p.get('peak_memory', 0) for p in self.phases] or [0])
+        return report
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+def nodesetCounts(nodeset):
+    nodes = nodeset.nodes.values()
+    return {'nodes': len(nodes),
+            'hidden_nodes': sum(1 for n in nodes if n.hidden),
+            'references': sum(len(n.references) for n in nodes)}
@@ -231,6 +231,7 @@ class Value(object):
         elif not xmlvalue.localName == "ExtensionObject":
             structure = Structure()
             structure.alias = alias
+            structure.encodingRule = enc
             structure.value = []
             for e in enc:
                 # get field name
@@ -12,6 +12,7 @@
 
 import sys
 import logging
+import xml.dom.minidom as dom
 from datatypes import *
 
 __all__ = ['Reference', 'RefOrAlias', 'Node', 'ReferenceTypeNode',
@@ -60,6 +61,9 @@ def RefOrAlias(s):
     except Exception:
         return s
 
+hassubtype = NodeId("ns=0;i=45")
+hastypedefinition = NodeId("ns=0;i=40")
+
 class Node(object):
     def __init__(self):
         self.id = None
@@ -70,6 +74,9 @@ class Node(object):
         self.writeMask = None
         self.userWriteMask = None
         self.references = set()
+        # (referenceType, isForward) -> set of references. Kept in sync with
+        # the references by addReference, removeReference and setReferences.
+        self.referenceIndex = {}
         self.hidden = False
         self.modelUri = None
         self.parent = None
@@ -84,6 +91,15 @@ class Node(object):
     def sanitize(self):
         pass
 
+    def makeSkeleton(self):
+        """Drops the attributes that are not used for nodes that are already
+        present on the server. Only the NodeId, NodeClass, BrowseName,
+        SymbolicName, references and the type information are kept."""
+        self.displayName = None
+        self.description = None
+        self.writeMask = None
+        self.userWriteMask = None
+
     def parseXML(self, xmlelement):
         for idname in ['NodeId', 'NodeID', 'nodeid']:
             if xmlelement.hasAttribute(idname):
@@ -136,24 +152,62 @@ class Node(object):
                     reftype = RefOrAlias(av)
                 elif at == "IsForward":
                     forward = not "false" in av.lower()
-            self.references.add(Reference(source, reftype, target, forward))
+            self.addReference(Reference(source, reftype, target, forward))
+
+    def addReference(self, ref):
+        if ref in self.references:
+            return
+        self.references.add(ref)
+        key = (ref.referenceType, ref.isForward)
+        if key not in self.referenceIndex:
+            self.referenceIndex[key] = set()
+        self.referenceIndex[key].add(ref)
+
+    def removeReference(self, ref):
+        self.references.discard(ref)
+        key = (ref.referenceType, ref.isForward)
+        refs = self.referenceIndex.get(key)
+        if refs is None:
+            return
+        refs.discard(ref)
+        if len(refs) == 0:
+            del self.referenceIndex[key]
+
+    def setReferences(self, refs):
+        """Replaces all references with the given set and rebuilds the index.
+        Used after the references were changed in place."""
+        self.references = refs
+        self.referenceIndex = {}
+        for ref in refs:
+            key = (ref.referenceType, ref.isForward)
+            if key not in self.referenceIndex:
+                self.referenceIndex[key] = set()
+            self.referenceIndex[key].add(ref)
+
+    def getReferences(self, referenceType, isForward):
+        return self.referenceIndex.get((referenceType, isForward), ())
+
+    def getReference(self, referenceType, isForward):
+        for ref in self.getReferences(referenceType, isForward):
+            return ref
+        return None
 
     def getParentReference(self, parentreftypes):
         # HasSubtype has precedence
-        for ref in self.references:
-            if ref.referenceType == NodeId("ns=0;i=45") and not ref.isForward:
-                return ref
+        ref = self.getReference(hassubtype, False)
+        if ref is not None:
+            return ref
         for ref in self.references:
             if ref.referenceType in parentreftypes and not ref.isForward:
                 return ref
         return None
 
     def popTypeDef(self):
-        for ref in self.references:
-            if ref.referenceType.i == 40 and ref.isForward:
-                self.references.remove(ref)
-                return ref
-        return Reference(NodeId(), NodeId(), NodeId(), False)
+        ref = self.getReference(hastypedefinition, True)
+        if ref is None:
+            return Reference(NodeId(), NodeId(), NodeId(), False)
+        self.removeReference(ref)
+        return ref
 
     def replaceAliases(self, aliases):
         if str(self.id) in aliases:
@@ -170,7 +224,7 @@ class Node(object):
             if str(ref.referenceType) in aliases:
                 ref.referenceType = NodeId(aliases[ref.referenceType])
             new_refs.add(ref)
-        self.references = new_refs
+        self.setReferences(new_refs)
 
     def replaceNamespaces(self, nsMapping):
         self.id.ns = nsMapping[self.id.ns]
@@ -183,7 +237,7 @@ class Node(object):
             ref.target.ns = nsMapping[ref.target.ns]
             ref.referenceType.ns = nsMapping[ref.referenceType.ns]
             new_refs.add(ref)
-        self.references = new_refs
+        self.setReferences(new_refs)
 
 class ReferenceTypeNode(Node):
     def __init__(self, xmlelement=None):
@@ -235,6 +289,10 @@ class VariableNode(Node):
         self.historizing = False
         self.value = None
         self.xmlValueDef = None
+        # The DataType and ValueRank are inherited from the type definition
+        # (or the parent type). See resolveVariableAttributes.
+        self.dataTypeInherited = False
+        self.valueRankInherited = False
         if xmlelement:
             VariableNode.parseXML(self, xmlelement)
 
@@ -279,6 +337,11 @@ class VariableNode(Node):
             elif x.localName == "Historizing":
                 self.historizing = "false" not in x.lower()
 
+    def makeSkeleton(self):
+        Node.makeSkeleton(self)
+        # The value is not parsed
+        self.xmlValueDef = None
+
     def allocateValue(self, nodeset):
         dataTypeNode = nodeset.getDataTypeNode(self.dataType)
         if dataTypeNode is None:
@@ -394,6 +457,13 @@ class DataTypeNode(Node):
                 if x.localName == "Definition":
                     self.__xmlDefinition__ = x
 
+    def makeSkeleton(self):
+        Node.makeSkeleton(self)
+        # Copy the definition into its own document. The document of the
+        # nodeset is released after parsing.
+        if self.__xmlDefinition__ is not None:
+            self.__xmlDefinition__ = dom.parseString(self.__xmlDefinition__.toxml()).documentElement
+
     def isEncodable(self):
         """ Will return True if buildEncoding() was able to determine which builtin
             type corresponds to all fields of this DataType.
@@ -487,15 +557,11 @@ class DataTypeNode(Node):
 
         # Check if there is a supertype available
         parentType = None
-        for ref in self.references:
-            if ref.isForward:
-                continue
-                # hasSubtype
-            if ref.referenceType.i == 45:
-                targetNode = nodeset.nodes[ref.target]
-                if targetNode is not None and isinstance(targetNode, DataTypeNode):
-                    parentType = targetNode
-                    break
+        for ref in self.getReferences(hassubtype, False):
+            targetNode = nodeset.nodes[ref.target]
+            if targetNode is not None and isinstance(targetNode, DataTypeNode):
+                parentType = targetNode
+                break
 
         if self.__xmlDefinition__ is None:
             if parentType is not None:
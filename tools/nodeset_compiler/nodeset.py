@@ -14,7 +14,9 @@ import sys
 import xml.dom.minidom as dom
 import logging
 import codecs
+import copy
 import re
+import fnmatch
 from datatypes import NodeId, valueIsInternalType
 from nodes import *
 from opaque_type_mapping import opaque_type_mapping
@@ -36,6 +38,8 @@ else:
 ####################
 
 hassubtype = NodeId("ns=0;i=45")
+hasencoding = NodeId("ns=0;i=38")
+hastypedefinition = NodeId("ns=0;i=40")
 
 def getSubTypesOf(nodeset, node, skipNodes=[]):
     if node in skipNodes:
@@ -114,13 +118,31 @@ class NodeSet(object):
         self.aliases = {}
         self.namespaces = ["http://opcfoundation.org/UA/"]
 
-    def sanitize(self):
-        for n in self.nodes.values():
+    def copy(self):
+        """Returns a copy that can be compiled without changing this nodeset.
+        The nodes and references are copied, the parsed attributes and XML
+        elements are shared. Only works before the nodeset is compiled, i.e.
+        before the inverse references are added and the parents are set."""
+        ns = NodeSet()
+        ns.aliases = dict(self.aliases)
+        ns.namespaces = list(self.namespaces)
+        for (nodeId, node) in self.nodes.items():
+            n = copy.copy(node)
+            n.setReferences(set(Reference(r.source, r.referenceType, r.target, r.isForward)
+                                for r in node.references))
+            ns.nodes[nodeId] = n
+        return ns
+
+    def sanitize(self, nodes=None):
+        """Checks the given nodes (default: all nodes) and their references"""
+        if nodes is None:
+            nodes = self.nodes.values()
+        for n in nodes:
             if n.sanitize() == False:
                 raise Exception("Failed to sanitize node " + str(n))
 
         # Sanitize reference consistency
-        for n in self.nodes.values():
+        for n in nodes:
             for ref in n.references:
                 if not ref.source == n.id:
                     raise Exception("Reference " + str(ref) + " has an invalid source")
@@ -148,7 +170,7 @@ class NodeSet(object):
     def getRoot(self):
         return self.getNodeByBrowseName("Root")
 
-    def createNode(self, xmlelement, modelUri, hidden=False):
+    def createNode(self, xmlelement, modelUri, hidden=False, skeleton=False):
         ndtype = xmlelement.localName.lower()
         if ndtype[:2] == "ua":
             ndtype = ndtype[2:]
@@ -176,6 +198,8 @@ class NodeSet(object):
 
         node.modelUri = modelUri
         node.hidden = hidden
+        if skeleton:
+            node.makeSkeleton()
         return node
 
     def hide_node(self, nodeId, hidden=True):
@@ -195,7 +219,9 @@ class NodeSet(object):
             result.update(dictionary)
         return result
 
-    def getNodeByIDString(self, idStr):
+    def resolveIDString(self, idStr):
+        """Replaces the namespace uri in the id string with the namespace
+        index. Returns None if the namespace is unknown."""
         # Split id to namespace part and id part
         m = re.match("ns=([^;]+);(.*)", idStr)
         if m:
@@ -206,37 +232,89 @@ class NodeSet(object):
                     return None
                 ns = self.namespaces.index(ns)
                 idStr = "ns={};{}".format(ns, m.group(2))
+        return idStr
+
+    def getNodeByIDString(self, idStr):
+        idStr = self.resolveIDString(idStr)
+        if idStr is None:
+            return None
         nodeId = NodeId(idStr)
         if not nodeId in self.nodes:
             return None
         return self.nodes[nodeId]
 
-    def remove_node(self, node):
+    def getNodeIdsByPattern(self, patterns):
+        """Returns the ids of the nodes that match one of the wildcard
+        patterns, e.g. ns=1;i=50* or ns=http://example.org/;s=Demo.*. A
+        pattern is only matched against the nodes of its namespace."""
+        byNamespace = {}
+        for nodeId in self.nodes:
+            if nodeId.ns not in byNamespace:
+                byNamespace[nodeId.ns] = []
+            byNamespace[nodeId.ns].append(nodeId)
+        result = set()
+        for pattern in patterns:
+            pattern = self.resolveIDString(pattern)
+            if pattern is None:
+                continue
+            m = re.match("ns=([0-9]+);", pattern)
+            if m is None:
+                pattern = "ns=0;" + pattern
+                ns = 0
+            else:
+                ns = int(m.group(1))
+            for nodeId in byNamespace.get(ns, []):
+                if fnmatch.fnmatchcase(str(nodeId), pattern):
+                    result.add(nodeId)
+        return result
 
-        def filterRef(r, rt):
-            return (r.referenceType != rt.referenceType) or (not (
-                    rt.target == node.id or rt.source == node.id
-                ))
+    def getSubtree(self, nodeIds):
+        """Returns the ids of the nodes and of all nodes below them, following
+        the forward hierarchical references."""
+        hierarchical = set(n.id for n in getSubTypesOf(self, self.getNodeByBrowseName("HierarchicalReferences")))
+        result = set()
+        stack = list(nodeIds)
+        while len(stack) > 0:
+            nodeId = stack.pop()
+            if nodeId in result or nodeId not in self.nodes:
+                continue
+            result.add(nodeId)
+            for ((referenceType, isForward), refs) in self.nodes[nodeId].referenceIndex.items():
+                if isForward and referenceType in hierarchical:
+                    stack.extend(r.target for r in refs)
+        return result
 
-        for r in node.references:
-            if r.target == node.id:
-                if r.source not in self.nodes:
+    def remove_nodes(self, nodeIds):
+        """Removes the nodes and the references of the remaining nodes to them
+        in one pass. Requires the inverse references. Only the remaining nodes
+        that referenced a removed node are sanitized afterwards. Returns the
+        number of removed nodes."""
+        removed = set(nodeId for nodeId in nodeIds if nodeId in self.nodes)
+        touched = {}
+        for nodeId in removed:
+            for r in self.nodes[nodeId].references:
+                if r.target in removed:
                     continue
-                self.nodes[r.source].references = set(filter(
-                    lambda rt: filterRef(r, rt),
-                    self.nodes[r.source].references
-                ))
-            elif r.source == node.id:
-                if r.target not in self.nodes:
+                neighbor = self.nodes.get(r.target)
+                if neighbor is None:
                     continue
-                self.nodes[r.target].references = set(filter(
-                    lambda rt: filterRef(r, rt),
-                    self.nodes[r.target].references
-                ))
-        del self.nodes[node.id]
+                # Remove the references of this type from and to the node
+                for isForward in [True, False]:
+                    neighbor.removeReference(Reference(neighbor.id, r.referenceType, nodeId, isForward))
+                touched[neighbor.id] = neighbor
+        for nodeId in removed:
+            del self.nodes[nodeId]
+        self.sanitize(list(touched.values()))
+        return len(removed)
+
+    def remove_node(self, node):
+        self.remove_nodes([node.id])
 
 
-    def addNodeSet(self, xmlfile, hidden=False, typesArray="UA_TYPES"):
+    def addNodeSet(self, xmlfile, hidden=False, typesArray="UA_TYPES", skeleton=False):
+        """Parses the nodes of the XML file. With skeleton, only the attributes
+        required for nodes that are already present on the server are kept
+        (see Node.makeSkeleton) and the DOM is released after parsing."""
         # Extract NodeSet DOM
 
         fileContent = xmlfile.read()
@@ -249,7 +327,8 @@ class NodeSet(object):
         # Remove the uax namespace from tags. UaModeler adds this namespace to some elements
         fileContent = re.sub(r"<([/]?)uax:(.+?)([/]?)>", "<\g<1>\g<2>\g<3>>", fileContent)
 
-        nodesets = dom.parseString(fileContent).getElementsByTagName("UANodeSet")
+        document = dom.parseString(fileContent)
+        nodesets = document.getElementsByTagName("UANodeSet")
         if len(nodesets) == 0 or len(nodesets) > 1:
             raise Exception(self, self.originXML + " contains no or more then 1 nodeset")
         nodeset = nodesets[0]
@@ -289,7 +368,7 @@ class NodeSet(object):
         for nd in nodeset.childNodes:
             if nd.nodeType != nd.ELEMENT_NODE:
                 continue
-            node = self.createNode(nd, modelUri, hidden)
+            node = self.createNode(nd, modelUri, hidden, skeleton)
             if not node:
                 continue
             node.replaceAliases(self.aliases)
@@ -311,6 +390,11 @@ class NodeSet(object):
             if isinstance(n, DataTypeNode):
                 n.buildEncoding(self, namespaceMapping=namespaceMapping)
 
+        if skeleton:
+            # No node refers to the DOM anymore. Break up its reference cycles
+            # to release the memory right away.
+            document.unlink()
+
     def getBinaryEncodingIdForNode(self, nodeId):
         """
         The node should have a 'HasEncoding' forward reference which points to the encoding ids.
@@ -318,11 +402,10 @@ class NodeSet(object):
         of the target node is "DefaultBinary"
         """
         node = self.nodes[nodeId]
-        for ref in node.references:
-            if ref.referenceType.ns == 0 and ref.referenceType.i == 38:
-                refNode = self.nodes[ref.target]
-                if refNode.symbolicName.value == "DefaultBinary":
-                    return ref.target
+        for ref in node.getReferences(hasencoding, True):
+            refNode = self.nodes[ref.target]
+            if refNode.symbolicName.value == "DefaultBinary":
+                return ref.target
         raise Exception("No DefaultBinary encoding defined for node " + str(nodeId))
 
     def allocateVariables(self):
@@ -335,19 +418,16 @@ class NodeSet(object):
             return None
         if node.browseName.name not in opaque_type_mapping:
             return node
-        for ref in node.references:
-            if ref.isForward:
-                continue
-            if ref.referenceType.i == 45:
-                return self.getBaseDataType(self.nodes[ref.target])
+        ref = node.getReference(hassubtype, False)
+        if ref is not None:
+            return self.getBaseDataType(self.nodes[ref.target])
         return node
 
     def getNodeTypeDefinition(self, node):
-        for ref in node.references:
-            # 40 = HasTypeDefinition
-            if ref.referenceType.i == 40 and ref.isForward:
-                return self.nodes[ref.target]
-        return None
+        ref = node.getReference(hastypedefinition, True)
+        if ref is None:
+            return None
+        return self.nodes[ref.target]
 
     def getDataTypeNode(self, dataType):
         if isinstance(dataType, string_types):
@@ -377,7 +457,7 @@ class NodeSet(object):
         for u in self.nodes.values():
             for ref in u.references:
                 back = Reference(ref.target, ref.referenceType, ref.source, not ref.isForward)
-                self.nodes[ref.target].references.add(back) # ref set does not make a duplicate entry
+                self.nodes[ref.target].addReference(back) # ref set does not make a duplicate entry
 
     def setNodeParent(self):
         parentreftypes = getSubTypesOf(self, self.getNodeByBrowseName("HierarchicalReferences"))
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+### This Source Code Form is subject to the terms of the Mozilla Public
+### License, v. 2.0. If a copy of the MPL was not distributed with this
+### file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Benchmark of the nodeset compiler with namespace zero and the companion
+# specifications in deps/ua-nodeset. Every case runs the compiler in a separate
+# process with --stats, so that the time and memory of the single phases are
+# recorded together with the end-to-end time and the maximum resident memory.
+#
+# Usage:
+#   nodeset_benchmark.py run [-o baseline.json] [-r repeat] [-s nodes ...] [case ...]
+#     Run the cases (all by default) and write the results. With -s synthetic
+#     nodesets of the given sizes are benchmarked in addition.
+#   nodeset_benchmark.py compare baseline.json current.json [-t percent]
+#     Compare two results. Returns 1 if a regression beyond the threshold is found
+#   nodeset_benchmark.py list
+#     Print the available cases
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from nodeset_generator import generateNodeSet
+
+compilerDir = os.path.dirname(os.path.realpath(__file__))
+baseDir = os.path.abspath(os.path.join(compilerDir, os.pardir, os.pardir))
+nodesetDir = os.path.join(baseDir, "deps", "ua-nodeset")
+
+NS0 = "Schema/Opc.Ua.NodeSet2.xml"
+NS0_REDUCED = os.path.join(baseDir, "tools", "schema", "Opc.Ua.NodeSet2.Reduced.xml")
+DI = "DI/Opc.Ua.Di.NodeSet2.xml"
+# Namespace zero is generated with the nodes that are created by the server itself
+NS0_IGNORE = ["-i", os.path.join(compilerDir, "NodeID_NS0_Base.txt")]
+
+# (name, existing nodesets, generated nodesets, additional arguments).
+# Relative paths are in deps/ua-nodeset.
+cases = [
+    ("ns0-reduced", [], [NS0_REDUCED], NS0_IGNORE),
+    ("ns0", [], [NS0], NS0_IGNORE),
+    ("di", [NS0], [DI], []),
+    ("plcopen", [NS0, DI], ["PLCopen/Opc.Ua.Plc.NodeSet2.xml"], []),
+    ("robotics", [NS0, DI], ["Robotics/Opc.Ua.Robotics.NodeSet2.xml"], []),
+    ("mdis", [NS0], ["MDIS/Opc.MDIS.NodeSet2.xml"], []),
+    ("iec61850", [NS0], ["IEC61850/Opc.Ua.IEC61850-7-3.NodeSet2.xml",
+                         "IEC61850/Opc.Ua.IEC61850-6.NodeSet2.xml"], []),
+    ("autoid", [NS0, DI], ["AutoID/Opc.Ua.AutoID.NodeSet2.xml"], []),
+]
+
+# Metrics of a case or phase that are compared. Times are in seconds, memory in bytes.
+timeMetrics = ['wall', 'cpu']
+memoryMetrics = ['max_rss', 'peak_memory']
+
+def nodesetPath(f):
+    return os.path.join(nodesetDir, f)
+
+def phaseName(name):
+    # The phases of the parser contain the path of the nodeset
+    if name.startswith("addNodeSet "):
+        return "addNodeSet " + os.path.basename(name[len("addNodeSet "):])
+    return name
+
+def runCompiler(existing, infiles, extraArgs, outDir, traceMemory=False):
+    """Runs the compiler for one case. Returns the wall time, the maximum
+    resident memory and the --stats report."""
+    statsFile = os.path.join(outDir, "stats.json")
+    command = [sys.executable, os.path.join(compilerDir, "nodeset_compiler.py"),
+               "--internal-headers", "--stats", statsFile] + extraArgs
+    if traceMemory:
+        command.append("--stats-memory")
+    for f in existing:
+        command += ["-e", nodesetPath(f)]
+    for f in infiles:
+        command += ["-x", nodesetPath(f)]
+    command.append(os.path.join(outDir, "benchmark"))
+
+    start = time.time()
+    with open(os.path.join(outDir, "output.log"), "w") as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        (returncode, rss) = waitProcess(process)
+    wall = time.time() - start
+    if returncode != 0:
+        with open(os.path.join(outDir, "output.log")) as log:
+            raise RuntimeError("The nodeset compiler failed:\n" + log.read())
+
+    with open(statsFile) as f:
+        stats = json.load(f)
+    return (wall, rss, stats)
+
+def waitProcess(process):
+    """Waits for the process. Returns the exit code and the maximum resident
+    memory of the process in bytes (0 if not available)."""
+    if not hasattr(os, "wait4"):
+        return (process.wait(), 0) # Windows
+    (_, status, rusage) = os.wait4(process.pid, 0)
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    if sys.platform == "darwin":
+        return (process.returncode, rusage.ru_maxrss) # Already in bytes
+    return (process.returncode, rusage.ru_maxrss * 1024)
+
+def runCase(existing, infiles, extraArgs, repeat, traceMemory=False):
+    """Runs a case repeat times. The fastest run is kept for the times, the
+    largest for the memory."""
+    result = None
+    for _ in range(repeat):
+        outDir = tempfile.mkdtemp(prefix="nodeset_benchmark_")
+        try:
+            (wall, rss, stats) = runCompiler(existing, infiles, extraArgs, outDir, traceMemory)
+        finally:
+            shutil.rmtree(outDir)
+        run = {'wall': round(wall, 6),
+               'cpu': stats['cpu'],
+               'max_rss': rss,
+               'counts': stats['counts'],
+               'outputs': dict((os.path.basename(k), v) for k, v in stats['outputs'].items()),
+               'phases': stats['phases']}
+        if 'peak_memory' in stats:
+            run['peak_memory'] = stats['peak_memory']
+        for p in run['phases']:
+            p['name'] = phaseName(p['name'])
+        result = run if result is None else mergeRuns(result, run)
+    return result
+
+def mergeRuns(a, b):
+    def merge(x, y):
+        for m in timeMetrics:
+            if m in x and m in y:
+                x[m] = min(x[m], y[m])
+        for m in memoryMetrics:
+            if m in x and m in y:
+                x[m] = max(x[m], y[m])
+    merge(a, b)
+    phases = dict((p['name'], p) for p in b['phases'])
+    for p in a['phases']:
+        if p['name'] in phases:
+            merge(p, phases[p['name']])
+    return a
+
+def syntheticCases(sizes, outDir):
+    """Generates the synthetic nodesets with the given node counts"""
+    synthetic = []
+    for size in sizes:
+        path = os.path.join(outDir, "synthetic_%d.xml" % size)
+        generateNodeSet(path, nodes=size)
+        synthetic.append(("synthetic-%d" % size, [NS0], [path], []))
+    return synthetic
+
+def run(args):
+    selected = [c for c in cases if c[0] in args.cases or
+                (not args.cases and not args.synthetic)]
+    unknown = set(args.cases) - set(c[0] for c in cases)
+    if unknown:
+        print("Unknown cases: " + ", ".join(sorted(unknown)))
+        exit(1)
+
+    syntheticDir = tempfile.mkdtemp(prefix="nodeset_benchmark_")
+    try:
+        selected += syntheticCases(args.synthetic, syntheticDir)
+        results = runCases(selected, args.repeat, args.traceMemory)
+    finally:
+        shutil.rmtree(syntheticDir)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        exit(1 if printComparison(baseline, results, args.threshold, args.min_time, args.verbose) else 0)
+
+def runCases(selected, repeat, traceMemory=False):
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'repeat': repeat,
+               'cases': {}}
+    for (name, existing, infiles, extraArgs) in selected:
+        if not all(os.path.isfile(nodesetPath(f)) for f in existing + infiles):
+            print("%-16s skipped, nodesets not found (initialize the deps/ua-nodeset submodule)" % name)
+            continue
+        results['cases'][name] = runCase(existing, infiles, extraArgs, repeat, traceMemory)
+        r = results['cases'][name]
+        print("%-16s %8.2f s wall %8.2f s cpu %8.1f MiB rss %7i nodes" %
+              (name, r['wall'], r['cpu'], r['max_rss'] / 1048576.0, r['counts'].get('nodes', 0)))
+        sys.stdout.flush()
+    return results
+
+def compareMetric(old, new, metric, minTime):
+    """Returns the relative change or None if the metric is not comparable"""
+    if metric not in old or metric not in new or not old[metric]:
+        return None
+    change = (new[metric] - old[metric]) / float(old[metric])
+    # Ignore the noise of short phases
+    if metric in timeMetrics and abs(new[metric] - old[metric]) < minTime:
+        return None
+    return change
+
+def formatValue(metric, value):
+    if metric in memoryMetrics:
+        return "%.1f MiB" % (value / 1048576.0)
+    return "%.3f s" % value
+
+def printComparison(baseline, current, threshold, minTime, verbose=False):
+    """Prints the changes of the cases and the phases that changed beyond the
+    threshold (all phases if verbose). Returns the list of regressions."""
+    regressions = []
+    for name in sorted(current['cases']):
+        if name not in baseline['cases']:
+            print("%s: not in the baseline" % name)
+            continue
+        old = baseline['cases'][name]
+        new = current['cases'][name]
+        rows = [(name, old, new)]
+        oldPhases = dict((p['name'], p) for p in old['phases'])
+        for p in new['phases']:
+            if p['name'] in oldPhases:
+                rows.append(("  " + p['name'], oldPhases[p['name']], p))
+        for (label, o, n) in rows:
+            for metric in timeMetrics + memoryMetrics:
+                change = compareMetric(o, n, metric, minTime)
+                if change is None:
+                    continue
+                flag = ""
+                if change * 100 > threshold:
+                    flag = "  REGRESSION"
+                    regressions.append((name, label.strip(), metric, change))
+                elif change * 100 < -threshold:
+                    flag = "  improved"
+                if label != name and not flag and not verbose:
+                    continue
+                print("%-50s %-12s %12s -> %12s %+7.1f%%%s" %
+                      (label, metric, formatValue(metric, o[metric]),
+                       formatValue(metric, n[metric]), change * 100, flag))
+        for key in sorted(set(old['counts']) | set(new['counts'])):
+            if old['counts'].get(key) != new['counts'].get(key):
+                print("%-50s %-12s %12s -> %12s" % (name, key, old['counts'].get(key), new['counts'].get(key)))
+
+    if regressions:
+        print("\n%d regressions beyond %.1f%%:" % (len(regressions), threshold))
+        for (name, label, metric, change) in regressions:
+            print("  %s: %s %s %+.1f%%" % (name, label, metric, change * 100))
+    else:
+        print("\nNo regressions beyond %.1f%%" % threshold)
+    return regressions
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    exit(1 if printComparison(baseline, current, args.threshold, args.min_time, args.verbose) else 0)
+
+def listCases(args):
+    for (name, existing, infiles, extraArgs) in cases:
+        print("%-12s %s" % (name, " ".join(["-e " + f for f in existing] +
+                                           ["-x " + f for f in infiles] + extraArgs)))
+
+def addCompareArguments(parser):
+    parser.add_argument('-t', '--threshold', type=float, default=10.0,
+                        help='Relative increase in percent that is reported as a regression (default: %(default)s)')
+    parser.add_argument('--min-time', type=float, default=0.05, dest="min_time",
+                        help='Ignore time differences below this many seconds (default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Print the changes of all phases')
+
+parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter)
+subparsers = parser.add_subparsers(dest="command")
+
+runParser = subparsers.add_parser('run', help='Run the benchmark')
+runParser.add_argument('cases', nargs='*', metavar="case",
+                       help='Cases to run (default: all)')
+runParser.add_argument('-o', '--output', metavar="<file>",
+                       help='Write the results as JSON to the file')
+runParser.add_argument('-r', '--repeat', type=int, default=1,
+                       help='Run every case several times and keep the best result (default: %(default)s)')
+runParser.add_argument('-s', '--synthetic', metavar="<nodes>", type=int, action='append', default=[],
+                       help='Add a case with a synthetic nodeset of the given size (see nodeset_generator.py). '
+                       'Can be used multiple times to measure the scaling of the compiler')
+runParser.add_argument('--trace-memory', action='store_true', dest="traceMemory",
+                       help='Trace the memory allocated in every phase (--stats-memory of the compiler). '
+                       'The times are not comparable to runs without tracing')
+runParser.add_argument('-b', '--baseline', metavar="<file>",
+                       help='Compare the results with a baseline')
+addCompareArguments(runParser)
+runParser.set_defaults(func=run)
+
+compareParser = subparsers.add_parser('compare', help='Compare two benchmark results')
+compareParser.add_argument('baseline', metavar="<baseline>")
+compareParser.add_argument('current', metavar="<current>")
+addCompareArguments(compareParser)
+compareParser.set_defaults(func=compare)
+
+listParser = subparsers.add_parser('list', help='List the benchmark cases')
+listParser.set_defaults(func=listCases)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if not getattr(args, "func", None):
+        parser.print_help()
+        exit(1)
+    args.func(args)
@@ -10,11 +10,14 @@
 ###    Copyright 2016-2017 (c) Stefan Profanter, fortiss GmbH
 
 
+import os
+import gc
 import logging
 import argparse
 import sys
 from datatypes import NodeId
 from nodeset import *
+from compiler_stats import CompilerStats
 
 parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter)
 parser.add_argument('-e', '--existing',
@@ -35,6 +38,7 @@ parser.add_argument('-x', '--xml',
 
 parser.add_argument('outputFile',
                     metavar='<outputFile>',
+                    nargs='?',
                     help='The path/basename for the <output file>.c and <output file>.h files to be generated. This will also be the function name used in the header and c-file.')
 
 parser.add_argument('--internal-headers',
@@ -48,7 +52,7 @@ parser.add_argument('-b', '--blacklist',
                     action='append',
                     dest="blacklistFiles",
                     default=[],
-                    help='Loads a list of NodeIDs stored in blacklistFile (one NodeID per line). Any of the nodeIds encountered in this file will be removed from the nodeset prior to compilation. Any references to these nodes will also be removed')
+                    help='Loads a list of NodeIDs stored in blacklistFile (one NodeID per line). Any of the nodeIds encountered in this file will be removed from the nodeset prior to compilation. Any references to these nodes will also be removed. NodeIDs can contain the wildcards * and ?. With a trailing /* the nodes below the node are removed as well')
 
 parser.add_argument('-i', '--ignore',
                     metavar="<ignoreFile>",
@@ -74,125 +78,378 @@ parser.add_argument('--backend',
                     default='open62541',
                     const='open62541',
                     nargs='?',
-                    choices=['open62541', 'graphviz'],
+                    choices=['open62541', 'graphviz', 'binary'],
                     help='Backend for the output files (default: %(default)s)')
 
-args = parser.parse_args()
+parser.add_argument('--profile',
+                    action='store_true',
+                    dest="profile",
+                    help='Add timing hooks to the generated code of the open62541 backend. The hooks are compiled in with UA_NODESET_PROFILE. The nodes of the timing table are written to <outputFile>.profile.csv')
+
+parser.add_argument('--skeleton',
+                    action='store_true',
+                    dest="skeleton",
+                    help='Only keep the NodeId, NodeClass, BrowseName, references, DataType and DataType definitions of the nodes in the --existing nodesets. Their other attributes and values are not parsed. This reduces the memory usage')
+
+parser.add_argument('--stats',
+                    metavar="<statsFile>",
+                    dest="stats",
+                    help='Write a JSON file with the wall time, cpu time and peak resident memory after every phase, the node and reference counts and the size of the generated files')
+
+parser.add_argument('--stats-memory',
+                    action='store_true',
+                    dest="stats_memory",
+                    help='Also trace the peak of the memory allocated during every phase for --stats. This makes the compiler several times slower')
+
+parser.add_argument('--batch',
+                    metavar="<manifest>",
+                    dest="batch",
+                    help='Generate all nodesets described in the JSON (or .toml) manifest in one run. Every XML file is parsed only once. Only -v, --stats and --stats-memory can be combined with --batch')
 
-# Set up logging
-# By default logging outputs to stderr. We want to redirect it to stdout, otherwise build output from cmake
-# is in stdout and nodeset compiler in stderr
-logging.basicConfig(stream=sys.stdout)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-verbosity = 0
-if args.verbose:
-    verbosity = int(args.verbose)
-if (verbosity == 1):
-    logging.basicConfig(level=logging.ERROR)
-elif (verbosity == 2):
-    logging.basicConfig(level=logging.WARNING)
-elif (verbosity == 3):
-    logging.basicConfig(level=logging.INFO)
-elif (verbosity >= 4):
-    logging.basicConfig(level=logging.DEBUG)
-else:
-    logging.basicConfig(level=logging.CRITICAL)
-
-# Set up logging
 logger = logging.getLogger(__name__)
-# Create a new nodeset. The nodeset name is not significant.
-# Parse the XML files
-ns = NodeSet()
-nsCount = 0
-loadedFiles = list()
 
+def openFile(f, mode):
+    """Accepts a path or an already opened file"""
+    if hasattr(f, "read"):
+        return f
+    return open(f, mode)
 
-def getTypesArray(nsIdx):
-    if nsIdx < len(args.typesArray):
-        return args.typesArray[nsIdx]
+def getTypesArray(typesArray, nsIdx):
+    if nsIdx < len(typesArray):
+        return typesArray[nsIdx]
     else:
         return "UA_TYPES"
 
-for xmlfile in args.existing:
-    if xmlfile.name in loadedFiles:
-        logger.info("Skipping Nodeset since it is already loaded: {} ".format(xmlfile.name))
-        continue
-    loadedFiles.append(xmlfile.name)
-    logger.info("Preprocessing (existing) " + str(xmlfile.name))
-    ns.addNodeSet(xmlfile, True, typesArray=getTypesArray(nsCount))
-    nsCount +=1
-for xmlfile in args.infiles:
-    if xmlfile.name in loadedFiles:
-        logger.info("Skipping Nodeset since it is already loaded: {} ".format(xmlfile.name))
-        continue
-    loadedFiles.append(xmlfile.name)
-    logger.info("Preprocessing " + str(xmlfile.name))
-    ns.addNodeSet(xmlfile, typesArray=getTypesArray(nsCount))
-    nsCount +=1
-
-# # We need to notify the open62541 server of the namespaces used to be able to use i.e. ns=3
-# namespaceArrayNames = preProc.getUsedNamespaceArrayNames()
-# for key in namespaceArrayNames:
-#   ns.addNamespace(key, namespaceArrayNames[key])
-
-# Set the nodes from the ignore list to hidden. This removes them from dependency calculation
-# and from printing their generated code.
-# These nodes should be already pre-created on the server to avoid any errors during
-# creation.
-for ignoreFile in args.ignoreFiles:
-    for line in ignoreFile.readlines():
-        line = line.replace(" ", "")
-        id = line.replace("\n", "")
-        ns.hide_node(NodeId(id))
-        #if not ns.hide_node(NodeId(id)):
-        #    logger.info("Can't ignore node, namespace does currently not contain a node with id " + str(id))
-    ignoreFile.close()
-
-# Remove nodes that are not printable or contain parsing errors, such as
-# unresolvable or no references or invalid NodeIDs
-ns.sanitize()
-
-# Allocate/Parse the data values. In order to do this, we must have run
-# buidEncodingRules.
-ns.allocateVariables()
-
-ns.addInverseReferences()
-
-
-# Remove blacklisted nodes from the nodeset.
-# We need to have the inverse references here to ensure the reference is deleted from the referencing node too
-if args.blacklistFiles:
-    for blacklist in args.blacklistFiles:
-        for line in blacklist.readlines():
+def addNodeSets(ns, loadedFiles, xmlfiles, existing=False, typesArray=[], stats=None,
+                skeleton=False):
+    """Parses the XML files into the nodeset. The names of the parsed files
+    are appended to loadedFiles. Files that were already loaded are skipped.
+    With skeleton, only the attributes required for existing nodes are kept."""
+    if stats is None:
+        stats = CompilerStats(enabled=False)
+    for xmlfile in xmlfiles:
+        xmlfile = openFile(xmlfile, 'rb')
+        if xmlfile.name in loadedFiles:
+            logger.info("Skipping Nodeset since it is already loaded: {} ".format(xmlfile.name))
+            xmlfile.close()
+            continue
+        # The types array of a nodeset is given by its position in the list of
+        # loaded nodesets
+        nsCount = len(loadedFiles)
+        loadedFiles.append(xmlfile.name)
+        if existing:
+            logger.info("Preprocessing (existing) " + str(xmlfile.name))
+        else:
+            logger.info("Preprocessing " + str(xmlfile.name))
+        with stats.phase("addNodeSet " + str(xmlfile.name), ns):
+            ns.addNodeSet(xmlfile, existing, typesArray=getTypesArray(typesArray, nsCount),
+                          skeleton=skeleton)
+        xmlfile.close()
+
+def loadExistingNodeSets(existing, typesArray=[], stats=None, skeleton=False):
+    """Parses the nodesets that are already present on the server. Returns the
+    nodeset and the list of loaded files to be passed as preloaded to
+    compile_nodeset. With skeleton, only the attributes required for existing
+    nodes are kept (see Node.makeSkeleton)."""
+    ns = NodeSet()
+    loadedFiles = list()
+    addNodeSets(ns, loadedFiles, existing, True, typesArray, stats, skeleton)
+    return (ns, loadedFiles)
+
+def readBlacklist(ns, blacklist):
+    """Returns the ids of the nodes to remove. Every line of a blacklist file
+    is a NodeId. A NodeId may contain the wildcards * and ? (e.g.
+    ns=1;i=50*). With a trailing /* the nodes below the node are removed as
+    well."""
+    nodeIds = set()
+    patterns = []
+    subtrees = set()
+    for blacklistFile in blacklist:
+        blacklistFile = openFile(blacklistFile, 'r')
+        for line in blacklistFile.readlines():
             if line.startswith("#"):
                 continue
             line = line.replace(" ", "")
             id = line.replace("\n", "")
             if len(id) == 0:
                 continue
+            subtree = id.endswith("/*")
+            if subtree:
+                id = id[:-2]
+            if "*" in id or "?" in id:
+                patterns.append((id, subtree))
+                continue
             n = ns.getNodeByIDString(id)
             if n is None:
                 logger.debug("Can't blacklist node, namespace does currently not contain a node with id " + str(id))
+            elif subtree:
+                subtrees.add(n.id)
             else:
-                ns.remove_node(n)
-        blacklist.close()
-    ns.sanitize()
+                nodeIds.add(n.id)
+        blacklistFile.close()
+    if patterns:
+        nodeIds.update(ns.getNodeIdsByPattern([p for (p, subtree) in patterns if not subtree]))
+        subtrees.update(ns.getNodeIdsByPattern([p for (p, subtree) in patterns if subtree]))
+    if subtrees:
+        nodeIds.update(ns.getSubtree(subtrees))
+    return nodeIds
+
+def compile_nodeset(outputFile, existing=[], xml=[], internal_headers=False,
+                    blacklist=[], ignore=[], typesArray=[], backend="open62541",
+                    stats=None, preloaded=None, profile=False, skeleton=False):
+    """Generates the code for the nodesets in xml. The nodesets in existing are
+    already present on the server. The nodesets, blacklist and ignore files can
+    be given as paths or as opened files. The result of loadExistingNodeSets for
+    the existing nodesets can be passed as preloaded to skip parsing them again.
+    The preloaded nodeset is modified by the compilation. With skeleton, the
+    existing nodesets are loaded with only the attributes that are required
+    for existing nodes."""
+    if stats is None:
+        stats = CompilerStats(enabled=False)
+
+    # Create a new nodeset. The nodeset name is not significant.
+    # Parse the XML files
+    if preloaded is None:
+        preloaded = loadExistingNodeSets(existing, typesArray, stats, skeleton)
+    (ns, loadedFiles) = preloaded
+    addNodeSets(ns, loadedFiles, xml, False, typesArray, stats)
+    nsCount = len(loadedFiles)
+
+    # # We need to notify the open62541 server of the namespaces used to be able to use i.e. ns=3
+    # namespaceArrayNames = preProc.getUsedNamespaceArrayNames()
+    # for key in namespaceArrayNames:
+    #   ns.addNamespace(key, namespaceArrayNames[key])
+
+    # Set the nodes from the ignore list to hidden. This removes them from dependency calculation
+    # and from printing their generated code.
+    # These nodes should be already pre-created on the server to avoid any errors during
+    # creation.
+    with stats.phase("hide_node", ns):
+        for ignoreFile in ignore:
+            ignoreFile = openFile(ignoreFile, 'r')
+            for line in ignoreFile.readlines():
+                line = line.replace(" ", "")
+                id = line.replace("\n", "")
+                ns.hide_node(NodeId(id))
+                #if not ns.hide_node(NodeId(id)):
+                #    logger.info("Can't ignore node, namespace does currently not contain a node with id " + str(id))
+            ignoreFile.close()
+
+    # Remove nodes that are not printable or contain parsing errors, such as
+    # unresolvable or no references or invalid NodeIDs
+    with stats.phase("sanitize", ns):
+        ns.sanitize()
+
+    # Allocate/Parse the data values. In order to do this, we must have run
+    # buidEncodingRules.
+    with stats.phase("allocateVariables", ns):
+        ns.allocateVariables()
+
+    with stats.phase("addInverseReferences", ns):
+        ns.addInverseReferences()
 
-ns.setNodeParent()
 
-logger.info("Generating Code for Backend: {}".format(args.backend))
+    # Remove blacklisted nodes from the nodeset.
+    # We need to have the inverse references here to ensure the reference is deleted from the referencing node too
+    if blacklist:
+        with stats.phase("blacklist", ns):
+            removed = ns.remove_nodes(readBlacklist(ns, blacklist))
+            stats.count("blacklisted", removed)
 
-if args.backend == "open62541":
-    # Create the C code with the open62541 backend of the compiler
-    from backend_open62541 import generateOpen62541Code
-    generateOpen62541Code(ns, args.outputFile, args.internal_headers, args.typesArray)
-elif args.backend == "graphviz":
-    from backend_graphviz import generateGraphvizCode
-    generateGraphvizCode(ns, filename=args.outputFile)
-else:
-    logger.error("Unsupported backend: {}".format(args.backend))
-    exit(1)
+    with stats.phase("setNodeParent", ns):
+        ns.setNodeParent()
 
+    logger.info("Generating Code for Backend: {}".format(backend))
+
+    if backend == "open62541":
+        # Create the C code with the open62541 backend of the compiler
+        from backend_open62541 import generateOpen62541Code
+        generateOpen62541Code(ns, outputFile, internal_headers, typesArray, stats, profile)
+        stats.output(outputFile + ".c")
+        stats.output(outputFile + ".h")
+        if profile:
+            stats.output(outputFile + ".profile.csv")
+    elif backend == "binary":
+        # Encode the nodes into a blob that is loaded at runtime
+        from backend_binary import generateBinaryNodeSet
+        generateBinaryNodeSet(ns, outputFile, typesArray, stats)
+        stats.output(outputFile + ".bin")
+        stats.output(outputFile + ".c")
+        stats.output(outputFile + ".h")
+    elif backend == "graphviz":
+        from backend_graphviz import generateGraphvizCode
+        with stats.phase("generateGraphvizCode", ns):
+            generateGraphvizCode(ns, filename=outputFile)
+        stats.output(outputFile)
+    else:
+        raise ValueError("Unsupported backend: {}".format(backend))
+
+    stats.count("nodesets", nsCount)
+    stats.count("nodes", len(ns.nodes))
+    stats.count("references", sum(len(n.references) for n in ns.nodes.values()))
+
+    logger.info("NodeSet generation code successfully printed")
+    return ns
+
+BATCH_KEYS = ['name', 'output', 'existing', 'xml', 'depends', 'types_array',
+              'internal_headers', 'blacklist', 'ignore', 'backend', 'profile']
+
+def loadManifest(path):
+    """Reads a batch manifest (JSON, or TOML if the file name ends with .toml).
+    Returns the list of nodeset entries. Relative paths are resolved against
+    the directory of the manifest."""
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ValueError("Reading TOML manifests requires Python 3.11 or the tomli package")
+        with open(path, "rb") as f:
+            manifest = tomllib.load(f)
+    else:
+        import json
+        with open(path, "r") as f:
+            manifest = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(path))
+    def resolve(p):
+        return os.path.normpath(os.path.join(base, p))
+
+    entries = []
+    names = set()
+    for e in manifest.get("nodesets", []):
+        unknown = set(e) - set(BATCH_KEYS)
+        if unknown:
+            raise ValueError("Unknown keys in the manifest entry {}: {}".format(e.get('name'), ", ".join(sorted(unknown))))
+        if 'name' not in e or 'output' not in e:
+            raise ValueError("Every nodeset in the manifest requires a name and an output")
+        if e['name'] in names:
+            raise ValueError("Duplicate nodeset in the manifest: {}".format(e['name']))
+        names.add(e['name'])
+        entry = dict(e)
+        entry['output'] = resolve(e['output'])
+        for key in ['existing', 'xml', 'blacklist', 'ignore']:
+            entry[key] = [resolve(p) for p in e.get(key, [])]
+        entry.setdefault('depends', [])
+        entry.setdefault('types_array', [])
+        entries.append(entry)
+    return entries
+
+def batchFiles(entries, name, visiting=()):
+    """Returns the list of (file, typesArray) in the order in which the files
+    are loaded for the nodeset, and the number of files that are already
+    present on the server. The files of the dependencies come first, with the
+    types arrays of the dependencies."""
+    byName = dict((e['name'], e) for e in entries)
+    if name not in byName:
+        raise ValueError("Unknown nodeset in the manifest: {}".format(name))
+    if name in visiting:
+        raise ValueError("Circular dependency in the manifest: {}".format(" -> ".join(visiting + (name,))))
+    entry = byName[name]
+    files = []
+    for dep in entry['depends']:
+        for f in batchFiles(entries, dep, visiting + (name,))[0]:
+            if f[0] not in [l[0] for l in files]:
+                files.append(f)
+    own = entry['existing'] + entry['xml']
+    for (i, path) in enumerate(own):
+        if path not in [l[0] for l in files]:
+            files.append((path, getTypesArray(entry['types_array'], i)))
+    existingCount = len([f for f in files if f[0] not in entry['xml']])
+    return (files, existingCount)
+
+def compile_batch(entries, stats=None):
+    """Generates the code for all nodesets of a batch manifest (see
+    loadManifest). Every XML file is parsed only once for all nodesets that
+    load it after the same files. The nodeset parsed up to a file is kept and
+    copied for the next file and for the compilation of every output."""
+    if stats is None:
+        stats = CompilerStats(enabled=False)
+
+    # Parsed nodesets and the ids of the nodes of the last file, by the list of
+    # loaded (file, typesArray)
+    parsed = {(): (NodeSet(), set())}
+    for entry in entries:
+        (files, existingCount) = batchFiles(entries, entry['name'])
+        for i in range(1, len(files) + 1):
+            key = tuple(files[:i])
+            if key in parsed:
+                continue
+            (path, typesArray) = files[i - 1]
+            logger.info("Preprocessing " + path)
+            with stats.phase("addNodeSet " + path):
+                ns = parsed[key[:-1]][0].copy()
+                before = set(ns.nodes)
+                with open(path, 'rb') as xmlfile:
+                    ns.addNodeSet(xmlfile, False, typesArray=typesArray)
+            parsed[key] = (ns, set(ns.nodes) - before)
+            # The parsed nodesets are kept until the end. Keep the garbage
+            # collector from scanning them over and over again.
+            if hasattr(gc, "freeze"):
+                gc.freeze()
+
+        logger.info("Compiling " + entry['name'])
+        with stats.phase("copy " + entry['name']):
+            ns = parsed[tuple(files)][0].copy()
+            for i in range(len(files)):
+                for nodeId in parsed[tuple(files[:i + 1])][1]:
+                    ns.nodes[nodeId].hidden = i < existingCount
+        compile_nodeset(entry['output'], internal_headers=entry.get('internal_headers', False),
+                        blacklist=entry['blacklist'], ignore=entry['ignore'],
+                        typesArray=[f[1] for f in files], backend=entry.get('backend', "open62541"),
+                        stats=stats, preloaded=(ns, [f[0] for f in files]),
+                        profile=entry.get('profile', False))
+    stats.count("outputs", len(entries))
+
+def setupLogging(verbose):
+    # Set up logging
+    # By default logging outputs to stderr. We want to redirect it to stdout, otherwise build output from cmake
+    # is in stdout and nodeset compiler in stderr
+    logging.basicConfig(stream=sys.stdout)
+    logger.setLevel(logging.INFO)
+    verbosity = 0
+    if verbose:
+        verbosity = int(verbose)
+    if (verbosity == 1):
+        logging.basicConfig(level=logging.ERROR)
+    elif (verbosity == 2):
+        logging.basicConfig(level=logging.WARNING)
+    elif (verbosity == 3):
+        logging.basicConfig(level=logging.INFO)
+    elif (verbosity >= 4):
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.CRITICAL)
+
+def main(argv=None, preloaded=None):
+    args = parser.parse_args(argv)
+    if args.batch is None and args.outputFile is None:
+        parser.error("the <outputFile> argument is required without --batch")
+    if args.batch is not None:
+        # The nodesets are described in the manifest
+        given = [name for (name, value) in [
+            ("--existing", args.existing), ("--xml", args.infiles),
+            ("<outputFile>", args.outputFile), ("--types-array", args.typesArray),
+            ("--blacklist", args.blacklistFiles), ("--ignore", args.ignoreFiles),
+            ("--backend", args.backend != 'open62541'), ("--profile", args.profile),
+            ("--skeleton", args.skeleton), ("--internal-headers", args.internal_headers)]
+            if value]
+        if given:
+            parser.error("--batch cannot be combined with " + ", ".join(given))
+    setupLogging(args.verbose)
+    stats = CompilerStats(enabled=bool(args.stats), traceMemory=args.stats_memory)
+    if args.batch:
+        compile_batch(loadManifest(args.batch), stats)
+    else:
+        compile_nodeset(args.outputFile, existing=args.existing, xml=args.infiles,
+                        internal_headers=args.internal_headers, blacklist=args.blacklistFiles,
+                        ignore=args.ignoreFiles, typesArray=args.typesArray,
+                        backend=args.backend, stats=stats, preloaded=preloaded,
+                        profile=args.profile, skeleton=args.skeleton)
+    if args.stats:
+        stats.write(args.stats)
 
-logger.info("NodeSet generation code successfully printed")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+### This Source Code Form is subject to the terms of the Mozilla Public
+### License, v. 2.0. If a copy of the MPL was not distributed with this
+### file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Thin client for nodeset_compiler_daemon.py. Accepts the same arguments as
+# nodeset_compiler.py and sends them to the daemon listening on the socket. The
+# daemon is started if it is not running yet. If the daemon cannot be used
+# (e.g. on Windows), the nodeset is compiled by this process.
+#
+# Usage:
+#   nodeset_compiler_client.py --daemon=<socket> <nodeset_compiler.py arguments>
+
+from __future__ import print_function
+import os
+import sys
+import time
+import json
+import socket
+import hashlib
+import subprocess
+
+compilerDir = os.path.dirname(os.path.realpath(__file__))
+
+STARTUP_TIMEOUT = 10 # Seconds to wait for the daemon to accept connections
+
+def socketAddress(path):
+    """Unix socket paths are limited to ~100 characters. Long paths (e.g. in a
+    deep build directory) are replaced by a unique path in the temp directory."""
+    path = os.path.abspath(path)
+    if len(path) < 100:
+        return path
+    import tempfile
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), "ua-nodeset-compiler-%s.sock" % digest)
+
+def daemonSupported():
+    return hasattr(socket, "AF_UNIX") and hasattr(os, "fork")
+
+def connect(address):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(address)
+    except socket.error:
+        s.close()
+        return None
+    return s
+
+def startDaemon(path):
+    """Starts the daemon in the background. It terminates when it was idle for
+    some time."""
+    with open(os.devnull, "w") as devnull:
+        subprocess.Popen([sys.executable, os.path.join(compilerDir, "nodeset_compiler_daemon.py"),
+                          "--socket", path], stdin=devnull, stdout=devnull, stderr=devnull,
+                         close_fds=True, preexec_fn=os.setsid)
+
+def connectOrStart(path):
+    address = socketAddress(path)
+    s = connect(address)
+    if s is not None:
+        return s
+    startDaemon(path)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        s = connect(address)
+        if s is not None:
+            return s
+        time.sleep(0.05)
+    return None
+
+def compileWithDaemon(path, argv):
+    """Sends the job to the daemon and prints its output. Returns the exit code
+    of the job or None if the daemon could not compile it."""
+    s = connectOrStart(path)
+    if s is None:
+        return None
+    try:
+        request = json.dumps({'argv': argv, 'cwd': os.getcwd()}) + "\n"
+        s.sendall(request.encode('utf-8'))
+        # The output of the job is followed by a null byte and the result
+        out = getattr(sys.stdout, "buffer", sys.stdout)
+        data = b""
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+            end = data.rfind(b"\n")
+            if b"\0" in data or end < 0:
+                continue
+            out.write(data[:end + 1])
+            out.flush()
+            data = data[end + 1:]
+    except socket.error:
+        return None
+    finally:
+        s.close()
+
+    if b"\0" not in data:
+        return None # The daemon terminated
+    (output, result) = data.split(b"\0", 1)
+    out.write(output)
+    out.flush()
+    result = json.loads(result.decode('utf-8'))
+    if result.get('stale'):
+        return None # The compiler was changed, the daemon terminated
+    return result['returncode']
+
+def main(argv):
+    path = None
+    if argv and argv[0].startswith("--daemon="):
+        path = argv[0][len("--daemon="):]
+        argv = argv[1:]
+    elif len(argv) > 1 and argv[0] == "--daemon":
+        path = argv[1]
+        argv = argv[2:]
+
+    if path and daemonSupported():
+        returncode = compileWithDaemon(path, argv)
+        if returncode is not None:
+            return returncode
+
+    # Compile in this process
+    sys.path.insert(0, compilerDir)
+    import nodeset_compiler
+    nodeset_compiler.main(argv)
+    return 0
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
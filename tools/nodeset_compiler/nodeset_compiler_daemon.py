@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+### This Source Code Form is subject to the terms of the Mozilla Public
+### License, v. 2.0. If a copy of the MPL was not distributed with this
+### file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Background process that serves nodeset compiler jobs over a Unix socket. The
+# --existing nodesets (usually namespace zero) are parsed once and kept in
+# memory. Every job runs in a forked child process that works on a
+# copy-on-write copy of the parsed nodesets, so jobs run in parallel and do
+# not affect each other.
+#
+# The daemon is normally started by nodeset_compiler_client.py. It terminates
+# when it was idle for --idle-timeout seconds or when the sources of the
+# compiler change.
+#
+# Protocol: the client sends a JSON line {"argv": [...], "cwd": "..."} with
+# the arguments of nodeset_compiler.py. The daemon answers with the output of
+# the job followed by a null byte and a JSON object {"returncode": n} or
+# {"stale": true} if the job was not run.
+
+from __future__ import print_function
+import os
+import sys
+import gc
+import glob
+import json
+import time
+import errno
+import fcntl
+import socket
+import logging
+import traceback
+from collections import OrderedDict
+
+import nodeset_compiler
+from nodeset_compiler_client import socketAddress, connect
+
+compilerDir = os.path.dirname(os.path.realpath(__file__))
+
+MAX_CACHED = 4 # Combinations of existing nodesets kept in memory
+
+def sourceState():
+    """Modification times of the compiler sources"""
+    return dict((f, os.path.getmtime(f)) for f in glob.glob(os.path.join(compilerDir, "*.py")))
+
+class CompilerDaemon(object):
+    def __init__(self, path, idleTimeout):
+        self.path = path
+        self.address = socketAddress(path)
+        self.idleTimeout = idleTimeout
+        self.sources = sourceState()
+        self.cache = OrderedDict()
+        self.children = set()
+        self.sock = None
+
+    def bind(self):
+        """Returns False if another daemon is already listening on the socket"""
+        lock = open(self.address + ".lock", "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            other = connect(self.address)
+            if other is not None:
+                other.close()
+                return False
+            if os.path.exists(self.address):
+                os.unlink(self.address) # Left over from a crashed daemon
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(self.address)
+            self.sock.listen(64)
+            return True
+        finally:
+            lock.close()
+
+    def serve(self):
+        self.sock.settimeout(1)
+        lastActive = time.time()
+        try:
+            while True:
+                self.reapChildren()
+                try:
+                    (conn, _) = self.sock.accept()
+                except socket.timeout:
+                    if not self.children and time.time() - lastActive > self.idleTimeout:
+                        return
+                    continue
+                conn.settimeout(None)
+                if not self.handle(conn):
+                    return # The compiler has changed
+                lastActive = time.time()
+        finally:
+            self.sock.close()
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            while self.children:
+                self.reapChildren(block=True)
+
+    def reapChildren(self, block=False):
+        for pid in list(self.children):
+            try:
+                (done, _) = os.waitpid(pid, 0 if block else os.WNOHANG)
+            except OSError as e:
+                if e.errno != errno.ECHILD:
+                    raise
+                done = pid
+            if done == pid:
+                self.children.discard(pid)
+
+    def handle(self, conn):
+        """Reads the request, parses the existing nodesets if they are not
+        cached and forks a child for the job"""
+        request = b""
+        while not request.endswith(b"\n"):
+            chunk = conn.recv(65536)
+            if not chunk:
+                conn.close()
+                return True
+            request += chunk
+        request = json.loads(request.decode('utf-8'))
+
+        if sourceState() != self.sources:
+            conn.sendall(b"\0" + json.dumps({'stale': True}).encode('utf-8'))
+            conn.close()
+            return False
+
+        os.chdir(request['cwd'])
+        try:
+            args = nodeset_compiler.parser.parse_args(request['argv'])
+        except SystemExit:
+            # Invalid arguments. Let the client run the compiler to get the error.
+            conn.sendall(b"\0" + json.dumps({'stale': True}).encode('utf-8'))
+            conn.close()
+            return True
+
+        try:
+            key = self.cacheKey(args)
+            if key not in self.cache:
+                while len(self.cache) >= MAX_CACHED:
+                    self.evictOldest()
+                self.cache[key] = self.parseExisting(args)
+            self.cache[key] = self.cache.pop(key) # Most recently used last
+            pid = os.fork()
+            if pid == 0:
+                self.runJob(conn, request['argv'], self.cache[key])
+            self.children.add(pid)
+        except Exception:
+            conn.sendall((traceback.format_exc() + "\0" + json.dumps({'returncode': 1})).encode('utf-8'))
+        finally:
+            for f in args.existing + args.infiles + args.blacklistFiles + args.ignoreFiles:
+                f.close()
+            conn.close()
+        return True
+
+    def cacheKey(self, args):
+        key = []
+        for i, f in enumerate(args.existing):
+            st = os.stat(f.name)
+            key.append((os.path.abspath(f.name), st.st_mtime, st.st_size,
+                        nodeset_compiler.getTypesArray(args.typesArray, i)))
+        return (tuple(key), args.skeleton)
+
+    def evictOldest(self):
+        self.cache.popitem(last=False)
+        # The nodes of the evicted nodesets reference each other. Only the
+        # garbage collector frees them and it ignores the frozen objects.
+        if hasattr(gc, "freeze"):
+            gc.unfreeze()
+            gc.collect()
+
+    def parseExisting(self, args):
+        preloaded = nodeset_compiler.loadExistingNodeSets(args.existing, args.typesArray,
+                                                          skeleton=args.skeleton)
+        # Keep the garbage collector from touching (and thereby copying) the
+        # memory of the cached nodesets in the children
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        return preloaded
+
+    def runJob(self, conn, argv, preloaded):
+        """Runs in the forked child. The output goes to the client."""
+        returncode = 1
+        try:
+            self.sock.close()
+            os.dup2(conn.fileno(), 1)
+            os.dup2(conn.fileno(), 2)
+            # Reset the logging configuration of the previous job
+            logging.getLogger().handlers = []
+            (ns, loadedFiles) = preloaded
+            nodeset_compiler.main(argv, preloaded=(ns, list(loadedFiles)))
+            returncode = 0
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                conn.sendall(b"\0" + json.dumps({'returncode': returncode}).encode('utf-8'))
+            finally:
+                os._exit(0)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', required=True, metavar="<socket>",
+                        help='Path of the Unix socket')
+    parser.add_argument('--idle-timeout', type=float, default=300, dest="idleTimeout",
+                        help='Terminate after this many seconds without a job (default: %(default)s)')
+    args = parser.parse_args()
+
+    daemon = CompilerDaemon(args.socket, args.idleTimeout)
+    if not daemon.bind():
+        return # Already running
+    daemon.serve()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+### This Source Code Form is subject to the terms of the Mozilla Public
+### License, v. 2.0. If a copy of the MPL was not distributed with this
+### file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Generates a synthetic NodeSet2 XML file to test how the nodeset compiler
+# scales with the size of the information model. The nodeset requires only
+# namespace zero and contains:
+#
+# - a tree of folders below the objects folder (--depth levels with --fanout
+#   subfolders each)
+# - instances of an ObjectType in the leaf folders until --nodes is reached
+# - --variables variables per instance. The values are scalar doubles, double
+#   arrays (--arrays, --array-size) or Range ExtensionObjects (--extension-objects)
+# - non-hierarchical references between the instances (--references per instance)
+#
+# The output only depends on the arguments and the --seed.
+#
+# Usage:
+#   nodeset_generator.py --nodes 100000 synthetic.xml
+#   nodeset_compiler.py -e Opc.Ua.NodeSet2.xml -x synthetic.xml synthetic
+
+from __future__ import print_function
+import io
+import sys
+import random
+import argparse
+
+if sys.version_info[0] >= 3:
+    # strings are already parsed to unicode
+    def unicode(s):
+        return s
+
+NODESET_HEADER = u"""<?xml version="1.0" encoding="utf-8"?>
+<UANodeSet xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns="http://opcfoundation.org/UA/2011/03/UANodeSet.xsd">
+  <NamespaceUris>
+    <Uri>{uri}</Uri>
+  </NamespaceUris>
+  <Models>
+    <Model ModelUri="{uri}">
+      <RequiredModel ModelUri="http://opcfoundation.org/UA/" />
+    </Model>
+  </Models>
+  <Aliases>
+    <Alias Alias="Double">i=11</Alias>
+    <Alias Alias="Range">i=884</Alias>
+    <Alias Alias="Organizes">i=35</Alias>
+    <Alias Alias="HasTypeDefinition">i=40</Alias>
+    <Alias Alias="HasSubtype">i=45</Alias>
+    <Alias Alias="HasComponent">i=47</Alias>
+  </Aliases>
+"""
+
+# NodeIds in the generated namespace
+CONNECTED_TO = 1 # ReferenceType for the non-hierarchical references
+DEVICE_TYPE = 2 # ObjectType of the instances
+ROOT_FOLDER = 3
+FIRST_ID = 4
+
+class NodeSetGenerator(object):
+    def __init__(self, out, nodes=10000, depth=3, fanout=10, variables=5,
+                 references=1.0, extensionObjects=0.1, arrays=0.1, arraySize=10,
+                 seed=0, uri="http://open62541.org/Synthetic/"):
+        self.out = out
+        self.nodes = nodes
+        self.depth = depth
+        self.fanout = fanout
+        self.variables = variables
+        self.references = references
+        self.extensionObjects = extensionObjects
+        self.arrays = arrays
+        self.arraySize = arraySize
+        self.uri = uri
+        self.random = random.Random(seed)
+        self.nextId = FIRST_ID
+        self.counts = {'nodes': 0, 'folders': 0, 'objects': 0, 'variables': 0,
+                       'references': 0, 'extension_objects': 0, 'arrays': 0}
+
+    def folderCount(self):
+        return sum(self.fanout ** d for d in range(1, self.depth + 1))
+
+    def objectCount(self):
+        remaining = self.nodes - (FIRST_ID - 1) - self.folderCount()
+        return max(0, remaining // (1 + self.variables))
+
+    def write(self, text):
+        self.out.write(unicode(text))
+
+    def newId(self):
+        i = self.nextId
+        self.nextId += 1
+        return i
+
+    def writeNode(self, tag, i, name, refs, attrs="", body=""):
+        self.counts['nodes'] += 1
+        self.write(u'  <%s NodeId="ns=1;i=%d" BrowseName="1:%s"%s>\n'
+                   u'    <DisplayName>%s</DisplayName>\n    <References>\n' %
+                   (tag, i, name, attrs, name))
+        for (refType, target, isForward) in refs:
+            self.write(u'      <Reference ReferenceType="%s"%s>%s</Reference>\n' %
+                       (refType, "" if isForward else ' IsForward="false"', target))
+        self.write(u'    </References>\n%s  </%s>\n' % (body, tag))
+
+    def generate(self):
+        if self.folderCount() + FIRST_ID - 1 > self.nodes:
+            raise ValueError("The folder tree alone has more than %d nodes. Reduce the depth or fanout." % self.nodes)
+        self.write(NODESET_HEADER.format(uri=self.uri))
+        self.writeNode("UAReferenceType", CONNECTED_TO, "ConnectedTo",
+                       [("HasSubtype", "i=32", False)],
+                       body=u'    <InverseName>ConnectedFrom</InverseName>\n')
+        self.writeNode("UAObjectType", DEVICE_TYPE, "SyntheticDeviceType",
+                       [("HasSubtype", "i=58", False)])
+        self.writeNode("UAObject", ROOT_FOLDER, "SyntheticPlant",
+                       [("HasTypeDefinition", "i=61", True), ("Organizes", "i=85", False)],
+                       attrs=' ParentNodeId="i=85"')
+
+        # Breadth-first folder tree. The objects are distributed over the leaves.
+        leaves = [ROOT_FOLDER]
+        for level in range(self.depth):
+            nextLeaves = []
+            for parent in leaves:
+                for k in range(self.fanout):
+                    i = self.newId()
+                    self.writeNode("UAObject", i, "Folder_%d" % i,
+                                   [("HasTypeDefinition", "i=61", True),
+                                    ("Organizes", "ns=1;i=%d" % parent, False)],
+                                   attrs=' ParentNodeId="ns=1;i=%d"' % parent)
+                    self.counts['folders'] += 1
+                    nextLeaves.append(i)
+            leaves = nextLeaves
+
+        objects = []
+        for n in range(self.objectCount()):
+            objects.append(self.writeObject(leaves[n % len(leaves)], objects))
+
+        self.write(u'</UANodeSet>\n')
+        return self.counts
+
+    def writeObject(self, parent, objects):
+        i = self.newId()
+        variables = [self.newId() for _ in range(self.variables)]
+        refs = [("HasTypeDefinition", "ns=1;i=%d" % DEVICE_TYPE, True),
+                ("Organizes", "ns=1;i=%d" % parent, False)]
+        refs += [("HasComponent", "ns=1;i=%d" % v, True) for v in variables]
+
+        # Connect to randomly chosen instances that were already written
+        count = int(self.references)
+        if self.random.random() < self.references - count:
+            count += 1
+        if objects:
+            for _ in range(count):
+                refs.append(("ns=1;i=%d" % CONNECTED_TO, "ns=1;i=%d" % self.random.choice(objects), True))
+                self.counts['references'] += 1
+
+        self.writeNode("UAObject", i, "Device_%d" % i, refs,
+                       attrs=' ParentNodeId="ns=1;i=%d"' % parent)
+        self.counts['objects'] += 1
+        for v in variables:
+            self.writeVariable(v, i)
+        return i
+
+    def writeVariable(self, i, parent):
+        refs = [("HasTypeDefinition", "i=63", True),
+                ("HasComponent", "ns=1;i=%d" % parent, False)]
+        r = self.random.random()
+        if r < self.extensionObjects:
+            low = self.random.randint(-1000, 0)
+            attrs = ' DataType="Range"'
+            value = (u'      <ExtensionObject xmlns="http://opcfoundation.org/UA/2008/02/Types.xsd">\n'
+                     u'        <TypeId><Identifier>i=886</Identifier></TypeId>\n'
+                     u'        <Body><Range><Low>%d</Low><High>%d</High></Range></Body>\n'
+                     u'      </ExtensionObject>\n' % (low, low + self.random.randint(1, 1000)))
+            self.counts['extension_objects'] += 1
+        elif r < self.extensionObjects + self.arrays:
+            attrs = ' DataType="Double" ValueRank="1" ArrayDimensions="%d"' % self.arraySize
+            value = (u'      <ListOfDouble xmlns="http://opcfoundation.org/UA/2008/02/Types.xsd">\n%s'
+                     u'      </ListOfDouble>\n' %
+                     u"".join(u'        <Double>%d.5</Double>\n' % self.random.randint(0, 1000)
+                              for _ in range(self.arraySize)))
+            self.counts['arrays'] += 1
+        else:
+            attrs = ' DataType="Double"'
+            value = (u'      <Double xmlns="http://opcfoundation.org/UA/2008/02/Types.xsd">%d.5</Double>\n' %
+                     self.random.randint(0, 1000))
+        self.writeNode("UAVariable", i, "Value_%d" % i, refs,
+                       attrs=attrs + ' ParentNodeId="ns=1;i=%d"' % parent,
+                       body=u'    <Value>\n%s    </Value>\n' % value)
+        self.counts['variables'] += 1
+
+def generateNodeSet(path, **kwargs):
+    """Writes a synthetic nodeset to the file. The keyword arguments are the
+    parameters of NodeSetGenerator. Returns the counts of the generated nodes."""
+    with io.open(path, mode="w", encoding="utf-8") as f:
+        return NodeSetGenerator(f, **kwargs).generate()
+
+def fraction(value):
+    f = float(value)
+    if f < 0 or f > 1:
+        raise argparse.ArgumentTypeError("%s is not between 0 and 1" % value)
+    return f
+
+parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('outputFile', metavar='<outputFile>',
+                    help='Path of the NodeSet2 XML file to be generated')
+parser.add_argument('-n', '--nodes', type=int, default=10000,
+                    help='Approximate number of nodes (default: %(default)s)')
+parser.add_argument('--depth', type=int, default=3,
+                    help='Levels of folders below the root folder (default: %(default)s)')
+parser.add_argument('--fanout', type=int, default=10,
+                    help='Subfolders of every folder (default: %(default)s)')
+parser.add_argument('--variables', type=int, default=5,
+                    help='Variables of every object instance (default: %(default)s)')
+parser.add_argument('--references', type=float, default=1.0,
+                    help='Average number of non-hierarchical references of an instance to other instances (default: %(default)s)')
+parser.add_argument('--extension-objects', type=fraction, default=0.1, dest="extensionObjects",
+                    help='Fraction of the variables with an ExtensionObject value (default: %(default)s)')
+parser.add_argument('--arrays', type=fraction, default=0.1,
+                    help='Fraction of the variables with an array value (default: %(default)s)')
+parser.add_argument('--array-size', type=int, default=10, dest="arraySize",
+                    help='Number of elements of the array values (default: %(default)s)')
+parser.add_argument('--seed', type=int, default=0,
+                    help='Seed of the random generator (default: %(default)s)')
+parser.add_argument('--uri', default="http://open62541.org/Synthetic/",
+                    help='Namespace uri of the generated nodes (default: %(default)s)')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.extensionObjects + args.arrays > 1:
+        print("The fractions of ExtensionObject and array values must not exceed 1")
+        exit(1)
+    kwargs = vars(args)
+    path = kwargs.pop('outputFile')
+    try:
+        counts = generateNodeSet(path, **kwargs)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    print(", ".join("%d %s" % (counts[k], k.replace("_", " ")) for k in
+                    ['nodes', 'folders', 'objects', 'variables', 'references', 'extension_objects', 'arrays']))
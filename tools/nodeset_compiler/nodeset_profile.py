@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+### This Source Code Form is subject to the terms of the Mozilla Public
+### License, v. 2.0. If a copy of the MPL was not distributed with this
+### file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Shows the nodes that take the most time when the generated nodeset is loaded.
+# The code has to be generated with --profile and compiled with
+# UA_NODESET_PROFILE. After the nodeset function was called, the timing table
+# is printed with <nodeset>_profile_print(file). The table is matched with the
+# <nodeset>.profile.csv written by the compiler.
+#
+# Usage:
+#   nodeset_profile.py <nodeset>.profile.csv timing.csv [-n count] [-s part] [-o report.csv]
+
+from __future__ import print_function
+import sys
+import csv
+import argparse
+
+PARTS = ['begin', 'references', 'finish']
+
+def readNodes(path):
+    with open(path) as f:
+        return dict((int(row['function']), row) for row in csv.DictReader(f))
+
+def readTimings(path):
+    """Returns a list of (function, begin, references, finish) in
+    nanoseconds"""
+    timings = []
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            timings.append((int(row['function']),) +
+                           tuple(int(row[p + '_ns']) for p in PARTS))
+    return timings
+
+def profile(nodes, timings, sortBy="total"):
+    """Joins the timings with the nodes. The result is sorted by the given
+    part (or the total time), the most expensive first."""
+    result = []
+    for t in timings:
+        node = nodes.get(t[0])
+        if node is None:
+            raise ValueError("Function {} is not in the node list. Was the list "
+                             "written for the same code?".format(t[0]))
+        entry = {'function': t[0], 'nodeId': node['nodeId'],
+                 'browseName': node['browseName'], 'nodeClass': node['nodeClass'],
+                 'total': sum(t[1:])}
+        entry.update(zip(PARTS, t[1:]))
+        result.append(entry)
+    result.sort(key=lambda e: e[sortBy], reverse=True)
+    return result
+
+def printReport(result, count, out=sys.stdout):
+    total = sum(e['total'] for e in result)
+    print("Total: {:.3f} ms in {} nodes".format(total / 1e6, len(result)), file=out)
+    for p in PARTS:
+        partTotal = sum(e[p] for e in result)
+        print("  {:<11} {:10.3f} ms".format(p, partTotal / 1e6), file=out)
+    print("", file=out)
+    print("{:>10} {:>6} {:>10} {:>10} {:>10}  {:<13} {:<24} {}".format(
+        "total[us]", "share", "begin", "refs", "finish", "class", "nodeId", "browseName"), file=out)
+    for e in result[:count]:
+        print("{:10.1f} {:5.1f}% {:10.1f} {:10.1f} {:10.1f}  {:<13} {:<24} {}".format(
+            e['total'] / 1e3, 100.0 * e['total'] / total if total else 0,
+            e['begin'] / 1e3, e['references'] / 1e3, e['finish'] / 1e3,
+            e['nodeClass'], e['nodeId'], e['browseName']), file=out)
+
+def writeReport(result, path):
+    fields = ['function', 'nodeId', 'browseName', 'nodeClass', 'total'] + PARTS
+    with open(path, "w") as f:
+        writer = csv.DictWriter(f, fields, lineterminator="\n")
+        writer.writeheader()
+        for e in result:
+            writer.writerow(e)
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows the nodes that take the most time when the generated nodeset is loaded")
+    parser.add_argument('nodes', help='<nodeset>.profile.csv written by the nodeset compiler with --profile')
+    parser.add_argument('timings', help='Output of <nodeset>_profile_print')
+    parser.add_argument('-n', '--count', type=int, default=20,
+                        help='Number of nodes to show (default: %(default)s)')
+    parser.add_argument('-s', '--sort', choices=['total'] + PARTS, default='total',
+                        help='Sort by the time of this part (default: %(default)s)')
+    parser.add_argument('-o', '--output', metavar="<report.csv>",
+                        help='Write the timings of all nodes with their NodeIds and browse names')
+    args = parser.parse_args()
+
+    result = profile(readNodes(args.nodes), readTimings(args.timings), args.sort)
+    printReport(result, args.count)
+    if args.output:
+        writeReport(result, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@ import csv
 import json
 import xml.etree.ElementTree as etree
 import re
+import logging
 from collections import OrderedDict
 import sys
 
@@ -12,6 +13,8 @@ else:
     from opaque_type_mapping import get_base_type_for_opaque as get_base_type_for_opaque_ns0
     # import opaque_type_mapping
 
+logger = logging.getLogger(__name__)
+
 builtin_types = ["Boolean", "SByte", "Byte", "Int16", "UInt16", "Int32", "UInt32",
                  "Int64", "UInt64", "Float", "Double", "String", "DateTime", "Guid",
                  "ByteString", "XmlElement", "NodeId", "ExpandedNodeId", "StatusCode",
@@ -186,7 +189,7 @@ class TypeDescription(object):
 class TypeParser():
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, opaque_map, selected_types, no_builtin, outname, namespace):
+    def __init__(self, opaque_map, selected_types, no_builtin, outname, namespace, selected_nodesets=None):
         self.selected_types = []
         self.fh = None
         self.ff = None
@@ -197,6 +200,7 @@ class TypeParser():
         self.no_builtin = no_builtin
         self.outname = outname
         self.namespace = namespace
+        self.selected_nodesets = selected_nodesets if selected_nodesets is not None else []
         self.types = OrderedDict()
 
     @staticmethod
@@ -312,6 +316,83 @@ class TypeParser():
     def parse_types(self):
         pass
 
+    def get_type_name_by_nodeid(self, nodeid):
+        """Returns the name of a parsed type with the given NodeId (or encoding
+        NodeId) string from a NodeSet. Only the implementation of the
+        CSVBSDTypeParser knows about NodeIds."""
+        return None
+
+    def is_unknown_nodeid(self, nodeid):
+        """True if the NodeId string from a NodeSet is in the namespace of the
+        generated types, but does not belong to a known DataType."""
+        return False
+
+    def parseNodeSetTypeReferences(self, xmlNodeSet):
+        """Returns the names of the types referenced in a NodeSet2 XML file. These
+        are the DataType attributes of variables and variable types and the
+        ExtensionObjects in (default) values."""
+        nsPrefix = "{http://opcfoundation.org/UA/2011/03/UANodeSet.xsd}"
+        valuePrefix = "{http://opcfoundation.org/UA/2008/02/Types.xsd}"
+        root = etree.parse(xmlNodeSet).getroot()
+
+        # The DataType attribute can be an alias or the NodeId of a DataType
+        # defined in the same NodeSet
+        aliases = {}
+        datatypeNames = {}
+        for element in root:
+            if element.tag == nsPrefix + "Aliases":
+                for alias in element:
+                    aliases[alias.get("Alias")] = alias.text.strip()
+            elif element.tag == nsPrefix + "UADataType":
+                browseName = element.get("BrowseName")
+                datatypeNames[element.get("NodeId")] = browseName[browseName.find(":") + 1:]
+
+        # Types of other namespaces are generated into other type arrays and
+        # are not reported
+        unresolved = set()
+        def resolve(nodeid):
+            nodeid = aliases.get(nodeid, nodeid).strip()
+            if nodeid in datatypeNames:
+                return datatypeNames[nodeid]
+            name = self.get_type_name_by_nodeid(nodeid)
+            if name is None and self.is_unknown_nodeid(nodeid):
+                unresolved.add(nodeid)
+            return name
+
+        referenced = set()
+        for element in root:
+            if element.tag not in [nsPrefix + "UAVariable", nsPrefix + "UAVariableType"]:
+                continue
+            if element.get("DataType") is not None:
+                referenced.add(resolve(element.get("DataType")))
+            for eo in element.iter(valuePrefix + "ExtensionObject"):
+                for child in eo:
+                    if child.tag == valuePrefix + "TypeId":
+                        identifier = child.find(valuePrefix + "Identifier")
+                        if identifier is not None and identifier.text:
+                            referenced.add(resolve(identifier.text))
+                    elif child.tag == valuePrefix + "Body":
+                        for body in child:
+                            referenced.add(body.tag[body.tag.find("}") + 1:])
+        for nodeid in sorted(unresolved):
+            logger.warning("The type %s referenced in %s is unknown and not selected",
+                           nodeid, getattr(xmlNodeSet, "name", xmlNodeSet))
+        return set(filter(lambda t: t in self.types, referenced))
+
+    def get_type_closure(self, names):
+        """The given types together with all their (transitive) member types"""
+        closure = set()
+        stack = list(filter(lambda t: t in self.types, names))
+        while len(stack) > 0:
+            name = stack.pop()
+            if name in closure:
+                continue
+            closure.add(name)
+            for m in self.types[name].members:
+                if m.member_type.name in self.types:
+                    stack.append(m.member_type.name)
+        return closure
+
     def create_types(self):
         for builtin in builtin_types:
             self.types[builtin] = BuiltinType(builtin)
@@ -326,6 +407,17 @@ class TypeParser():
         self.selected_types = []
         for f in arg_selected_types:
             self.selected_types += list(filter(len, [line.strip() for line in f]))
+
+        # Add the types referenced from NodeSets and all the member types
+        # required to define the selected types
+        if len(self.selected_nodesets) > 0:
+            for f in self.selected_nodesets:
+                self.selected_types += list(self.parseNodeSetTypeReferences(f))
+            if not self.no_builtin:
+                self.selected_types += builtin_types
+            closure = self.get_type_closure(self.selected_types)
+            self.selected_types = [t for t in self.types.keys() if t in closure]
+
         # Use all types if none are selected
         if len(self.selected_types) == 0:
             self.selected_types = self.types.keys()
@@ -333,13 +425,15 @@ class TypeParser():
 
 class CSVBSDTypeParser(TypeParser):
     def __init__(self, opaque_map, selected_types, no_builtin, outname, namespace, import_bsd,
-                 type_bsd, type_csv):
-        TypeParser.__init__(self, opaque_map, selected_types, no_builtin, outname, namespace)
+                 type_bsd, type_csv, selected_nodesets=None):
+        TypeParser.__init__(self, opaque_map, selected_types, no_builtin, outname, namespace, selected_nodesets)
         self.typedescriptions = {}
         self.import_bsd = import_bsd
         self.type_bsd = type_bsd
         self.type_csv = type_csv
         self.types_imported = {}
+        self.typenames_by_nodeid = None
+        self.datatype_nodeids = set()
 
     def parse_types(self):
         for i in self.import_bsd:
@@ -356,6 +450,33 @@ class CSVBSDTypeParser(TypeParser):
             self.typedescriptions = self.merge_dicts(self.typedescriptions,
                                                      self.parseTypeDescriptions(f, self.namespace))
 
+    def get_numeric_identifier(self, nodeid):
+        # The .csv file contains the numeric identifiers of the own namespace.
+        # In a NodeSet this is namespace zero for the types of namespace zero
+        # and the first namespace of the NamespaceUris (ns=1) otherwise.
+        prefix = "i=" if self.namespace == 0 else "ns=1;i="
+        if not nodeid.startswith(prefix):
+            return None
+        return nodeid[len(prefix):]
+
+    def get_type_name_by_nodeid(self, nodeid):
+        identifier = self.get_numeric_identifier(nodeid)
+        if identifier is None:
+            return None
+        if self.typenames_by_nodeid is None:
+            self.typenames_by_nodeid = {}
+            for name, description in self.typedescriptions.items():
+                for i in [description.nodeid, description.binaryEncodingId, description.xmlEncodingId]:
+                    if i != "0":
+                        self.typenames_by_nodeid.setdefault(i, name)
+        return self.typenames_by_nodeid.get(identifier)
+
+    def is_unknown_nodeid(self, nodeid):
+        # DataTypes without an encoding of their own (e.g. NumericRange) are
+        # known from the .csv file but have no type description
+        identifier = self.get_numeric_identifier(nodeid)
+        return identifier is not None and identifier not in self.datatype_nodeids
+
     def parseTypeDescriptions(self, f, namespaceid):
         definitions = {}
 
@@ -382,6 +503,7 @@ class CSVBSDTypeParser(TypeParser):
                 continue
             if row[2] != "DataType":
                 continue
+            self.datatype_nodeids.add(row[1])
             if row[0] == "BaseDataType":
                 definitions["Variant"] = TypeDescription(row[0], row[1], namespaceid)
             elif row[0] == "Structure":
@@ -432,6 +432,7 @@ cmake \
     -DUA_ENABLE_DISCOVERY_MULTICAST=ON \
     -DUA_ENABLE_ENCRYPTION=ON \
     -DUA_ENABLE_JSON_ENCODING=ON \
+    -DUA_ENABLE_NODESET_LOADER=ON \
     -DUA_ENABLE_PUBSUB=ON \
     -DUA_ENABLE_PUBSUB_DELTAFRAMES=ON \
     -DUA_ENABLE_PUBSUB_INFORMATIONMODEL=ON \
@@ -446,6 +447,18 @@ if [ $? -ne 0 ] ; then exit 1 ; fi
 cd .. && rm build -rf
 echo -en 'travis_fold:end:script.build.unit_test_ns0_full\\r'
 
+# Run the valgrind tests of the build directory in parallel. The tests with the
+# same RESOURCE_LOCK (the server port) run one after the other. The runner reads
+# the tests with 'ctest --show-only=json-v1' from CMake 3.14.
+memcheck_tests() {
+    ctest_version=$(ctest --version | head -n1 | sed 's/[^0-9.]//g')
+    if [ "$(printf '3.14\n%s\n' "$ctest_version" | sort -V | head -n1)" = "3.14" ]; then
+        /usr/bin/$PYTHON ../tools/valgrind_check_error.py --runner . --junit valgrind_results.xml
+    else
+        make test ARGS="-V"
+    fi
+}
+
 if [ "$CC" != "tcc" ]; then
     echo -e "\r\n== Unit tests (minimal NS0) ==" && echo -en 'travis_fold:start:script.build.unit_test_ns0_minimal\\r'
     mkdir -p build && cd build
@@ -466,7 +479,7 @@ if [ "$CC" != "tcc" ]; then
         -DUA_ENABLE_UNIT_TESTS_MEMCHECK=ON \
         -DUA_NAMESPACE_ZERO=MINIMAL ..
 
-    make -j && make test ARGS="-V"
+    make -j && memcheck_tests
     if [ $? -ne 0 ] ; then exit 1 ; fi
     cd .. && rm build -rf
     echo -en 'travis_fold:end:script.build.unit_test_ns0_minimal\\r'
@@ -489,7 +502,7 @@ if [ "$CC" != "tcc" ]; then
         -DUA_ENABLE_PUBSUB_INFORMATIONMODEL=ON \
         -DUA_ENABLE_UNIT_TESTS_MEMCHECK=ON \
         -DUA_NAMESPACE_ZERO=REDUCED ..
-    make -j && make test
+    make -j && memcheck_tests
     if [ $? -ne 0 ] ; then exit 1 ; fi
     cd .. && rm build -rf    
     echo -en 'travis_fold:end:script.build.unit_test_ns0_reduced_openssl\\r'
@@ -512,7 +525,7 @@ if [ "$CC" != "tcc" ]; then
         -DUA_ENABLE_PUBSUB_INFORMATIONMODEL=ON \
         -DUA_ENABLE_UNIT_TESTS_MEMCHECK=ON \
         -DUA_NAMESPACE_ZERO=REDUCED ..
-    make -j && make test ARGS="-V"
+    make -j && memcheck_tests
     if [ $? -ne 0 ] ; then exit 1 ; fi
     echo -en 'travis_fold:end:script.build.unit_test_ns0_reduced\\r'
 
@@ -9,8 +9,10 @@ import os
 import re
 import io
 import sys
+import json
+import subprocess
+import multiprocessing
 
-from git import *
 from shutil import move
 
 if sys.version_info[0] >= 3:
@@ -91,15 +93,13 @@ def insertCopyrightAuthors(file, authorsList):
     os.unlink(file)
     move(tmpName, file)
 
-def updateCopyright(repo, file):
-    print("Checking file {}".format(file))
-
+def fileAuthors(baseDir, file):
     # Build the info on how many lines every author commited every year
-    relativeFilePath = file[len(repo.working_dir)+1:].replace("\\","/")
+    relativeFilePath = file[len(baseDir)+1:].replace("\\","/")
 
     if not relativeFilePath in fileAuthorStats:
         print("File not found in list: {}".format(relativeFilePath))
-        return
+        return None
 
     stats = fileAuthorStats[relativeFilePath]
 
@@ -134,8 +134,12 @@ def updateCopyright(repo, file):
 
     # Sort the authors list first by year, and then by name
 
-    authorListSorted = sorted(authorList, key=lambda a: a['first_commit'])
-    insertCopyrightAuthors(file, authorListSorted)
+    return sorted(authorList, key=lambda a: a['first_commit'])
+
+def updateCopyright(job):
+    (file, authorList) = job
+    print("Updating file {}".format(file))
+    insertCopyrightAuthors(file, authorList)
 
 
 # This is required since some commits use different author names for the same person
@@ -153,77 +157,131 @@ assumeSameAuthor = {
     'ChristianFimmers': u'Christian Fimmers'
 }
 
-def buildFileStats(repo):
+def git(baseDir, *args):
+    return subprocess.check_output(("git",) + args, cwd=baseDir)
+
+def buildFileStats(baseDir):
+    """Reads the numstat of all commits from a single 'git log' call. The commits
+    are listed from new to old, so that renames are seen before the older
+    commits of the renamed file."""
 
     fileRenameMap = dict()
     renamePattern = re.compile(r"(.*){(.*) => (.*)}(.*)")
 
+    log = subprocess.Popen(["git", "log", "-M", "--numstat", "--format=%x00%H%x00%an%x00%ct%x00%cI"],
+                           cwd=baseDir, stdout=subprocess.PIPE)
+    authorName = None
+    timestamp = None
+    year = None
     cnt = 0
-    for commit in repo.iter_commits():
-        cnt += 1
-
-    curr = 0
-    for commit in repo.iter_commits():
-        curr += 1
-        print("Checking commit {}/{}  ->   {}".format(curr, cnt, commit.hexsha))
-
-        for objpath, stats in commit.stats.files.items():
+    for line in iter(log.stdout.readline, b""):
+        line = line.decode("utf-8", "replace").rstrip("\n")
+        if line.startswith("\0"):
+            # Header of the next commit
+            (_, hexsha, authorName, timestamp, isodate) = line.split("\0")
+            authorName = unicode(authorName)
+            if authorName in assumeSameAuthor:
+                authorName = assumeSameAuthor[authorName]
+            timestamp = int(timestamp)
+            year = int(isodate[:4]) # The year in the timezone of the committer
+            cnt += 1
+            if cnt % 1000 == 0:
+                print("Checked {} commits".format(cnt))
+            continue
 
-            match = renamePattern.match(objpath)
+        numstat = line.split("\t", 2)
+        if len(numstat) != 3:
+            continue
+        (insertions, _, objpath) = numstat
+        insertions = 0 if insertions == "-" else int(insertions) # binary files
 
+        match = renamePattern.match(objpath)
+        if match or " => " in objpath:
+            # the file was renamed, store the rename to follow up later
             if match:
-                # the file was renamed, store the rename to follow up later
                 oldFile = (match.group(1) + match.group(2) + match.group(4)).replace("//", "/")
                 newFile = (match.group(1) + match.group(3) + match.group(4)).replace("//", "/")
-
-                while newFile in fileRenameMap:
-                    newFile = fileRenameMap[newFile]
-
-                if oldFile != newFile:
-                    fileRenameMap[oldFile] = newFile
             else:
-                newFile = fileRenameMap[objpath] if objpath in fileRenameMap else objpath
+                (oldFile, newFile) = objpath.split(" => ", 1)
 
-            if stats['insertions'] > 0:
-                if not newFile in fileAuthorStats:
-                    fileAuthorStats[newFile] = dict()
+            while newFile in fileRenameMap:
+                newFile = fileRenameMap[newFile]
 
-                authorName = unicode(commit.author.name)
-                if authorName in assumeSameAuthor:
-                    authorName = assumeSameAuthor[authorName]
-
-                if not authorName in fileAuthorStats[newFile]:
-                    fileAuthorStats[newFile][authorName] = {
-                        'years': dict(),
-                        'first_commit': commit.committed_datetime
-                    }
-                elif commit.committed_datetime < fileAuthorStats[newFile][authorName]['first_commit']:
-                    fileAuthorStats[newFile][authorName]['first_commit'] = commit.committed_datetime
-
-                if not commit.committed_datetime.year in fileAuthorStats[newFile][authorName]['years']:
-                    fileAuthorStats[newFile][authorName]['years'][commit.committed_datetime.year] = 0
-
-                fileAuthorStats[newFile][authorName]['years'][commit.committed_datetime.year] += stats['insertions']
-
-
-
-
-def walkFiles(repo, folder, pattern):
+            if oldFile != newFile:
+                fileRenameMap[oldFile] = newFile
+        else:
+            newFile = fileRenameMap[objpath] if objpath in fileRenameMap else objpath
+
+        if insertions > 0:
+            if not newFile in fileAuthorStats:
+                fileAuthorStats[newFile] = dict()
+
+            if not authorName in fileAuthorStats[newFile]:
+                fileAuthorStats[newFile][authorName] = {
+                    'years': dict(),
+                    'first_commit': timestamp
+                }
+            elif timestamp < fileAuthorStats[newFile][authorName]['first_commit']:
+                fileAuthorStats[newFile][authorName]['first_commit'] = timestamp
+
+            if not year in fileAuthorStats[newFile][authorName]['years']:
+                fileAuthorStats[newFile][authorName]['years'][year] = 0
+
+            fileAuthorStats[newFile][authorName]['years'][year] += insertions
+
+    if log.wait() != 0:
+        raise RuntimeError("git log failed")
+    print("Checked {} commits".format(cnt))
+
+def loadFileStats(baseDir):
+    """Builds the file statistics or loads them from the cache if HEAD has not
+    changed since"""
+    head = git(baseDir, "rev-parse", "HEAD").decode("utf-8").strip()
+    gitDir = git(baseDir, "rev-parse", "--git-dir").decode("utf-8").strip()
+    cacheFile = os.path.join(baseDir, gitDir, "copyright_stats.json")
+    if os.path.isfile(cacheFile):
+        with io.open(cacheFile, mode="r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get('head') == head:
+            print("Using the file statistics of {} from {}".format(head, cacheFile))
+            for file, stats in cache['files'].items():
+                for author in stats:
+                    # json only has string keys
+                    stats[author]['years'] = dict((int(y), n) for y, n in stats[author]['years'].items())
+                fileAuthorStats[file] = stats
+            return
+
+    buildFileStats(baseDir)
+    with io.open(cacheFile, mode="w", encoding="utf-8") as f:
+        f.write(unicode(json.dumps({'head': head, 'files': fileAuthorStats})))
+
+def walkFiles(baseDir, folder, pattern):
     patternCompiled = re.compile(pattern)
+    jobs = []
     for root, subdirs, files in os.walk(folder):
         for f in files:
             if patternCompiled.match(f):
                 fname = os.path.join(root,f)
-                updateCopyright(repo, fname)
+                authorList = fileAuthors(baseDir, fname)
+                if authorList is not None:
+                    jobs.append((fname, authorList))
+    return jobs
 
 if __name__ == '__main__':
     baseDir = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
-    repo = Repo(baseDir)
-    assert not repo.bare
 
-    buildFileStats(repo)
+    loadFileStats(baseDir)
 
     dirs = ['src', 'plugins', 'include']
 
+    jobs = []
     for dir in dirs:
-        walkFiles(repo, os.path.join(baseDir, dir), r"(.*\.c|.*\.h)$")
+        jobs += walkFiles(baseDir, os.path.join(baseDir, dir), r"(.*\.c|.*\.h)$")
+
+    # Rewrite the files in parallel
+    pool = multiprocessing.Pool()
+    try:
+        pool.map(updateCopyright, jobs)
+    finally:
+        pool.close()
+        pool.join()
@@ -8,96 +8,325 @@
 # This script checks the valgrind output for errors.
 # The track-fds does not cause an error if there are too many FDs open,
 # therefore we parse the output and fail if there are open FDs
+#
+# Usage:
+#   valgrind_check_error.py <logfile> <valgrind command...>
+#     Run a single test (this is how CTest calls the script)
+#   valgrind_check_error.py --runner <build dir> [-j N] [-R regex] [--json file] [--junit file]
+#     Run all memcheck tests of the build directory in a pool of workers and
+#     write an aggregated report
 
+from __future__ import print_function
 import sys
 import subprocess
 import os.path
 import re
 import os
+import time
+import json
+import argparse
+import collections
+import itertools
+import xml.etree.ElementTree as ET
+from multiprocessing.pool import ThreadPool
 
-logfile = sys.argv[1]
+MAX_MESSAGES = 500 # Number of log lines kept for the report of a test
+OUTPUT_TAIL = 50 # Number of lines of the test output kept in runner mode
 
-valgrind_command = ' '.join('"' + item + '"' for item in sys.argv[2:])
+# Remove output of possible bug in OSX
+# --16672-- run: /usr/bin/dsymutil "/Users/travis/build/Pro/open62541/build/bin/tests/check_utils"
+# --16672-- WARNING: unhandled amd64-darwin syscall: unix:464
+# --16672-- You may be able to write your own handler.
+# --16672-- Read the file README_MISSING_SYSCALL_OR_IOCTL.
+# --16672-- Nevertheless we consider this a bug.  Please report
+# --16672-- it at http://valgrind.org/support/bug_reports.html.
+osx_start_re = re.compile(r"^--(\d+)--\s+run: ")
+osx_end = "-- it at http://valgrind.org/support/bug_reports.html."
+
+# Try to parse the output. Look for the following line:
+# ==17054== FILE DESCRIPTORS: 5 open at exit.
+descriptors_re = re.compile(r"^==(\d+)==\s+FILE DESCRIPTORS: (\d+) open at exit\.")
+
+# The open file descriptors which are inherited from parent look like this:
+#==21343== Open file descriptor 3: /home/user/open62541/build/bin/tests/discovery.log
+#==21343==    <inherited from parent>
+#==21343==
+open_descriptor_re = re.compile(r"^==\d+==\s+Open (?:file descriptor|AF_\w+ socket) \d+:")
+inherited_re = re.compile(r"^==\d+==\s+<inherited from parent>\s*$")
+empty_re = re.compile(r"^==\d+==\s*$")
+
+class LogChecker(object):
+    """Parses a valgrind log line by line. Only the relevant lines are kept (at
+    most MAX_MESSAGES)."""
+    def __init__(self):
+        self.lines = 0
+        self.valgrind_number = None
+        self.open_count = None
+        self.inherited_count = 0
+        self.messages = []
+        self.skip_osx = False
+        self.descriptor = None # Lines of the current open file descriptor
+
+    def feed(self, line):
+        self.lines += 1
+        line = line.rstrip("\n")
+        if not line.startswith("=") and not line.startswith("-"):
+            self._message(line)
+            return
+
+        if self.skip_osx:
+            self.skip_osx = not line.endswith(osx_end)
+            return
+        if osx_start_re.match(line):
+            self.skip_osx = not line.endswith(osx_end)
+            return
+
+        if self.descriptor is not None:
+            if inherited_re.match(line):
+                self.inherited_count += 1
+                self.descriptor = None
+                return
+            if not empty_re.match(line) and not open_descriptor_re.match(line):
+                self.descriptor.append(line)
+                return
+            for l in self.descriptor:
+                self._message(l)
+            self.descriptor = None
+
+        m = descriptors_re.match(line)
+        if m:
+            self.valgrind_number = m.group(1)
+            self.open_count = int(m.group(2))
+            return
+        if open_descriptor_re.match(line):
+            self.descriptor = [line]
+            return
+        if empty_re.match(line):
+            return
+        self._message(line)
+
+    def finish(self):
+        if self.descriptor is not None:
+            for l in self.descriptor:
+                self._message(l)
+            self.descriptor = None
+
+    def _message(self, line):
+        if len(self.messages) < MAX_MESSAGES:
+            self.messages.append(line)
+
+class LogFollower(object):
+    """Reads the lines a running process appends to its log file"""
+    def __init__(self, logfile, checker):
+        self.logfile = logfile
+        self.checker = checker
+        self.file = None
+        self.partial = ""
 
-# Execute a command and output its stdout text
-def execute(command):
+    def poll(self, final=False):
+        if self.file is None:
+            if not os.path.isfile(self.logfile):
+                return
+            self.file = open(self.logfile, 'r')
+        while True:
+            chunk = self.file.readline()
+            if not chunk:
+                break
+            chunk = self.partial + chunk
+            if not chunk.endswith("\n") and not final:
+                self.partial = chunk # Wait for the rest of the line
+                break
+            self.partial = ""
+            self.checker.feed(chunk)
+        if final:
+            if self.partial:
+                self.checker.feed(self.partial)
+            self.checker.finish()
+            self.file.close()
 
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+def run_test(name, logfile, command, cwd=None, echo=True):
+    """Runs a test under valgrind and checks the log while it is written.
+    Returns a dict with the result."""
+    if os.path.isfile(logfile):
+        os.remove(logfile) # Do not read the log of the previous run
+    checker = LogChecker()
+    follower = LogFollower(logfile, checker)
+    output = collections.deque(maxlen=OUTPUT_TAIL)
+    start = time.time()
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
     # Poll process for new output until finished
     while True:
-        nextline = process.stdout.readline().decode('utf-8')
+        nextline = process.stdout.readline().decode('utf-8', 'replace')
         if nextline == '' and process.poll() is not None:
             break
-        sys.stdout.write(nextline)
-        sys.stdout.flush()
+        if echo:
+            sys.stdout.write(nextline)
+            sys.stdout.flush()
+        else:
+            output.append(nextline.rstrip("\n"))
+        follower.poll()
+    ret_code = process.wait()
+    follower.poll(final=True)
 
-    return process.returncode
+    result = {'name': name,
+              'command': command,
+              'log': logfile,
+              'returncode': ret_code,
+              'duration': round(time.time() - start, 3),
+              'open_descriptors': checker.open_count,
+              'inherited_descriptors': checker.inherited_count,
+              'messages': checker.messages,
+              'output': list(output)}
+    if follower.file is None:
+        result['status'] = 'error'
+        result['error'] = "Valgrind logfile does not exist: " + logfile
+    elif checker.lines == 0:
+        result['status'] = 'error'
+        result['error'] = "Valgrind logfile is empty: " + logfile
+    elif checker.valgrind_number is None:
+        result['status'] = 'error'
+        result['error'] = "File descriptors header not found: " + logfile
+    elif ret_code != 0:
+        # Valgrind detected a memleak if ret_code != 0
+        result['status'] = 'failed'
+    else:
+        result['status'] = 'passed'
+    return result
 
-ret_code = execute(valgrind_command)
+def single_test(logfile, command):
+    result = run_test(os.path.basename(logfile), logfile, command)
+    if result['status'] == 'error':
+        print("### PYTHON ERROR: " + result['error'])
+        print("\n".join(result['messages']))
+        exit(1)
+    if result['status'] == 'failed':
+        print("\n".join(result['messages']))
+        exit(result['returncode'])
+    # No issues by valgrind
+    exit(0)
 
-if not os.path.isfile(logfile):
-    print("### PYTHON ERROR: Valgrind logfile does not exist: " + logfile)
-    exit(1)
+MemcheckTest = collections.namedtuple('MemcheckTest', ['name', 'logfile', 'command', 'cwd', 'locks', 'serial'])
 
-log_content = ""
-with open(logfile, 'r') as content_file:
-    log_content = content_file.read()
+def ctest_memcheck_tests(build_dir, regex):
+    """Returns the tests of the build directory that are run with this script"""
+    out = subprocess.check_output(["ctest", "--show-only=json-v1"], cwd=build_dir)
+    tests = []
+    for test in json.loads(out.decode('utf-8')).get('tests', []):
+        cmd = test.get('command', [])
+        if len(cmd) < 3 or os.path.basename(cmd[1]) != os.path.basename(__file__):
+            continue
+        if regex and not re.search(regex, test['name']):
+            continue
+        cwd = build_dir
+        locks = []
+        serial = False
+        for prop in test.get('properties', []):
+            if prop.get('name') == 'WORKING_DIRECTORY':
+                cwd = prop['value']
+            elif prop.get('name') == 'RESOURCE_LOCK':
+                locks = prop['value']
+            elif prop.get('name') == 'RUN_SERIAL':
+                serial = bool(prop['value'])
+        tests.append(MemcheckTest(test['name'], cmd[2], cmd[3:], cwd, locks, serial))
+    return tests
 
-if len(log_content) == 0:
-    print("### PYTHON ERROR: Valgrind logfile is empty: " + logfile)
-    exit(1)
+def lock_groups(tests):
+    """Groups the tests that share a RESOURCE_LOCK (also transitively). The tests
+    of a group are run one after the other. Tests without a lock form a group of
+    their own."""
+    groups = []
+    group_of_lock = {}
+    for test in tests:
+        joined = []
+        for lock in test.locks:
+            group = group_of_lock.get(lock)
+            if group is not None and all(group is not g for g in joined):
+                joined.append(group)
+        group = [test]
+        for g in joined:
+            group = g + group
+        groups = [g for g in groups if all(g is not j for j in joined)]
+        groups.append(group)
+        for t in group:
+            for lock in t.locks:
+                group_of_lock[lock] = group
+    # Start the longest groups first
+    groups.sort(key=len, reverse=True)
+    return groups
 
-# Remove output of possible bug in OSX
-# --16672-- run: /usr/bin/dsymutil "/Users/travis/build/Pro/open62541/build/bin/tests/check_utils"
-# --16672-- WARNING: unhandled amd64-darwin syscall: unix:464
-# --16672-- You may be able to write your own handler.
-# --16672-- Read the file README_MISSING_SYSCALL_OR_IOCTL.
-# --16672-- Nevertheless we consider this a bug.  Please report
-# --16672-- it at http://valgrind.org/support/bug_reports.html.
-replace_re = re.compile(r"^--(\d+)--\s+run: .*-- it at http://valgrind.org/support/bug_reports.html\.$\n", re.MULTILINE | re.DOTALL)
-log_content = replace_re.sub('', log_content)
-
-# Try to parse the output. Look for the following line:
-# ==17054== FILE DESCRIPTORS: 5 open at exit.
-descriptors_re = re.compile(r".*==(\d+)==\s+FILE DESCRIPTORS: (\d+) open at exit\..*", re.DOTALL)
-m = descriptors_re.match(log_content)
+def write_junit(results, path):
+    suite = ET.Element('testsuite', name='valgrind', tests=str(len(results)),
+                       failures=str(sum(1 for r in results if r['status'] == 'failed')),
+                       errors=str(sum(1 for r in results if r['status'] == 'error')),
+                       time=str(sum(r['duration'] for r in results)))
+    for r in results:
+        case = ET.SubElement(suite, 'testcase', name=r['name'], classname='valgrind', time=str(r['duration']))
+        if r['status'] != 'passed':
+            text = "\n".join(r['messages'] + r['output'])
+            if r['status'] == 'error':
+                ET.SubElement(case, 'error', message=r['error']).text = text
+            else:
+                ET.SubElement(case, 'failure', message="valgrind returned %d" % r['returncode']).text = text
+    ET.ElementTree(suite).write(path, encoding='utf-8', xml_declaration=True)
 
-if not m:
-    print("### PYTHON ERROR: File descriptors header not found: " + logfile)
-    print(log_content)
-    exit(1)
+def runner(argv):
+    parser = argparse.ArgumentParser(prog="valgrind_check_error.py --runner")
+    parser.add_argument('build_dir', help='build directory with the CTest memcheck tests')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of tests run in parallel (defaults to the number of cpus)')
+    parser.add_argument('-R', '--regex', help='only run the tests whose name matches the regex')
+    parser.add_argument('--json', help='write the results as JSON to the file')
+    parser.add_argument('--junit', help='write the results as JUnit XML to the file')
+    args = parser.parse_args(argv)
 
-log_content = descriptors_re.sub('', log_content)
+    tests = ctest_memcheck_tests(args.build_dir, args.regex)
+    if not tests:
+        print("No memcheck tests found in " + args.build_dir)
+        exit(1)
 
-valgrind_number = m.group(1)
-open_count = int(m.group(2))
+    def work(test):
+        result = run_test(test.name, test.logfile, test.command, test.cwd, echo=False)
+        print("%-50s %s (%.2f s)" % (test.name, result['status'], result['duration']))
+        sys.stdout.flush()
+        return result
 
-# Remove the open file descriptors which are inherited from parent. they look like this:
-#==21343== Open file descriptor 3: /home/user/open62541/build/bin/tests/discovery.log
-#==21343==    <inherited from parent>
-#==21343==
-#==21343== Open file descriptor 2:
-#==21343==    <inherited from parent>
-#==21343==
-#==21343== Open file descriptor 1:
-#==21343==    <inherited from parent>
-#==21343==
-#==21343== Open file descriptor 0: /dev/pts/1
-#==21343==    <inherited from parent>
+    def work_group(group):
+        return [(id(test), work(test)) for test in group]
 
-replace_re = re.compile(r"^=="+str(valgrind_number)+r"==\s+Open file descriptor \d+:\s*[^\s]*$\n^=="+str(valgrind_number)+r"==\s+<inherited from parent>$\n(^=="+str(valgrind_number)+r"==\s+$\n)*", re.MULTILINE)
-log_content = replace_re.sub('', log_content)
+    # Tests with RUN_SERIAL run alone after the others. Tests sharing a
+    # RESOURCE_LOCK (e.g. the server port) never run at the same time.
+    pool = ThreadPool(args.jobs)
+    try:
+        group_results = pool.map(work_group, lock_groups([t for t in tests if not t.serial]), 1)
+    finally:
+        pool.close()
+        pool.join()
+    by_test = dict(itertools.chain(*group_results))
+    for test in tests:
+        if test.serial:
+            by_test[id(test)] = work(test)
+    results = [by_test[id(test)] for test in tests]
 
-# Valgrind detected a memleak if ret_code != 0
-if ret_code != 0:
-    print(log_content)
-    exit(ret_code)
+    failed = [r for r in results if r['status'] != 'passed']
+    for r in failed:
+        print("\n### %s: %s" % (r['name'], r.get('error', "valgrind returned %d" % r['returncode'])))
+        print("\n".join(r['messages']))
+    print("\n%d of %d tests passed" % (len(results) - len(failed), len(results)))
 
-# No issues by valgrind
-if len(log_content) == 0 or log_content.isspace():
-    exit(0)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'tests': results, 'passed': len(results) - len(failed),
+                       'failed': len(failed)}, f, indent=2)
+    if args.junit:
+        write_junit(results, args.junit)
+    exit(1 if failed else 0)
 
-# There is something fishy in the valgrind output, so error-exit
-print(log_content)
-exit(1)
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--runner":
+        runner(sys.argv[2:])
+    if len(sys.argv) < 3:
+        print("Usage: valgrind_check_error.py <logfile> <valgrind command...>")
+        print("       valgrind_check_error.py --runner <build dir> [-j N] [-R regex] [--json file] [--junit file]")
+        exit(1)
+    single_test(sys.argv[1], sys.argv[2:])